@@ -0,0 +1,95 @@
+"""Catalogue startup: `json.load` of purchased.json versus opening the memory-mapped catalogue file, then an
+incremental search-API refresh versus a full one against the stub server.
+
+    python -m benchmarks.bench_catalogue [--purchased purchased.json] [--scale 1] [--new 5]
+
+`--scale N` repeats the dump N times under fresh ids to stand in for a larger catalogue.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.stub_server import StubMissEvan, StubServer
+from missevan import client
+from missevan.catalogue import Catalogue, refresh, write_catalogue
+
+ROUNDS = 5
+
+
+def best_of(function):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def from_json(path):
+    """What catalogue-driven jobs do today for ids, names and pay types."""
+    with open(path, encoding="utf-8") as f:
+        dramas = json.load(f)
+    return [(drama['id'], drama['name'], drama['pay_type']) for drama in dramas]
+
+
+def from_catalogue(path):
+    with Catalogue(path) as catalogue:
+        return list(zip(catalogue.ids.tolist(), catalogue.names(), catalogue.pay_types.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--purchased", default="purchased.json")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--new", type=int, default=5, help="dramas the search API has that the catalogue lacks")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with open(args.purchased, encoding="utf-8") as f:
+        dump = json.load(f)
+    dramas = [dict(drama, id=drama['id'] + copy * 10_000_000) for copy in range(args.scale) for drama in dump]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "purchased.json")
+        catalogue_path = os.path.join(directory, "purchased.catalogue")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(dramas, f, ensure_ascii=False, indent=4)
+        write_catalogue(dramas, catalogue_path)
+
+        print(f"{len(dramas)} dramas: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, "
+              f"catalogue {os.path.getsize(catalogue_path) / 1e6:.1f} MB, best of {ROUNDS}")
+        json_time, expected = best_of(lambda: from_json(json_path))
+        catalogue_time, loaded = best_of(lambda: from_catalogue(catalogue_path))
+        assert loaded == expected
+        print(f"{'json.load':<20} {json_time * 1000:8.2f} ms")
+        print(f"{'catalogue':<20} {catalogue_time * 1000:8.2f} ms")
+        ids_time, _ = best_of(lambda: Catalogue(catalogue_path).ids.sum())
+        print(f"{'catalogue, ids only':<20} {ids_time * 1000:8.2f} ms")
+        with Catalogue(catalogue_path) as catalogue:
+            middle = dramas[len(dramas) // 2]['id']
+            lookup_time, drama = best_of(lambda: catalogue.get(middle).details())
+        print(f"{'one drama + details':<20} {lookup_time * 1000:8.2f} ms  ({len(drama['abstract'])} abstract chars)")
+
+        # The search API lists newest first: a few dramas the catalogue hasn't seen, then everything it has
+        fresh = [dict(dramas[0], id=90_000_000 + i, name=f"新剧{i}") for i in range(args.new)]
+        client.configure_cache(None)
+        with StubServer(StubMissEvan(catalogue=fresh + dramas)) as server:
+            client.BASE_URL = server.base_url
+            for label, full in (("incremental refresh", False), ("full refresh", True)):
+                write_catalogue(dramas, catalogue_path)
+                server.reset_stats()
+                start = time.perf_counter()
+                added, updated = refresh(catalogue_path, full=full)
+                print(f"{label:<20} {(time.perf_counter() - start) * 1000:8.2f} ms  {server.requests} search pages, "
+                      f"{added} added, {updated} updated")
+                with Catalogue(catalogue_path) as catalogue:
+                    assert catalogue.ids[:args.new].tolist() == [drama['id'] for drama in fresh]
+                    assert len(catalogue) == len(dramas) + args.new
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Loading a year of daily outputs: separator-row CSVs parsed line by line versus the Parquet tables.
+
+    python -m benchmarks.bench_columnar [days] [dramas_per_day] [episodes] [uids_per_episode]
+"""
+import csv
+import datetime
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from missevan.columnar import ColumnarWriter, read_table
+from missevan.uidset import UidSet
+from missevan_user_growth import DRAMA_HEADER, SOUND_HEADER
+
+START = datetime.date(2024, 1, 1)
+
+
+def synthetic_day(dramas, episodes, per_episode, rng):
+    for drama in range(dramas):
+        drama_id = 50000 + drama
+        sound_data = []
+        for episode in range(episodes):
+            danmaku_uids = UidSet(rng.integers(0, 400_000_000, per_episode))
+            comment_uids = UidSet(rng.integers(0, 400_000_000, per_episode // 2))
+            sound_data.append({
+                'sound_id': drama_id * 1000 + episode, 'sound_title': f"第{episode + 1}集",
+                'create_time': datetime.datetime(2023, 1, 1) + datetime.timedelta(days=episode),
+                'need_pay': int(episode >= 3), 'view_count': int(rng.integers(1000, 100000)),
+                'danmaku_uids': danmaku_uids, 'comment_uids': comment_uids,
+                'total_sound_uids': danmaku_uids.union(comment_uids),
+            })
+        paid_uids = UidSet().union(*(s['total_sound_uids'] for s in sound_data if s['need_pay']))
+        drama_row = [drama_id, f"Drama {drama_id}", sound_data[0]['create_time'], 199, 123456, 1, 2, 3, 4, 5, 6,
+                     len(paid_uids), 7, 8, 9]
+        yield drama_id, sound_data, drama_row, paid_uids
+
+
+def write_csv_day(directory, day, drama_days):
+    """The dated CSV layout the growth scripts write, separator rows included."""
+    with open(os.path.join(directory, f"{day}_sound_data.csv"), "w", newline="", encoding="utf-8") as sound_file, \
+            open(os.path.join(directory, f"{day}_drama_data.csv"), "w", newline="", encoding="utf-8") as drama_file:
+        sound_writer, drama_writer = csv.writer(sound_file), csv.writer(drama_file)
+        sound_writer.writerow(SOUND_HEADER)
+        drama_writer.writerow(DRAMA_HEADER)
+        for drama_id, sound_data, drama_row, _ in drama_days:
+            for s in sound_data:
+                sound_writer.writerow([s['sound_title'], s['create_time'], 'PAID' if s['need_pay'] else 'FREE',
+                                       len(s['danmaku_uids']), len(s['comment_uids']), len(s['total_sound_uids']),
+                                       s['view_count']])
+            sound_writer.writerow(['End of data for drama ID', drama_id, '', '', '', '', ''])
+            sound_writer.writerow([''] * 7)
+            sound_writer.writerow([''] * 7)
+            drama_writer.writerow(drama_row)
+
+
+def load_csvs(directory):
+    """What a downstream load has to do today: walk every file, skip separators, re-attach drama IDs, cast."""
+    sounds = []
+    for path in sorted(glob.glob(os.path.join(directory, "*_sound_data.csv"))):
+        day = os.path.basename(path).split("_")[0]
+        with open(path, encoding="utf-8") as f:
+            rows = list(csv.reader(f))[1:]
+        pending = []
+        for row in rows:
+            if not any(row):
+                continue
+            if row[0] == 'End of data for drama ID':
+                sounds.extend([day, int(row[1])] + r for r in pending)
+                pending = []
+                continue
+            pending.append([row[0], datetime.datetime.fromisoformat(row[1]), row[2] == 'PAID', int(row[3]),
+                            int(row[4]), int(row[5]), int(row[6])])
+    return len(sounds)
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    dramas = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    episodes = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    per_episode = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+    # Importing the growth script turns on INFO logging; one line per written file would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_dir = os.path.join(directory, "csv")
+        os.makedirs(csv_dir)
+        for offset in range(days):
+            day = START + datetime.timedelta(days=offset)
+            drama_days = list(synthetic_day(dramas, episodes, per_episode, rng))
+            write_csv_day(csv_dir, day, drama_days)
+            with ColumnarWriter(os.path.join(directory, "parquet"), run_date=day) as writer:
+                for drama_id, sound_data, drama_row, paid_uids in drama_days:
+                    writer.add_drama(drama_id, sound_data, drama_row, paid_uids)
+
+        print(f"{days} days x {dramas} dramas x {episodes} episodes")
+        start = time.perf_counter()
+        rows = load_csvs(csv_dir)
+        print(f"{'CSV parse':<28} {time.perf_counter() - start:.3f}s  {rows} sound rows")
+        counts = ["drama_id", "sound_id", "sound_title", "create_time", "paid", "danmaku_users", "comment_users",
+                  "total_users", "view_count"]
+        start = time.perf_counter()
+        table = read_table("sounds", os.path.join(directory, "parquet"), columns=counts + ["date"])
+        print(f"{'Parquet, counts only':<28} {time.perf_counter() - start:.3f}s  {table.num_rows} sound rows")
+        start = time.perf_counter()
+        table = read_table("sounds", os.path.join(directory, "parquet"))
+        uids = sum(len(chunk.values) for chunk in table.column("danmaku_uids").chunks)
+        print(f"{'Parquet, with UID lists':<28} {time.perf_counter() - start:.3f}s  {uids} danmaku UIDs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Comment-page UID extraction: `response.json()` plus the old per-comment loop versus the fast JSON paths.
+
+    python -m benchmarks.bench_comment_extract [--fixtures DIR] [--pages 200] [--payload-scale 1]
+
+With `--fixtures` (see benchmarks.fixtures) the recorded getcomment pages are used; otherwise 100-item stub pages.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from benchmarks.stub_server import StubMissEvan
+from missevan import comments
+
+ROUNDS = 5
+
+
+def baseline(body):
+    """What `fetch_comment_page` + `extract_user_ids` did before: stdlib decode of the whole page, then a loop."""
+    data = json.loads(body.decode("utf-8"))
+    user_ids = set()
+    for comment in data["info"]["comment"]["Datas"]:
+        user_ids.add(int(comment["userid"]))
+        user_ids.update(int(sub["userid"]) for sub in comment["subcomments"])
+    return user_ids
+
+
+def load_pages(args):
+    if args.fixtures:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.fixtures, "getcomment", "*.json")))[:args.pages]:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        return pages
+    data = StubMissEvan(comment_pages=args.pages, payload_scale=args.payload_scale)
+    return [json.dumps(data.getcomment(data.sound_ids()[0], page), ensure_ascii=False).encode("utf-8")
+            for page in range(1, args.pages + 1)]
+
+
+def run(label, extract, pages, expected):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        results = [extract(body) for body in pages]
+    per_page = (time.perf_counter() - start) / (ROUNDS * len(pages))
+    assert results == expected
+    print(f"{label:<34} {per_page * 1e6:8.1f} µs/page")
+    return per_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--payload-scale", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    expected = [baseline(body) for body in pages]
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KiB each; "
+          f"loads={comments.BACKEND} scan={comments.SCAN_BACKEND}")
+    base = run("json + extract loop (before)", baseline, pages, expected)
+    fast = run(f"{comments.BACKEND} + extract_user_ids",
+               lambda body: comments.extract_user_ids(comments.loads(body)), pages, expected)
+    scan = run(f"scan_comment_page ({comments.SCAN_BACKEND})",
+               lambda body: comments.scan_comment_page(body)[0], pages, expected)
+    print(f"speedup: loads {base / fast:.2f}x, scan {base / scan:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare the old ElementTree + split parser with the streaming danmaku scanner on a synthetic 500k-danmaku file.
+
+    python -m benchmarks.bench_danmaku_parser [count]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ETree
+
+from missevan.danmaku import CHUNK_SIZE, collect_danmaku_uids
+
+
+def write_danmaku_xml(path, count, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?><i><chatserver>stub</chatserver>')
+        for i in range(count):
+            mode = 4 if rng.random() < 0.05 else 1
+            f.write(f'<d p="{i * 0.1:.2f},{mode},25,16777215,{1700000000 + i},0,{rng.randint(1, 5_000_000)},{i}">'
+                    f'弹幕内容 &amp; 第{i}条</d>')
+        f.write("</i>")
+
+
+def etree_split(path):
+    with open(path, "rb") as f:
+        pp_comments_xml = ETree.fromstring(f.read())
+    return {int(item.attrib["p"].split(",")[6]) for item in pp_comments_xml.findall("d") if
+            item.attrib["p"].split(",")[1] != "4"}
+
+
+def streaming_scan(path):
+    with open(path, "rb") as f:
+        return collect_danmaku_uids(iter(lambda: f.read(CHUNK_SIZE), b""))
+
+
+def measure(label, func, path):
+    start = time.perf_counter()
+    result = func(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<22} uids={len(result):<9} time={elapsed:.3f}s peak={peak / 2 ** 20:.1f} MiB")
+    return result, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "getdm.xml")
+        write_danmaku_xml(path, count)
+        print(f"{count} danmaku, {os.path.getsize(path) / 2 ** 20:.1f} MiB of XML")
+
+        expected, base_time = measure("ETree + split", etree_split, path)
+        result, scan_time = measure("streaming scanner", streaming_scan, path)
+        assert result == expected
+        print(f"  -> {base_time / scan_time:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
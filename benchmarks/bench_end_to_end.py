@@ -0,0 +1,119 @@
+"""End-to-end crawl of one drama against the local stand-in server, one engine per child process.
+
+    python -m benchmarks.bench_end_to_end [--episodes 50] [--latency 0.02] [--jitter 0.01] [--throttle RPS]
+                                          [--payload-scale 1] [--fixtures DIR --drama-id ID] [--rate RPS]
+                                          [--engines sequential,threadpool,async,snapshot]
+
+Reports server-side requests (and 429s), requests/s, wall time and the child's peak RSS for each engine.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_server import DRAMA_ID, StubMissEvan, StubServer
+
+ENGINES = ("sequential", "threadpool", "async", "snapshot")
+
+
+def crawl(engine, drama_id, workdir):
+    """Run one engine over `drama_id` the way its script's runner would, without writing CSVs."""
+    from missevan.journal import RowBuffer
+    from missevan.uidset import UidSet
+
+    if engine == "sequential":
+        import missevan_user_growth
+        missevan_user_growth.process_drama_id(drama_id, RowBuffer(), RowBuffer(), UidSet())
+    elif engine == "threadpool":
+        import missevan_growth_threadpool
+        from missevan.client import COMMENT_WORKERS, configure_session
+        configure_session(pool_size=missevan_growth_threadpool.MAX_WORKERS + COMMENT_WORKERS)
+        missevan_growth_threadpool.process_drama_id(drama_id, RowBuffer(), RowBuffer(), UidSet())
+    elif engine == "async":
+        from missevan.aio import crawl_dramas
+        crawl_dramas([drama_id])
+    elif engine == "snapshot":
+        # Incremental re-crawl against a snapshot store filled by the warm-up run
+        import missevan_user_growth
+        from missevan.snapshot import SnapshotStore
+        with SnapshotStore(os.path.join(workdir, "snapshots.sqlite3")) as store:
+            missevan_user_growth.process_drama_id(drama_id, RowBuffer(), RowBuffer(), UidSet(), store)
+    else:
+        raise ValueError(f"Unknown engine {engine}")
+
+
+def child(args):
+    """Entry point inside the child process: crawl once and print a JSON line with wall time and peak RSS."""
+    from missevan import client
+    logging.disable(logging.ERROR)
+    client.BASE_URL = args.base_url
+    client.configure_cache(None)
+    client.configure_rate_limit(rate=args.rate, burst=max(args.rate, 1), max_rate=args.rate)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        crawl(args.child, args.drama_id, args.workdir)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    print(json.dumps({"wall": elapsed, "peak_rss": peak_rss}))
+
+
+def run_child(engine, server, args, workdir):
+    command = [sys.executable, "-m", "benchmarks.bench_end_to_end", "--child", engine,
+               "--base-url", server.base_url, "--drama-id", str(args.drama_id), "--rate", str(args.rate),
+               "--workdir", workdir]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--episodes", type=int, default=50)
+    parser.add_argument("--comment-pages", type=int, default=3)
+    parser.add_argument("--danmakus", type=int, default=500)
+    parser.add_argument("--payload-scale", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--throttle", type=float, default=None, help="server-side requests/s before 429s")
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--fixtures", help="serve recorded fixtures (see benchmarks.fixtures) instead of stub data")
+    parser.add_argument("--drama-id", type=int, default=DRAMA_ID)
+    parser.add_argument("--rate", type=float, default=1e6, help="client rate limit; 10 matches production pacing")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    if args.fixtures:
+        from benchmarks.fixtures import FixtureMissEvan
+        data = FixtureMissEvan(args.fixtures)
+    else:
+        data = StubMissEvan(episodes=args.episodes, comment_pages=args.comment_pages, danmakus=args.danmakus,
+                            payload_scale=args.payload_scale)
+
+    print(f"latency={args.latency}s jitter={args.jitter}s throttle={args.throttle} rate={args.rate:g}")
+    with StubServer(data, latency=args.latency, jitter=args.jitter, throttle_rps=args.throttle,
+                    retry_after=args.retry_after) as server, tempfile.TemporaryDirectory() as workdir:
+        for engine in args.engines.split(","):
+            if engine == "snapshot":
+                run_child(engine, server, args, workdir)
+            server.reset_stats()
+            result = run_child(engine, server, args, workdir)
+            print(f"{engine:<11} requests={server.requests:<5} 429s={server.throttled_requests:<4} "
+                  f"req/s={server.requests / result['wall']:8.1f} wall={result['wall']:7.2f}s "
+                  f"peak_rss={result['peak_rss'] / 2 ** 20:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Per-episode new paid UIDs and cross-drama growth: running UidSet differences versus FirstSeenIndex.
+
+    python -m benchmarks.bench_first_seen [dramas] [episodes] [uids_per_episode]
+"""
+import sys
+import time
+
+import numpy as np
+
+from missevan.firstseen import FirstSeenIndex
+from missevan.uidset import UidSet
+
+UID_SPACE = 400_000_000
+
+
+def synthetic_run(dramas, episodes, per_episode, seed=0):
+    """Episodes draw mostly from their drama's audience, which overlaps the previous drama's by about half."""
+    rng = np.random.default_rng(seed)
+    run = []
+    audience = rng.choice(UID_SPACE, size=per_episode * 3).astype(np.uint64)
+    for _ in range(dramas):
+        fresh = rng.choice(UID_SPACE, size=len(audience) // 2).astype(np.uint64)
+        audience = np.concatenate([rng.choice(audience, size=len(audience) // 2, replace=False), fresh])
+        run.append([UidSet(rng.choice(audience, size=per_episode)) for _ in range(episodes)])
+    return run
+
+
+def with_differences(run):
+    """What write_sound_data and process_drama_id did: a growing set per drama plus a drama-level difference."""
+    new_per_sound, growth = [], []
+    previous_paid_uids = UidSet()
+    for sounds in run:
+        seen = UidSet()
+        for uids in sounds:
+            new_per_sound.append(len(uids.difference(seen)))
+            seen.update(uids)
+        growth.append(len(seen.difference(previous_paid_uids)))
+        previous_paid_uids = seen
+    return np.array(new_per_sound), np.array(growth)
+
+
+def with_index(run):
+    index = FirstSeenIndex()
+    for drama_id, sounds in enumerate(run):
+        index.start_drama(drama_id)
+        for uids in sounds:
+            index.add(uids)
+    return index.new_per_sound(), index.growth_vs_previous()
+
+
+def main():
+    dramas = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    episodes = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    per_episode = int(sys.argv[3]) if len(sys.argv) > 3 else 20_000
+    run = synthetic_run(dramas, episodes, per_episode)
+    print(f"{dramas} dramas x {episodes} episodes x {per_episode} UIDs")
+    results = []
+    for label, compute in (("UidSet differences", with_differences), ("FirstSeenIndex", with_index)):
+        start = time.perf_counter()
+        results.append(compute(run))
+        print(f"{label:<20} {time.perf_counter() - start:.3f}s")
+    assert all(np.array_equal(a, b) for a, b in zip(*results))
+
+
+if __name__ == '__main__':
+    main()
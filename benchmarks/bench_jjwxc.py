@@ -0,0 +1,42 @@
+"""jjwxc ranking scrape against a stub site: detail pages one after another versus the bounded thread pool.
+
+    python -m benchmarks.bench_jjwxc [--novels 200] [--latency 0.05] [--jitter 0.04] [--workers 16]
+"""
+import argparse
+import time
+
+import jjwxc
+from benchmarks.stub_server import StubJjwxc, StubServer
+from missevan.titles import TitleIndex
+
+
+def scrape(max_workers):
+    ranked = jjwxc.parse_ranking(jjwxc.fetch_page(f"{jjwxc.BASE_URL}/topten.php?orderstr=7&t=1"))
+    titles = TitleIndex([(61001, "作品1号 第一季"), (61002, "作品5号")])
+    return jjwxc.get_novel_rows(ranked, titles, max_workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--novels", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.04)
+    parser.add_argument("--workers", type=int, default=jjwxc.MAX_WORKERS)
+    args = parser.parse_args()
+
+    with StubServer(StubJjwxc(args.novels), latency=args.latency, jitter=args.jitter) as server:
+        jjwxc.BASE_URL = server.base_url
+        print(f"{args.novels} novels, {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms per page")
+        results = []
+        for label, workers in (("sequential", 1), (f"{args.workers} workers", args.workers)):
+            server.reset_stats()
+            start = time.perf_counter()
+            results.append(scrape(workers))
+            print(f"{label:<12} {time.perf_counter() - start:.2f}s  {server.requests} requests, "
+                  f"{server.connections} connections")
+    assert results[0] == results[1]
+    assert [row[0] for row in results[1]] == [str(rank) for rank in range(1, args.novels + 1)]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""jjwxc page extraction: BeautifulSoup over the whole tree versus the precompiled lxml XPaths in `jjwxc.py`.
+
+    python -m benchmarks.bench_jjwxc_parse [--fixtures DIR] [--novels 200] [--chapters 120]
+
+With `--fixtures`, DIR holds saved pages: `topten*.html` rankings and `onebook*.html` novel pages, as the site
+served them (gb18030). Otherwise the pages come from the stub site.
+"""
+import argparse
+import glob
+import os
+import time
+
+import jjwxc
+from benchmarks.stub_server import StubJjwxc
+
+ROUNDS = 3
+
+
+def load_pages(args):
+    def read(pattern):
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.fixtures, pattern))):
+            with open(path, "rb") as f:
+                pages.append(f.read().decode(jjwxc.ENCODING, errors='replace'))
+        return pages
+
+    if args.fixtures:
+        return read("topten*.html"), read("onebook*.html")
+    site = StubJjwxc(args.novels, args.chapters)
+    decode = lambda body: body.decode(jjwxc.ENCODING)
+    return [decode(site.topten())], [decode(site.onebook(novelid)) for novelid in site.novel_ids()]
+
+
+def timed(function, pages):
+    best, results = None, None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        results = [function(page) for page in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures")
+    parser.add_argument("--novels", type=int, default=200)
+    parser.add_argument("--chapters", type=int, default=120)
+    args = parser.parse_args()
+    if jjwxc.lxml_html is None:
+        raise SystemExit("lxml is not installed; there is only the BeautifulSoup path to time")
+
+    rankings, novels = load_pages(args)
+    size = sum(len(page) for page in rankings + novels) / 1e6
+    print(f"{len(rankings)} ranking pages, {len(novels)} novel pages, {size:.1f}M characters, best of {ROUNDS}")
+    for label, parse, pages in (("ranking", jjwxc.parse_ranking, rankings),
+                                ("novel details", jjwxc.parse_novel_details, novels)):
+        soup_time, soup_results = timed(lambda page: parse(page, parser="html.parser"), pages)
+        lxml_time, lxml_results = timed(lambda page: parse(page, parser="lxml"), pages)
+        assert soup_results == lxml_results, f"{label}: lxml and BeautifulSoup disagree"
+        print(f"{label:<14} BeautifulSoup {soup_time:.3f}s   lxml {lxml_time:.3f}s   {soup_time / lxml_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
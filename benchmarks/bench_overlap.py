@@ -0,0 +1,65 @@
+"""Cross-drama overlap with Python sets (pairwise intersections, membership counts) versus AudienceOverlap.
+
+    python -m benchmarks.bench_overlap [dramas] [uid_pool]
+"""
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from missevan.overlap import AudienceOverlap
+from missevan.uidset import UidSet
+
+UID_SPACE = 400_000_000
+
+
+def synthetic_audiences(dramas, uid_pool, seed=0):
+    """Audiences of 2%-20% of a shared pool, biased towards a popular core the way real listeners overlap."""
+    rng = np.random.default_rng(seed)
+    pool = rng.choice(UID_SPACE, size=uid_pool, replace=False).astype(np.uint64)
+    popularity = 1.0 / np.sqrt(np.arange(1, uid_pool + 1))
+    audiences = {}
+    for drama in range(dramas):
+        size = int(uid_pool * rng.uniform(0.02, 0.2))
+        # Weighted sampling without replacement: top-k of Gumbel-perturbed log weights
+        keys = np.log(popularity) + rng.gumbel(size=uid_pool)
+        audiences[60000 + drama] = pool[np.argpartition(keys, -size)[-size:]]
+    return audiences
+
+
+def with_sets(audiences):
+    sets = {drama_id: set(uids.tolist()) for drama_id, uids in audiences.items()}
+    labels = list(sets)
+    union = set.union(*sets.values())
+    memberships = Counter(uid for uids in sets.values() for uid in uids)
+    exclusive = [sum(memberships[uid] == 1 for uid in sets[drama_id]) for drama_id in labels]
+    matrix = np.array([[len(sets[a] & sets[b]) for b in labels] for a in labels])
+    return matrix, np.array(exclusive), len(union)
+
+
+def with_bitmask_index(audiences):
+    overlap = AudienceOverlap({drama_id: UidSet.from_sorted_array(np.sort(uids)) for drama_id, uids in audiences.items()})
+    return overlap.intersection_matrix(), overlap.exclusive_counts(), overlap.union_size
+
+
+def measure(label, function, audiences):
+    start = time.perf_counter()
+    result = function(audiences)
+    print(f"{label:<16} union={result[2]:<9} wall={time.perf_counter() - start:.2f}s")
+    return result
+
+
+def main():
+    dramas = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    uid_pool = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    audiences = synthetic_audiences(dramas, uid_pool)
+    print(f"{dramas} dramas over {uid_pool} UIDs, {sum(map(len, audiences.values()))} memberships")
+    expected = measure("set operations", with_sets, audiences)
+    result = measure("bitmask index", with_bitmask_index, audiences)
+    assert np.array_equal(result[0], expected[0]) and np.array_equal(result[1], expected[1])
+    assert result[2] == expected[2]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Danmaku/comment crawl of a stub drama with heavy payloads: parsing on the I/O threads versus a process pool.
+
+    python -m benchmarks.bench_parse_pipeline [--episodes 30] [--danmakus 20000] [--processes N]
+
+The process pool only pays off with more than one core; on a single core this measures its overhead.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_server import StubMissEvan, StubServer
+from missevan import client
+from missevan.pipeline import ParsePipeline
+from missevan.uidset import UidSet
+
+WORKERS = 8
+
+
+def crawl(sound_ids, pipeline=None):
+    def crawl_sound(sound_id):
+        if pipeline is None:
+            return UidSet(client.fetch_all_danmakus(sound_id)).union(client.fetch_all_uids_by_comments(sound_id))
+        return pipeline.fetch_danmaku_uids(sound_id).union(pipeline.fetch_comment_uids(sound_id))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        uids = UidSet().union(*executor.map(crawl_sound, sound_ids))
+    return uids, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--episodes", type=int, default=30)
+    parser.add_argument("--danmakus", type=int, default=20000)
+    parser.add_argument("--comment-pages", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    data = StubMissEvan(episodes=args.episodes, comment_pages=args.comment_pages, danmakus=args.danmakus)
+    with StubServer(data) as server:
+        client.BASE_URL = server.base_url
+        client.configure_rate_limit(rate=1e6, burst=1e6, max_rate=1e6)
+        client.configure_cache(None)
+        client.configure_session(pool_size=WORKERS + client.COMMENT_WORKERS)
+        sound_ids = data.sound_ids()
+        crawl(sound_ids[:1])  # warm up the session pool
+
+        print(f"cpu_count={os.cpu_count()} episodes={args.episodes} danmakus={args.danmakus} "
+              f"comment_pages={args.comment_pages}")
+        thread_uids, thread_time = crawl(sound_ids)
+        print(f"threads only        uids={len(thread_uids):<8} wall={thread_time:.3f}s")
+        with ParsePipeline(args.processes) as pipeline:
+            crawl(sound_ids[:1], pipeline)  # spawn the workers outside the timed run
+            pool_uids, pool_time = crawl(sound_ids, pipeline)
+        print(f"threads + {pipeline.processes} procs  uids={len(pool_uids):<8} wall={pool_time:.3f}s "
+              f"speedup={thread_time / pool_time:.2f}x")
+        assert pool_uids == thread_uids
+
+
+if __name__ == '__main__':
+    main()
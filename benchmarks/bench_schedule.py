@@ -0,0 +1,65 @@
+"""Episode-order dispatch per drama versus the largest-first crawl plan, on stub dramas with one heavy finale.
+
+    python -m benchmarks.bench_schedule [--dramas 3] [--episodes 20] [--finale-pages 60] [--latency 0.02]
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_server import DRAMA_ID, StubMissEvan, StubServer
+from missevan import client
+from missevan.schedule import plan_crawl, requests_sent
+
+WORKERS = 4
+
+
+def crawl_sound(sound, sound_detail=None):
+    sound_detail = sound_detail or client.get_sound_detail(sound['sound_id'])
+    client.fetch_all_danmakus(sound['sound_id'])
+    client.fetch_all_uids_by_comments(sound['sound_id'])
+
+
+def episode_order(drama_ids):
+    """What `process_drama_id` did before: one pool per drama, sounds submitted in list order."""
+    for drama_id in drama_ids:
+        sound_lists = client.get_drama_sound_lists(drama_id)[0]
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            list(executor.map(crawl_sound, sound_lists))
+
+
+def largest_first(drama_ids):
+    plan = plan_crawl(drama_ids, max_workers=WORKERS + client.COMMENT_WORKERS)
+    for outcomes in plan.execute(lambda task: crawl_sound(task['sound'], task['sound_detail']), WORKERS).values():
+        for _, future in outcomes:
+            future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dramas", type=int, default=3)
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--comment-pages", type=int, default=2)
+    parser.add_argument("--finale-pages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    data = StubMissEvan(episodes=args.episodes, comment_pages=args.comment_pages, danmakus=200,
+                        finale_pages=args.finale_pages)
+    drama_ids = [str(DRAMA_ID + i) for i in range(args.dramas)]
+    with StubServer(data, latency=args.latency) as server:
+        client.BASE_URL = server.base_url
+        client.configure_cache(None)
+        client.configure_rate_limit(rate=1e6, burst=1e6, max_rate=1e6)
+        client.configure_session(pool_size=WORKERS + client.COMMENT_WORKERS)
+        for label, crawl in (("episode order", episode_order), ("largest first", largest_first)):
+            before = requests_sent()
+            start = time.perf_counter()
+            crawl(drama_ids)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<14} requests={requests_sent() - before:<5} wall={elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
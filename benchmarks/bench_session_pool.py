@@ -0,0 +1,65 @@
+"""Compare per-call requests.get against the pooled session on a 50-episode stub drama.
+
+    python -m benchmarks.bench_session_pool
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.stub_server import DRAMA_ID, StubMissEvan, StubServer
+from missevan import client
+
+WORKERS = 4
+
+
+def crawl_drama(drama_id, workers):
+    sound_lists = client.get_drama_sound_lists(drama_id)[0]
+
+    def crawl_sound(sound):
+        client.get_sound_detail(sound['sound_id'])
+        client.fetch_all_danmakus(sound['sound_id'])
+        client.fetch_all_uids_by_comments(sound['sound_id'])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(crawl_sound, sound_lists))
+    client.get_top_50_coin(drama_id)
+
+
+def unpooled_get(url, **kwargs):
+    return requests.get(url, headers=client.headers, **kwargs)
+
+
+def run(server, label, workers):
+    server.reset_stats()
+    start = time.perf_counter()
+    crawl_drama(DRAMA_ID, workers)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} requests={server.requests:<5} connections={server.connections:<5} wall={elapsed:.3f}s")
+    return server.connections, elapsed
+
+
+def main():
+    logging.disable(logging.ERROR)
+    with StubServer(StubMissEvan(episodes=50)) as server:
+        client.BASE_URL = server.base_url
+        # Measure connection reuse only, not the request pacing.
+        client.configure_rate_limit(rate=1e6, burst=1e6, max_rate=1e6)
+        client.configure_cache(None)
+
+        for workers in (1, WORKERS):
+            pooled_get = client.http_get
+            client.http_get = unpooled_get
+            try:
+                base_conns, base_time = run(server, f"requests.get x{workers}", workers)
+            finally:
+                client.http_get = pooled_get
+
+            client.configure_session(pool_size=workers)
+            pool_conns, pool_time = run(server, f"pooled session x{workers}", workers)
+            print(f"  -> {base_conns - pool_conns} handshakes saved, {base_time / pool_time:.2f}x faster\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Matching the jjwxc ranking against the catalogue: the old per-title column scan versus `TitleIndex`.
+
+    python -m benchmarks.bench_titles [--purchased purchased.json] [--titles jjwxc_200_with_dramaids.csv]
+
+The old scan re-cast the whole `name` column for every title and only found exact names; the index is built once
+and folds season suffixes, tags and punctuation. Matches are compared with the hand-filled drama IDs in --titles.
+"""
+import argparse
+import csv
+import json
+import time
+
+import pandas as pd
+
+from missevan.titles import TitleIndex
+
+ROUNDS = 20
+
+
+def scan(titles, purchased_df):
+    """What `check_novel_in_purchased` did for each ranked novel."""
+    return ['Yes' if title in purchased_df['name'].astype(str).values else 'No' for title in titles]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--purchased", default="purchased.json")
+    parser.add_argument("--titles", default="jjwxc_200_with_dramaids.csv")
+    args = parser.parse_args()
+
+    with open(args.titles, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    titles = [row[7] for row in rows]
+    with open(args.purchased, encoding="utf-8") as f:
+        purchased_df = pd.DataFrame(json.load(f))
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        found = scan(titles, purchased_df)
+    scan_time = (time.perf_counter() - start) / ROUNDS
+
+    start = time.perf_counter()
+    index = TitleIndex.from_file(args.purchased)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        matched = [index.lookup(title) for title in titles]
+    lookup_time = (time.perf_counter() - start) / ROUNDS
+
+    print(f"{len(titles)} titles against {len(index)} catalogue dramas, mean of {ROUNDS} rounds")
+    print(f"{'column scan':<14} {scan_time * 1000:8.2f} ms  {found.count('Yes')} titles found")
+    print(f"{'TitleIndex':<14} {lookup_time * 1000:8.2f} ms  {sum(map(bool, matched))} titles found "
+          f"(+{build_time * 1000:.1f} ms to build)")
+
+    # Hand-filled IDs that aren't in this catalogue dump can't be matched either way
+    hand = [{int(i) for i in row[8].split(',') if i} & index.names.keys() for row in rows]
+    agree = sum(set(ids) == expected for ids, expected in zip(matched, hand))
+    print(f"{agree}/{len(rows)} titles get exactly the hand-filled catalogue IDs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Memory and time of per-sound / per-drama UID aggregation with Python sets versus UidSet.
+
+    python -m benchmarks.bench_uidset [sounds] [uids_per_sound]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from missevan.uidset import UidSet
+
+UID_SPACE = 40_000_000
+
+
+def synthetic_sounds(sounds, uids_per_sound, seed=0):
+    """Each sound shares most of its audience with a drama-wide pool, like real paid episodes."""
+    rng = np.random.default_rng(seed)
+    pool = rng.choice(UID_SPACE, size=uids_per_sound * 3, replace=False)
+    for _ in range(sounds):
+        danmaku = rng.choice(pool, size=uids_per_sound // 2, replace=False).tolist()
+        comment = rng.choice(pool, size=uids_per_sound // 2, replace=False).tolist()
+        yield danmaku, comment
+
+
+def aggregate(set_type, sounds, uids_per_sound):
+    sound_data = []
+    total_paid_udis = set_type()
+    total_paid_danmaku_udis = set_type()
+    total_paid_comment_uids = set_type()
+    for danmaku, comment in synthetic_sounds(sounds, uids_per_sound):
+        danmaku_uids = set_type(danmaku)
+        comment_uids = set_type(comment)
+        total_sound_uids = danmaku_uids.union(comment_uids)
+        sound_data.append({'danmaku_uids': danmaku_uids, 'comment_uids': comment_uids,
+                           'total_sound_uids': total_sound_uids})
+        total_paid_udis.update(total_sound_uids)
+        total_paid_danmaku_udis.update(danmaku_uids)
+        total_paid_comment_uids.update(comment_uids)
+    only_danmaku = total_paid_danmaku_udis.difference(total_paid_comment_uids)
+    return sound_data, total_paid_udis, len(total_paid_udis), len(only_danmaku)
+
+
+def measure(label, set_type, sounds, uids_per_sound):
+    gc.collect()
+    start = time.perf_counter()
+    tracemalloc.start()
+    result = aggregate(set_type, sounds, uids_per_sound)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} total={result[2]:<9} only_danmaku={result[3]:<9} "
+          f"retained={retained / 2 ** 20:8.1f} MiB  peak={peak / 2 ** 20:8.1f} MiB  time={elapsed:.2f}s")
+    return result[2:]
+
+
+def main():
+    sounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    uids_per_sound = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    print(f"{sounds} sounds x {uids_per_sound} UIDs")
+    expected = measure("set", set, sounds, uids_per_sound)
+    result = measure("UidSet", UidSet, sounds, uids_per_sound)
+    assert result == expected
+
+
+if __name__ == '__main__':
+    main()
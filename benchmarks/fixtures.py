@@ -0,0 +1,86 @@
+"""Record real MissEvan responses to disk and serve them back through StubServer.
+
+    python -m benchmarks.fixtures <drama_id> <directory>
+
+Layout: <directory>/<endpoint>/<key>.json (getdm: .xml), e.g. getcomment/<sound_id>_<page>.json.
+"""
+import json
+import logging
+import os
+import sys
+from urllib.parse import quote
+
+from missevan import client
+
+
+def _path(directory, endpoint, key, extension="json"):
+    return os.path.join(directory, endpoint, f"{quote(str(key), safe='')}.{extension}")
+
+
+def _save(path, body: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(body)
+
+
+def record_fixtures(drama_id, directory):
+    """Fetch one drama (details, every sound, danmaku, all comment pages, reward rank) and save the raw bodies."""
+    response = client.http_get(client.drama_url(drama_id))
+    response.raise_for_status()
+    _save(_path(directory, "getdrama", drama_id), response.content)
+    _save(_path(directory, "reward_rank", drama_id), client.http_get(client.reward_url(drama_id)).content)
+
+    sound_lists = client.parse_drama_sound_lists(response.json())[0]
+    for sound in sound_lists:
+        sound_id = sound['sound_id']
+        _save(_path(directory, "getsound", sound_id), client.http_get(client.sound_url(sound_id)).content)
+        _save(_path(directory, "getdm", sound_id, "xml"), client.http_get(client.danmaku_url(sound_id)).content)
+        page = 1
+        while True:
+            response = client.http_get(client.comment_url(sound_id, page))
+            _save(_path(directory, "getcomment", f"{sound_id}_{page}"), response.content)
+            if not response.json().get("info", {}).get("comment", {}).get("hasMore"):
+                break
+            page += 1
+        logging.info(f"Recorded sound {sound_id} ({page} comment pages)")
+
+
+class FixtureMissEvan:
+    """StubServer data source backed by `record_fixtures` output; unrecorded requests answer 404."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _load(self, endpoint, key):
+        try:
+            with open(_path(self.directory, endpoint, key), "rb") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def getdrama(self, drama_id):
+        return self._load("getdrama", drama_id)
+
+    def getsound(self, sound_id):
+        return self._load("getsound", sound_id)
+
+    def getdm(self, sound_id):
+        try:
+            with open(_path(self.directory, "getdm", sound_id, "xml"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(sound_id)
+
+    def getcomment(self, sound_id, page, pagesize=100):
+        return self._load("getcomment", f"{sound_id}_{page}")
+
+    def reward_rank(self, drama_id):
+        return self._load("reward_rank", drama_id)
+
+    def search(self, name, page):
+        return self._load("search", f"{name}_{page}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    record_fixtures(sys.argv[1], sys.argv[2])
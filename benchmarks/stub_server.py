@@ -0,0 +1,297 @@
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DRAMA_ID = 50000
+SOUND_ID_BASE = 9000000
+SEARCH_PAGE_SIZE = 20
+
+
+class StubMissEvan:
+    """Deterministic synthetic data for a single drama, generated from a seed.
+
+    `payload_scale` multiplies the length of danmaku and comment text to emulate heavier responses;
+    `finale_pages`, when set, gives the last episode that many comment pages instead of `comment_pages`.
+    `catalogue`, a list of drama records newest first, backs the search endpoint in pages of `SEARCH_PAGE_SIZE`.
+    """
+
+    def __init__(self, episodes=50, comment_pages=3, danmakus=500, free_episodes=3, seed=0,
+                 newest_ctime=1710000000, payload_scale=1, finale_pages=None, catalogue=None):
+        self.episodes = episodes
+        self.comment_pages = comment_pages
+        self.finale_pages = finale_pages
+        self.danmakus = danmakus
+        self.free_episodes = free_episodes
+        self.seed = seed
+        self.newest_ctime = newest_ctime
+        self.payload_scale = payload_scale
+        self.catalogue = catalogue
+
+    def sound_ids(self):
+        return [SOUND_ID_BASE + i for i in range(self.episodes)]
+
+    def pages_for(self, sound_id):
+        if self.finale_pages is not None and sound_id == SOUND_ID_BASE + self.episodes - 1:
+            return self.finale_pages
+        return self.comment_pages
+
+    def _rng(self, *key):
+        return random.Random(":".join(map(str, (self.seed,) + key)))
+
+    def getdrama(self, drama_id):
+        episodes = [{
+            "sound_id": sound_id,
+            "soundstr": f"第{i + 1}集",
+            "need_pay": 0 if i < self.free_episodes else 1,
+        } for i, sound_id in enumerate(self.sound_ids())]
+        return {"info": {
+            "drama": {"id": drama_id, "name": f"Stub drama {drama_id}", "price": 199, "view_count": 123456,
+                      "catalog_name": "广播剧"},
+            "episodes": {"episode": episodes},
+        }}
+
+    def getsound(self, sound_id):
+        rng = self._rng("sound", sound_id)
+        return {"info": {"sound": {
+            "id": sound_id, "view_count": rng.randint(1000, 100000), "view_count_formatted": "",
+            "comment_count": self.pages_for(sound_id) * 100, "favorite_count": rng.randint(10, 1000),
+            "username": "stub", "create_time": 1700000000 + (sound_id - SOUND_ID_BASE) * 86400,
+        }}}
+
+    def getdm(self, sound_id):
+        rng = self._rng("dm", sound_id)
+        rows = []
+        for i in range(self.danmakus):
+            mode = 4 if rng.random() < 0.05 else 1
+            uid = rng.randint(1, 2_000_000)
+            date = 1700000000 + rng.randint(0, 90 * 86400)
+            rows.append(f'<d p="{i * 0.5:.2f},{mode},25,16777215,{date},0,{uid},{i}">'
+                        f'{"弹幕内容" * self.payload_scale}{i}</d>')
+        return ('<?xml version="1.0" encoding="UTF-8"?><i><chatserver>stub</chatserver>'
+                + "".join(rows) + "</i>").encode("utf-8")
+
+    def getcomment(self, sound_id, page, pagesize=100):
+        rng = self._rng("comment", sound_id, page)
+        pages = self.pages_for(sound_id)
+        datas = []
+        for i in range(pagesize if page <= pages else 0):
+            # order=3 lists the newest comments first.
+            ctime = self.newest_ctime - ((page - 1) * pagesize + i) * 600
+            datas.append({
+                "id": page * 1000 + i, "userid": rng.randint(1, 2_000_000), "ctime": ctime,
+                "comment_content": "评论内容" * 20 * self.payload_scale,
+                "subcomments": [{"id": page * 1000 + i * 10 + j, "userid": rng.randint(1, 2_000_000),
+                                 "ctime": ctime + j, "comment_content": "回复" * 10 * self.payload_scale}
+                                for j in range(rng.randint(0, 3))],
+            })
+        return {"info": {"comment": {
+            "Datas": datas, "hasMore": page < pages,
+            "pagination": {"p": page, "maxpage": pages, "count": pages * pagesize, "pagesize": pagesize},
+        }}}
+
+    def reward_rank(self, drama_id):
+        rng = self._rng("reward", drama_id)
+        return {"info": {"data": [{"id": rng.randint(1, 2_000_000), "coin": rng.randint(1, 5000)} for _ in range(50)]}}
+
+    def search(self, name, page):
+        if self.catalogue is not None:
+            matches = [drama for drama in self.catalogue if name in drama["name"]]
+            start = (page - 1) * SEARCH_PAGE_SIZE
+            return {"info": {
+                "Datas": matches[start:start + SEARCH_PAGE_SIZE],
+                "pagination": {"p": page, "maxpage": max(1, -(-len(matches) // SEARCH_PAGE_SIZE))},
+            }}
+        return {"info": {
+            "Datas": [{"id": DRAMA_ID, "name": name, "pay_type": 2}] if page == 1 else [],
+            "pagination": {"p": page, "maxpage": 1},
+        }}
+
+
+class StubJjwxc:
+    """Synthetic gb18030 jjwxc pages: a `topten.php` ranking of `novels` rows and one `onebook.php` per novel,
+    laid out the way `jjwxc.py` reads them (ranking in the third table, counters in the second table's last row).
+    `chapters` pads each novel page with a chapter table, the bulk of a real page.
+    """
+
+    def __init__(self, novels=200, chapters=120, seed=0):
+        self.novels = novels
+        self.chapters = chapters
+        self.seed = seed
+
+    def novel_ids(self):
+        return [3000000 + i * 7 for i in range(self.novels)]
+
+    def _rng(self, *key):
+        return random.Random(":".join(map(str, (self.seed,) + key)))
+
+    @staticmethod
+    def _page(title, tables):
+        nav = "<table><tr>" + "".join(f'<td><a href="/channel{i}.html">频道{i}</a></td>' for i in range(30)) + \
+              "</tr></table>"
+        return (f'<html><head><meta http-equiv="Content-Type" content="text/html; charset=gb18030">'
+                f'<title>{title}</title></head><body>{nav}{"".join(tables)}</body></html>').encode("gb18030")
+
+    def topten(self):
+        rows = ["<tr><th>序号</th><th>作者</th><th>作品</th><th>类型</th><th>进度</th><th>字数</th>"
+                "<th>作品积分</th><th>发表时间</th></tr>"]
+        for rank, novelid in enumerate(self.novel_ids(), 1):
+            rng = self._rng("rank", novelid)
+            rows.append(
+                f"<tr><td>{rank}</td><td><a href=\"oneauthor.php?authorid={rng.randint(1, 10 ** 6)}\">作者{rank}</a></td>"
+                f"<td><a href=\"onebook.php?novelid={novelid}\" title=\"简介\">作品{rank}号</a></td>"
+                f"<td>原创-纯爱-架空历史-爱情</td><td>{'完结' if rank % 3 else '连载'}</td>"
+                f"<td>{rng.randint(10 ** 5, 2 * 10 ** 6)}</td><td>{rng.randint(10 ** 8, 10 ** 11):,}</td>"
+                f"<td>2019-0{rank % 9 + 1}-1{rank % 9} 18:01:18</td></tr>")
+        return self._page("排行榜", ["<table><tr><td>榜单说明</td></tr></table>",
+                                     "<table>" + "".join(rows) + "</table>"])
+
+    def onebook(self, novelid):
+        rng = self._rng("novel", novelid)
+        info = ("<table>" + "".join(f"<tr><td>文案第{i}段：" + "很长的文案。" * 20 + "</td></tr>" for i in range(8)) +
+                f"<tr><td><span>总点击数：</span><span>{rng.randint(10 ** 4, 10 ** 7)}</span>"
+                f"<span>{rng.randint(10 ** 4, 10 ** 7)}</span><span>{rng.randint(10 ** 4, 10 ** 7)}</span>"
+                "</td></tr></table>")
+        chapters = "<table>" + "".join(
+            f'<tr><td>{i}</td><td><a href="onebook.php?novelid={novelid}&chapterid={i}">第{i}章</a></td>'
+            f'<td>本章内容提要{i}</td><td>{rng.randint(2000, 6000)}</td><td>2019-01-01 00:00:00</td></tr>'
+            for i in range(1, self.chapters + 1)) + "</table>"
+        return self._page(f"作品{novelid}", [info, chapters])
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        data = self.server.data
+        routes = {
+            "/dramaapi/getdrama": lambda: data.getdrama(int(query["drama_id"])),
+            "/sound/getsound": lambda: data.getsound(int(query["soundid"])),
+            "/sound/getdm": lambda: data.getdm(int(query["soundid"])),
+            "/site/getcomment": lambda: data.getcomment(int(query["e_id"]), int(query.get("p", 1)),
+                                                        int(query.get("pagesize", 100))),
+            "/reward/user-reward-rank": lambda: data.reward_rank(int(query["drama_id"])),
+            "/dramaapi/search": lambda: data.search(query.get("s", ""), int(query.get("page", 1))),
+            "/topten.php": lambda: data.topten(),
+            "/onebook.php": lambda: data.onebook(int(query["novelid"])),
+        }
+        with self.server.stats_lock:
+            self.server.requests += 1
+        self.server.delay()
+        if self.server.throttled():
+            self.send_response(429)
+            self.send_header("Retry-After", str(self.server.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if parsed.path not in routes:
+            self.send_error(404)
+            return
+
+        try:
+            payload = routes[parsed.path]()
+        except KeyError:
+            # Missing query parameter, or no recorded fixture for it
+            self.send_error(404)
+            return
+        if parsed.path.endswith(".php"):
+            body, content_type = payload, "text/html"
+        elif isinstance(payload, bytes):
+            body, content_type = payload, "text/xml; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local MissEvan (or jjwxc) stand-in serving `data` (a StubMissEvan, FixtureMissEvan or StubJjwxc).
+
+    Every response is delayed by `latency` +/- `jitter` seconds. With `throttle_rps` set, requests beyond that rate
+    (burst of one second's worth) get a 429 with `Retry-After: retry_after`.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, data, address=("127.0.0.1", 0), latency=0.0, jitter=0.0, throttle_rps=None,
+                 retry_after=1):
+        super().__init__(address, StubHandler)
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rps = throttle_rps
+        self.retry_after = retry_after
+        self.random = random.Random(0)
+        self.stats_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.throttled_requests = 0
+        self.tokens = throttle_rps or 0
+        self.refilled_at = time.monotonic()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    def throttled(self):
+        if not self.throttle_rps:
+            return False
+        with self.stats_lock:
+            now = time.monotonic()
+            self.tokens = min(self.throttle_rps, self.tokens + (now - self.refilled_at) * self.throttle_rps)
+            self.refilled_at = now
+            if self.tokens < 1:
+                self.throttled_requests += 1
+                return True
+            self.tokens -= 1
+            return False
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # Clients that give up on a throttled connection are expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.connections = 0
+            self.requests = 0
+            self.throttled_requests = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -1,20 +1,96 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
+from requests.adapters import HTTPAdapter
+
+from missevan.titles import TitleIndex
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
+
+BASE_URL = os.environ.get("JJWXC_BASE_URL", "https://www.jjwxc.net")
+ENCODING = 'gb18030'
+MAX_WORKERS = 16
+REQUEST_TIMEOUT = 15
+# The first of these that exists is the catalogue novel titles are matched against
+PURCHASED_PATHS = ('purchased.csv', 'purchased.json')
+
+COUNTER_FIELDS = ("总书评数", "当前被收藏数", "营养液数")
+PARSER = "lxml" if lxml_html is not None else "html.parser"
+
+if lxml_html is not None:
+    # Compiled once: the same few paths run against every page
+    _TABLES = etree.XPath("//table")
+    _ROWS = etree.XPath(".//tr")
+    _CELLS = etree.XPath(".//td | .//th")
+    _HREFS = etree.XPath(".//a/@href")
+    _SPANS = etree.XPath(".//span")
+    # BeautifulSoup's get_text leaves script and style contents out; so does this
+    _TEXTS = etree.XPath(".//text()[not(ancestor::script or ancestor::style)]")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """One keep-alive session for the ranking page and every detail page, pooled for MAX_WORKERS threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def fetch_page(url) -> str:
+    """Page text decoded as gb18030 straight from the bytes, skipping requests' charset sniffing."""
+    response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.content.decode(ENCODING, errors='replace')
+
+
+def _text(element) -> str:
+    """`get_text(strip=True)` for an lxml element."""
+    return "".join(text.strip() for text in _TEXTS(element))
+
+
+def _parse_lxml(html, parser):
+    """lxml document for `html`, or None when BeautifulSoup was asked for, lxml is missing or the page defeats it."""
+    if parser != "lxml" or lxml_html is None or not html:
+        return None
+    try:
+        return lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError) as e:
+        logging.warning(f"lxml could not parse page, falling back to BeautifulSoup: {e}")
+        return None
+
+
+def parse_novel_details(html, parser=PARSER):
+    """The three counters of a novel page: the 2nd-4th spans of the last row of its second table, when the page
+    has at least three tables. `parser="html.parser"` forces the BeautifulSoup path.
+    """
+    data = dict.fromkeys(COUNTER_FIELDS)
+    document = _parse_lxml(html, parser)
+    if document is not None:
+        tables = _TABLES(document)
+        rows = _ROWS(tables[1]) if len(tables) >= 3 else []
+        spans = _SPANS(rows[-1]) if rows else []
+        if len(spans) >= 4:
+            data.update(zip(COUNTER_FIELDS, map(_text, spans[1:4])))
+        return data
 
-
-def get_novel_details_by_novel_id(novelid):
-    url = f"https://www.jjwxc.net/onebook.php?novelid={novelid}"
-    response = requests.get(url)
-    response.encoding = 'gb18030'
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    data = {
-        "总书评数": None,
-        "当前被收藏数": None,
-        "营养液数": None
-    }
-
+    soup = BeautifulSoup(html, 'html.parser')
     tables = soup.find_all('table')
     if len(tables) >= 3:
         last_tr = tables[1].find_all('tr')[-1]
@@ -27,56 +103,99 @@ def get_novel_details_by_novel_id(novelid):
     return data
 
 
-def check_novel_in_purchased(novel_name, purchased_df):
-    return 'Yes' if novel_name in purchased_df['name'].astype(str).values else 'No'
-
-
-def get_novel_rows(third_table, purchased_df):
-    rows = []
-    for tr in third_table.find_all('tr')[1:]:
-        cells = tr.find_all(['td', 'th'])
-        # row = [cell.get_text(strip=True).replace(',', '') if i == 6 else cell.get_text(strip=True) for i, cell in enumerate(cells)]
-        row = []
-        for i, cell in enumerate(cells):
-            if i != 3:
-                text = cell.get_text(strip=True)
-                if i == 6:
-                    text = text.replace(',', '')  # Remove comma if index is 6
-                row.append(text)
-
-        novelid = None
-        for a in tr.find_all('a', href=True):
-            if 'onebook.php?novelid=' in a['href']:
-                novelid = a['href'].split('novelid=')[-1]
-                break
-
-        name = row[2]
-        if novelid:
-            novel_details = get_novel_details_by_novel_id(novelid)
-            row.append(novelid)
-            row.append(check_novel_in_purchased(name, purchased_df))
-            row.extend([
-                novel_details.get('总书评数'),
-                novel_details.get('当前被收藏数'),
-                novel_details.get('营养液数')
-            ])
-
-        rows.append(row)
+def get_novel_details_by_novel_id(novelid):
+    url = f"{BASE_URL}/onebook.php?novelid={novelid}"
+    try:
+        html = fetch_page(url)
+    except requests.RequestException as e:
+        logging.error(f"Error fetching novel details for novel ID {novelid}: {e}")
+        html = ''
+    return parse_novel_details(html)
+
+
+def load_titles(paths=PURCHASED_PATHS) -> TitleIndex:
+    for path in paths:
+        if os.path.exists(path):
+            return TitleIndex.from_file(path)
+    raise FileNotFoundError(f"No purchased catalogue found (looked for {', '.join(paths)})")
+
+
+def ranking_entry(texts, hrefs):
+    """(row, novelid) of one ranking row from its cell texts and link targets. The 4th cell is dropped and the
+    commas of the 7th (作品积分) removed.
+    """
+    row = []
+    for i, text in enumerate(texts):
+        if i != 3:
+            if i == 6:
+                text = text.replace(',', '')  # Remove comma if index is 6
+            row.append(text)
+
+    novelid = None
+    for href in hrefs:
+        if 'onebook.php?novelid=' in href:
+            novelid = href.split('novelid=')[-1]
+            break
+    return row, novelid
+
+
+def parse_ranking(html, parser=PARSER):
+    """(row, novelid) of every entry in the ranking page's third table, in rank order; None if there is no such
+    table. Only those rows' cells and links are read, with lxml unless it is missing or `parser="html.parser"`.
+    """
+    document = _parse_lxml(html, parser)
+    if document is not None:
+        tables = _TABLES(document)
+        if len(tables) < 3:
+            return None
+        return [ranking_entry([_text(cell) for cell in _CELLS(tr)], _HREFS(tr)) for tr in _ROWS(tables[2])[1:]]
+
+    tables = BeautifulSoup(html, 'html.parser').find_all('table')
+    if len(tables) < 3:
+        return None
+    return [ranking_entry([cell.get_text(strip=True) for cell in tr.find_all(['td', 'th'])],
+                          [a['href'] for a in tr.find_all('a', href=True)])
+            for tr in tables[2].find_all('tr')[1:]]
+
+
+def get_novel_rows(ranked, titles, max_workers=MAX_WORKERS):
+    """`parse_ranking` entries as output rows in rank order, each with its novel's details and the IDs of the
+    catalogue dramas adapted from it (`titles`, a `TitleIndex`). Detail pages are fetched `max_workers` at a time,
+    so the table takes about as long as its slowest page rather than the sum of them.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        details = executor.map(lambda novelid: get_novel_details_by_novel_id(novelid) if novelid else None,
+                               [novelid for _, novelid in ranked])
+        rows = []
+        for (row, novelid), novel_details in zip(ranked, details):
+            name = row[2]
+            if novelid:
+                row.append(novelid)
+                row.append(titles.drama_column(name))
+                row.extend([
+                    novel_details.get('总书评数'),
+                    novel_details.get('当前被收藏数'),
+                    novel_details.get('营养液数')
+                ])
+
+            rows.append(row)
     return rows
 
 
 def runner():
-    purchased_df = pd.read_csv('purchased.csv')
-    url = "https://www.jjwxc.net/topten.php?orderstr=7&t=1"
-    response = requests.get(url)
-    response.encoding = 'gb18030'
-    soup = BeautifulSoup(response.text, 'html.parser')
+    titles = load_titles()
+    url = f"{BASE_URL}/topten.php?orderstr=7&t=1"
+    ranked = parse_ranking(fetch_page(url))
 
-    tables = soup.find_all('table')
-    if len(tables) >= 3:
-        third_table = tables[2]
+    if ranked is not None:
         headers = ['序号', '作者', '作品', '进度', '字数', '作品积分', '发表时间', 'NovelID', 'Drama', '总书评数', '当前被收藏数', '营养液数']
-        rows = get_novel_rows(third_table, purchased_df)
+        rows = get_novel_rows(ranked, titles)
+        for row in rows:
+            if len(row) > 8 and not row[8]:
+                candidates = titles.candidates(row[2], limit=3)
+                if candidates:
+                    logging.info(f"No catalogue drama named {row[2]!r}; closest: "
+                                 + ", ".join(f"{name} ({drama_id}, {score:.2f})" for score, drama_id, name in candidates))
 
         df = pd.DataFrame(rows, columns=headers)
         df.to_csv('jjwxc_200.csv', index=False)
@@ -85,4 +204,5 @@ def runner():
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     runner()
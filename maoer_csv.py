@@ -1,98 +1,14 @@
 import csv
-import datetime
 import logging
-import time
-import xml.etree.ElementTree as ETree
-import requests
+
+from missevan.client import fetch_all_danmakus, fetch_all_uids_by_comments, get_drama_sound_lists, get_sound_detail, \
+    log_cache_summary
+from missevan.metrics import write_metrics
+from missevan.uidset import UidSet
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-BASE_URL = "https://www.missevan.com"
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept-Language': 'en-US,en;q=0.9'
-}
-
-def get_drama_sound_lists(drama_id):
-    url = f"{BASE_URL}/dramaapi/getdrama?drama_id={drama_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json().get("info", {})
-        drama = data.get('drama', {})
-        episodes = data.get("episodes", {}).get("episode", [])
-
-        sound_lists = [{
-            "sound_id": episode["sound_id"],
-            "sound_title": episode["soundstr"],
-            'need_pay': episode.get("need_pay", 0)
-        } for episode in episodes]
-
-        return sound_lists, drama.get('name'), drama.get('price'), drama.get('view_count'), drama.get('catalog_name')
-    except requests.RequestException as e:
-        logging.error(f"Error fetching sound lists for drama ID {drama_id}: {e}")
-        return [], '', '', '', ''
-
-
-def get_sound_detail(sound_id):
-    url = f"{BASE_URL}/sound/getsound?soundid={sound_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        sound = response.json().get("info", {}).get("sound", {})
-
-        return {
-            "sound_id": sound_id,
-            "view_count": sound.get("view_count"),
-            "view_count_formatted": sound.get("view_count_formatted"),
-            "comment_count": sound.get("comment_count"),
-            "favorite_count": sound.get("favorite_count"),
-            "username": sound.get("username"),
-            "create_time": datetime.datetime.fromtimestamp(sound.get('create_time', 0)) if sound.get('create_time', 0) > 0 else None,
-        }
-    except requests.RequestException as e:
-        logging.error(f"Error fetching sound detail for sound ID {sound_id}: {e}")
-        return {}
-
-
-def fetch_all_danmakus(sound_id):
-    url = f"{BASE_URL}/sound/getdm?soundid={sound_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        pp_comments_xml = ETree.fromstring(response.text)
-        return {int(item.attrib["p"].split(",")[6]) for item in pp_comments_xml.findall("d") if
-                item.attrib["p"].split(",")[1] != "4"}
-    except (requests.RequestException, ETree.ParseError) as e:
-        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
-        return set()
-
-
-def extract_user_ids(data):
-    user_ids = {int(comment["userid"]) for comment in data["info"]["comment"]["Datas"]}
-    user_ids.update(
-        int(sub["userid"]) for comment in data["info"]["comment"]["Datas"] for sub in comment["subcomments"])
-    return user_ids
-
-
-def fetch_all_uids_by_comments(sound_id):
-    endpoint = f"{BASE_URL}/site/getcomment?type=1&e_id={sound_id}&order=3&p={{}}&pagesize=100"
-    comments_uids = set()
-    page = 1
-
-    while True:
-        response = requests.get(endpoint.format(page), headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        comments_uids.update(extract_user_ids(data))
-
-        if not data["info"]["comment"]["hasMore"]:
-            break
-        page += 1
-
-    return comments_uids
-
 
 def get_user_input():
     return input("Enter the drama ids (separate with commas, e.g, 62452,68690,72732,74464,74005,68204,74309,52382): ")
@@ -101,8 +17,8 @@ def get_user_input():
 def process_sound(sound):
     sound_id = sound.get('sound_id')
     sound_detail = get_sound_detail(sound_id)
-    danmaku_uids = fetch_all_danmakus(sound_id)
-    comment_uids = fetch_all_uids_by_comments(sound_id)
+    danmaku_uids = UidSet(fetch_all_danmakus(sound_id))
+    comment_uids = UidSet(fetch_all_uids_by_comments(sound_id))
 
     sound_detail.update({
         'sound_id': sound_id,
@@ -120,13 +36,13 @@ def process_drama_id(drama_id, sound_writer, drama_writer):
     logging.info(f"Processing drama: (ID: {drama_id})")
     sound_lists, name, price, view_count, catalog_name = get_drama_sound_lists(drama_id)
     sound_data = []
-    total_paid_udis = set()
-    total_free_udis = set()
+    total_paid_udis = UidSet()
+    total_free_udis = UidSet()
 
-    total_paid_danmaku_udis = set()
-    total_paid_comment_uids = set()
-    total_free_danmaku_udis = set()
-    total_free_comment_uids = set()
+    total_paid_danmaku_udis = UidSet()
+    total_paid_comment_uids = UidSet()
+    total_free_danmaku_udis = UidSet()
+    total_free_comment_uids = UidSet()
 
     paid_view_count = 0
     free_view_count = 0
@@ -182,7 +98,7 @@ def process_drama_id(drama_id, sound_writer, drama_writer):
 def runner():
     drama_ids = get_user_input()
     drama_sound = {}
-    all_paid_total_uids = set()
+    all_paid_total_uids = UidSet()
 
     with open('sound_data.csv', mode='a', newline='', encoding='utf-8') as sound_file, \
             open('drama_data.csv', mode='a', newline='', encoding='utf-8') as drama_file:
@@ -207,12 +123,11 @@ def runner():
             drama_sound[drama_id] = sound_data
             all_paid_total_uids.update(total_paid_udis)
 
-            print("--------------------- Taking a break -------------------------")
-            time.sleep(60)
-
     print('-------------------------------------------------')
     print(f"All Paid Total UIDs: {len(all_paid_total_uids)}")
     print('-------------------------------------------------')
+    log_cache_summary()
+    write_metrics()
     return drama_sound, all_paid_total_uids
 
 
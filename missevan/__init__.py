@@ -0,0 +1,32 @@
+from missevan.client import (
+    BASE_URL,
+    headers,
+    configure_session,
+    configure_rate_limit,
+    get_rate_limiter,
+    create_session,
+    get_session,
+    parse_drama_sound_lists,
+    parse_sound_detail,
+    fetch_drama_sound_lists,
+    get_drama_sound_lists,
+    get_paid_sound_lists,
+    fetch_sound_detail,
+    get_sound_detail,
+    parse_danmakus,
+    fetch_danmakus,
+    fetch_all_danmakus,
+    fetch_danmaku_activity,
+    extract_user_ids,
+    fetch_comment_page,
+    fetch_comment_page_uids,
+    fetch_all_uids_by_comments,
+    fetch_comment_activity,
+    fetch_reward_page,
+    fetch_top_50_rewards,
+    sum_reward_coin,
+    get_top_50_coin,
+    fetch_top_50_reward,
+    fetch_search_page,
+    fetch_drama_sound_by_search,
+)
@@ -0,0 +1,121 @@
+import datetime
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from missevan.uidset import UID_DTYPE, UidSet
+
+DAY = 86400
+# missevan dates are Beijing time, which has no DST, so a fixed offset puts every timestamp on the right day.
+UTC_OFFSET = 8 * 3600
+# 1970-01-01 was a Thursday; shifting by three days makes weeks start on Monday.
+WEEK_SHIFT = 3
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class ActivityLog:
+    """(uid, unix time) pairs of danmaku or comments, kept as two parallel NumPy arrays: 16 bytes per event.
+
+    `update` buffers the arrays it is given and concatenates them on first read, like `UidSet`, so a sound's pages
+    and a drama's sounds can be folded in one at a time.
+    """
+
+    __slots__ = ("_uids", "_times", "_pending")
+
+    def __init__(self, uids=(), times=()):
+        self._uids = np.asarray(uids, dtype=UID_DTYPE)
+        self._times = np.asarray(times, dtype=np.int64)
+        if self._uids.shape != self._times.shape:
+            raise ValueError(f"{len(self._uids)} uids but {len(self._times)} times")
+        self._pending = []
+
+    def _compact(self) -> None:
+        if self._pending:
+            logs = [self, *self._pending]
+            self._uids = np.concatenate([log._uids for log in logs])
+            self._times = np.concatenate([log._times for log in logs])
+            self._pending = []
+
+    @property
+    def uids(self) -> np.ndarray:
+        self._compact()
+        return self._uids
+
+    @property
+    def times(self) -> np.ndarray:
+        self._compact()
+        return self._times
+
+    def update(self, *others: "ActivityLog") -> None:
+        for other in others:
+            other._compact()
+            self._pending.append(other)
+
+    def __len__(self) -> int:
+        return len(self._uids) + sum(len(other._uids) for other in self._pending)
+
+    def uid_set(self) -> UidSet:
+        return UidSet(self.uids)
+
+    def to_bytes(self) -> bytes:
+        """Event count, then the little-endian uid and time columns, zlib-compressed."""
+        return zlib.compress(np.int64(len(self)).tobytes() + self.uids.astype("<u8").tobytes() +
+                             self.times.astype("<i8").tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ActivityLog":
+        raw = zlib.decompress(data)
+        count = int(np.frombuffer(raw, dtype="<i8", count=1)[0])
+        uids = np.frombuffer(raw, dtype="<u8", count=count, offset=8)
+        times = np.frombuffer(raw, dtype="<i8", count=count, offset=8 + 8 * count)
+        return cls(uids, times)
+
+    def __repr__(self) -> str:
+        return f"ActivityLog({len(self)} events)"
+
+
+def days(times: np.ndarray, utc_offset: int = UTC_OFFSET) -> np.ndarray:
+    """Local day number (days since 1970-01-01) of each unix time."""
+    return (np.asarray(times, dtype=np.int64) + utc_offset) // DAY
+
+
+def weeks(times: np.ndarray, utc_offset: int = UTC_OFFSET) -> np.ndarray:
+    """Local Monday-based week number of each unix time; `week * 7 - WEEK_SHIFT` is the Monday's day number."""
+    return (days(times, utc_offset) + WEEK_SHIFT) // 7
+
+
+def distinct_active(periods: np.ndarray, uids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted distinct periods and the number of distinct UIDs active in each."""
+    order = np.lexsort((uids, periods))
+    periods, uids = periods[order], uids[order]
+    distinct = np.ones(len(periods), dtype=bool)
+    distinct[1:] = (periods[1:] != periods[:-1]) | (uids[1:] != uids[:-1])
+    return np.unique(periods[distinct], return_counts=True)
+
+
+def first_activity(log: ActivityLog) -> Tuple[np.ndarray, np.ndarray]:
+    """Each distinct UID (sorted) and the unix time of its earliest event."""
+    uids, times = log.uids, log.times
+    order = np.lexsort((times, uids))
+    uids, times = uids[order], times[order]
+    first = np.ones(len(uids), dtype=bool)
+    first[1:] = uids[1:] != uids[:-1]
+    return uids[first], times[first]
+
+
+def activity_rows(drama_id, log: ActivityLog, utc_offset: int = UTC_OFFSET) -> List[List]:
+    """One row per active day, then per active week: drama ID, 'day'/'week', the period's first date, distinct
+    active UIDs, and UIDs whose first activity in `log` falls in that period.
+    """
+    _, first_times = first_activity(log)
+    rows = []
+    for period, bucket, to_day in (("day", days, lambda day: day), ("week", weeks, lambda week: week * 7 - WEEK_SHIFT)):
+        active_periods, active = distinct_active(bucket(log.times, utc_offset), log.uids)
+        first_periods, first = np.unique(bucket(first_times, utc_offset), return_counts=True)
+        # Every first activity is also an activity, so its period is always among the active ones.
+        newcomers = np.zeros(len(active_periods), dtype=np.int64)
+        newcomers[np.searchsorted(active_periods, first_periods)] = first
+        for value, active_count, new_count in zip(active_periods.tolist(), active.tolist(), newcomers.tolist()):
+            rows.append([drama_id, period, EPOCH + datetime.timedelta(days=to_day(value)), active_count, new_count])
+    return rows
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Set
+
+import aiohttp
+
+from missevan import client
+from missevan.comments import loads, scan_comment_page
+from missevan.metrics import REGISTRY as metrics, endpoint
+from missevan.ratelimit import AdaptiveRateLimiter
+from missevan.uidset import UidSet
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST = 16
+
+
+class AsyncCrawler:
+    """Crawl whole dramas with every sound-detail, danmaku and comment request scheduled as a coroutine.
+
+    `max_concurrency` caps in-flight requests overall and `per_host` caps them per host, both enforced
+    by the aiohttp connector. Request starts are paced by `limiter`, the client's shared rate limiter by default.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                 limiter: AdaptiveRateLimiter = None):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.limiter = limiter or client.get_rate_limiter()
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host)
+        self.session = aiohttp.ClientSession(headers=client.headers, connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def get(self, url: str) -> bytes:
+        """Response body, served from or revalidated against the client's response cache where it applies."""
+        cache = client.get_response_cache()
+        if cache is not None and not cache.ttl_for(url):
+            cache = None
+        name = endpoint(url)
+        entry = cache.lookup(url) if cache is not None else None
+        if entry and entry['fresh']:
+            metrics.inc("http_cache_hits_total", endpoint=name)
+            return entry['body']
+        validators = cache.validators(entry) if entry else None
+
+        attempt = 0
+        while True:
+            wait = self.limiter.reserve()
+            await asyncio.sleep(wait)
+            start = time.monotonic()
+            async with self.session.get(url, headers=validators) as response:
+                body = await response.read()
+            elapsed = time.monotonic() - start
+            self.limiter.record(response.status, elapsed)
+            metrics.observe("rate_limit_wait_seconds", wait, endpoint=name)
+            metrics.observe("http_request_seconds", elapsed, endpoint=name)
+            metrics.inc("http_responses_total", endpoint=name, status=str(response.status))
+            metrics.inc("http_response_bytes_total", len(body), endpoint=name)
+            if not self.limiter.should_retry(response.status, attempt):
+                if response.status == 304 and entry:
+                    cache.revalidated(url)
+                    return entry['body']
+                response.raise_for_status()
+                if cache is not None and response.status == 200:
+                    cache.store(url, body, response.headers.get('Content-Type'), response.headers.get('ETag'),
+                                response.headers.get('Last-Modified'))
+                return body
+
+            metrics.inc("http_retries_total", endpoint=name)
+            delay = self.limiter.backoff(attempt, response.headers.get('Retry-After'))
+            logging.warning(f"HTTP {response.status} for {url}, retrying in {delay:.1f} seconds")
+            attempt += 1
+
+    async def get_json(self, url: str):
+        body = await self.get(url)
+        with metrics.timer("parse_seconds", stage="json"):
+            return loads(body)
+
+    async def get_comment_page(self, sound_id, page: int):
+        body = await self.get(client.comment_url(sound_id, page))
+        with metrics.timer("parse_seconds", stage="comment_scan"):
+            return scan_comment_page(body)
+
+    async def get_drama_sound_lists(self, drama_id):
+        try:
+            return client.parse_drama_sound_lists(await self.get_json(client.drama_url(drama_id)))
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error(f"Error fetching sound lists for drama ID {drama_id}: {e}")
+            return [], '', '', '', ''
+
+    async def get_sound_detail(self, sound_id) -> Dict:
+        try:
+            return client.parse_sound_detail(sound_id, await self.get_json(client.sound_url(sound_id)))
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error(f"Error fetching sound detail for sound ID {sound_id}: {e}")
+            return {}
+
+    async def fetch_all_danmakus(self, sound_id) -> Set[int]:
+        try:
+            body = await self.get(client.danmaku_url(sound_id))
+            with metrics.timer("parse_seconds", stage="danmaku"):
+                return client.parse_danmakus(body)
+        except aiohttp.ClientError as e:
+            logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
+            return set()
+
+    async def walk_comment_pages(self, sound_id, page: int) -> Set[int]:
+        comments_uids = set()
+
+        while True:
+            page_uids, data = await self.get_comment_page(sound_id, page)
+            if not data:
+                break
+
+            comments_uids.update(page_uids)
+
+            if not data["info"]["comment"]["hasMore"]:
+                break
+            page += 1
+
+        return comments_uids
+
+    async def fetch_all_uids_by_comments(self, sound_id) -> Set[int]:
+        comments_uids, data = await self.get_comment_page(sound_id, 1)
+        if not data:
+            return set()
+
+        if not data["info"]["comment"]["hasMore"]:
+            return comments_uids
+
+        page_count = client.comment_page_count(data)
+        if page_count is None or page_count < 2:
+            comments_uids.update(await self.walk_comment_pages(sound_id, 2))
+            return comments_uids
+
+        pages = await asyncio.gather(*(self.get_comment_page(sound_id, page) for page in range(2, page_count + 1)))
+        for page_uids, _ in pages:
+            comments_uids.update(page_uids)
+
+        last_page = pages[-1][1]
+        if last_page and last_page["info"]["comment"]["hasMore"]:
+            comments_uids.update(await self.walk_comment_pages(sound_id, page_count + 1))
+
+        return comments_uids
+
+    async def get_top_50_coin(self, drama_id) -> int:
+        try:
+            data = await self.get_json(client.reward_url(drama_id))
+            return client.sum_reward_coin(data.get("info", {}).get("data") or [])
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error(f"Error fetching top 50 reward for drama ID {drama_id}: {e}")
+            return 0
+
+    async def process_sound(self, sound) -> Dict:
+        sound_id = sound.get('sound_id')
+        sound_detail, danmaku_uids, comment_uids = await asyncio.gather(
+            self.get_sound_detail(sound_id),
+            self.fetch_all_danmakus(sound_id),
+            self.fetch_all_uids_by_comments(sound_id),
+        )
+        danmaku_uids = UidSet(danmaku_uids)
+        comment_uids = UidSet(comment_uids)
+
+        sound_detail.update({
+            'sound_id': sound_id,
+            'sound_title': sound.get('sound_title'),
+            'need_pay': sound.get('need_pay'),
+            'danmaku_uids': danmaku_uids,
+            'comment_uids': comment_uids,
+            'total_sound_uids': danmaku_uids.union(comment_uids),
+        })
+        return sound_detail
+
+    async def crawl_drama(self, drama_id) -> Dict:
+        """Return the drama's metadata, its `sound_data` in episode order and `total_paid_udis`."""
+        logging.info(f"Processing drama: (ID: {drama_id})")
+        (sound_lists, name, price, view_count, catalog_name), top_50_coin = await asyncio.gather(
+            self.get_drama_sound_lists(drama_id),
+            self.get_top_50_coin(drama_id),
+        )
+        sound_data = await asyncio.gather(*(self.process_sound(sound) for sound in sound_lists))
+
+        total_paid_udis = UidSet()
+        for sound_detail in sound_data:
+            if sound_detail['need_pay'] > 0:
+                total_paid_udis.update(sound_detail['total_sound_uids'])
+
+        return {
+            'drama_id': drama_id,
+            'name': name,
+            'price': price,
+            'view_count': view_count,
+            'catalog_name': catalog_name,
+            'top_50_coin': top_50_coin,
+            'sound_data': list(sound_data),
+            'total_paid_udis': total_paid_udis,
+        }
+
+    async def crawl_dramas(self, drama_ids: Iterable) -> List[Dict]:
+        return list(await asyncio.gather(*(self.crawl_drama(drama_id) for drama_id in drama_ids)))
+
+
+async def _crawl_dramas(drama_ids, max_concurrency, per_host):
+    async with AsyncCrawler(max_concurrency, per_host) as crawler:
+        return await crawler.crawl_dramas(drama_ids)
+
+
+def crawl_dramas(drama_ids: Iterable, max_concurrency: int = DEFAULT_CONCURRENCY,
+                 per_host: int = DEFAULT_PER_HOST) -> List[Dict]:
+    """Blocking entry point for scripts: crawl every drama concurrently and return results in input order."""
+    return asyncio.run(_crawl_dramas(list(drama_ids), max_concurrency, per_host))
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+DEFAULT_CACHE_DB = "missevan_cache.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+# Seconds a response stays fresh, per endpoint path. Endpoints not listed here are never cached: danmaku and
+# comment pages change constantly and are covered by the snapshot store instead.
+DEFAULT_TTLS = {
+    "/dramaapi/getdrama": 12 * 3600,
+    "/sound/getsound": 12 * 3600,
+    "/reward/user-reward-rank": 12 * 3600,
+    "/dramaapi/search": 24 * 3600,
+}
+
+
+class ResponseCache:
+    """On-disk (SQLite) cache of GET response bodies keyed by full URL, with per-endpoint TTLs,
+    ETag/Last-Modified revalidation and least-recently-used eviction above `max_bytes`.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_DB, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttls: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Every lookup commits an accessed_at update; WAL with synchronous=NORMAL keeps that off the fsync path
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    content_type TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+        self.size = self.connection.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()[0]
+
+    def ttl_for(self, url: str) -> int:
+        return self.ttls.get(urlparse(url).path, 0)
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Cached entry for `url` with a `fresh` flag, or None. Fresh lookups count as hits; misses are counted by
+        `store` when the response is actually downloaded.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, content_type, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,)).fetchone()
+            if row is None:
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+            fresh = now - row[4] < self.ttl_for(url)
+            if fresh:
+                self.hits += 1
+        return {'body': row[0], 'content_type': row[1], 'etag': row[2], 'last_modified': row[3], 'fresh': fresh}
+
+    @staticmethod
+    def validators(entry: Dict) -> Dict[str, str]:
+        """Conditional request headers for a stale entry."""
+        validators = {}
+        if entry['etag']:
+            validators['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            validators['If-Modified-Since'] = entry['last_modified']
+        return validators
+
+    def revalidated(self, url: str) -> None:
+        """The server answered 304: the stale entry is fresh again."""
+        with self.lock, self.connection:
+            self.revalidations += 1
+            self.connection.execute("UPDATE responses SET stored_at = ? WHERE url = ?", (time.time(), url))
+
+    def store(self, url: str, body: bytes, content_type: Optional[str] = None, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> None:
+        now = time.time()
+        with self.lock, self.connection:
+            previous = self.connection.execute("SELECT LENGTH(body) FROM responses WHERE url = ?", (url,)).fetchone()
+            self.misses += 1
+            if previous is not None:
+                self.size -= previous[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, content_type, etag, last_modified, now, now))
+            self.size += len(body)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes:
+            row = self.connection.execute(
+                "SELECT url, LENGTH(body) FROM responses ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            self.connection.execute("DELETE FROM responses WHERE url = ?", (row[0],))
+            self.size -= row[1]
+            self.evictions += 1
+
+    def summary(self) -> str:
+        return (f"Response cache: {self.hits} hits, {self.revalidations} revalidated, {self.misses} misses, "
+                f"{self.evictions} evicted, {self.size / 2 ** 20:.1f} MiB on disk")
+
+    def close(self) -> None:
+        self.connection.close()
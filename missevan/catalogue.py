@@ -0,0 +1,247 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from missevan import client
+from missevan.titles import DEFAULT_PURCHASED, TitleIndex
+
+DEFAULT_CATALOGUE = "purchased.catalogue"
+MAGIC = b"MECATLG1"
+# Magic, record count, then the byte offsets of the name and detail sections; the record array follows at 32
+HEADER = struct.Struct("<8sI4xQQ")
+RECORD_DTYPE = np.dtype([
+    ("id", "<i8"), ("pay_type", "<i2"), ("integrity", "<i2"), ("cover_color", "<i4"),
+    ("name_start", "<u4"), ("name_end", "<u4"), ("details_start", "<u8"), ("details_end", "<u8"),
+])
+INT_FIELDS = ("pay_type", "integrity", "cover_color")
+HOT_FIELDS = ("id", "name") + INT_FIELDS
+MISSING = -1
+
+
+class CatalogueDrama:
+    """One catalogue record's hot fields. The rest of the record (abstract, cover, newest, ...) is only decoded
+    by `details()`.
+    """
+
+    __slots__ = ("id", "name", "pay_type", "integrity", "cover_color", "_catalogue", "_row")
+
+    def __init__(self, catalogue: "Catalogue", row: int):
+        record = catalogue.records[row]
+        self.id = int(record["id"])
+        self.name = catalogue.name(row)
+        self.pay_type = int(record["pay_type"])
+        self.integrity = int(record["integrity"])
+        self.cover_color = int(record["cover_color"])
+        self._catalogue = catalogue
+        self._row = row
+
+    def details(self) -> Dict:
+        return self._catalogue.details(self._row)
+
+    def to_dict(self) -> Dict:
+        """The record as `purchased.json` holds it."""
+        drama = {field: getattr(self, field) for field in HOT_FIELDS}
+        drama = {field: value for field, value in drama.items() if value != MISSING}
+        drama.update(self.details())
+        return drama
+
+    def __repr__(self) -> str:
+        return f"CatalogueDrama(id={self.id}, name={self.name!r}, pay_type={self.pay_type})"
+
+
+class Catalogue:
+    """Read-only view of a catalogue file written by `write_catalogue`.
+
+    Opening maps the file and reads the header; `ids`, `pay_types` and the other fixed-width fields are numpy
+    views of the mapped record array, so nothing is parsed up front. Names are decoded per record on demand, the
+    id and name indexes are built on first use, and the long fields are JSON decoded only for `details`.
+    """
+
+    def __init__(self, path: str = DEFAULT_CATALOGUE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, self._names_offset, self._details_offset = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a catalogue file")
+        self.records = np.frombuffer(self._map, RECORD_DTYPE, count, HEADER.size)
+        self._id_order: Optional[np.ndarray] = None
+        self._by_name: Optional[Dict[str, List[int]]] = None
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.records["id"]
+
+    @property
+    def pay_types(self) -> np.ndarray:
+        return self.records["pay_type"]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def name(self, row: int) -> str:
+        record = self.records[row]
+        start = self._names_offset + int(record["name_start"])
+        return self._map[start:self._names_offset + int(record["name_end"])].decode("utf-8")
+
+    def names(self) -> List[str]:
+        # One slice of the map for the whole section, then plain bytes slicing: no per-row numpy scalar access
+        blob = self._map[self._names_offset:self._details_offset]
+        return [blob[start:end].decode("utf-8")
+                for start, end in zip(self.records["name_start"].tolist(), self.records["name_end"].tolist())]
+
+    def details(self, row: int) -> Dict:
+        record = self.records[row]
+        start = self._details_offset + int(record["details_start"])
+        return json.loads(self._map[start:self._details_offset + int(record["details_end"])])
+
+    def __getitem__(self, row: int) -> CatalogueDrama:
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return CatalogueDrama(self, row % len(self))
+
+    def __iter__(self) -> Iterator[CatalogueDrama]:
+        return (CatalogueDrama(self, row) for row in range(len(self)))
+
+    def row_of(self, drama_id) -> Optional[int]:
+        """Row of `drama_id`, by binary search over the ids sorted once on first use."""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._id_order]
+        position = int(np.searchsorted(sorted_ids, int(drama_id)))
+        if position < len(sorted_ids) and sorted_ids[position] == int(drama_id):
+            return int(self._id_order[position])
+        return None
+
+    def get(self, drama_id) -> Optional[CatalogueDrama]:
+        row = self.row_of(drama_id)
+        return None if row is None else CatalogueDrama(self, row)
+
+    def __contains__(self, drama_id) -> bool:
+        return self.row_of(drama_id) is not None
+
+    def by_name(self, name: str) -> List[CatalogueDrama]:
+        """Dramas named exactly `name`; see `titles()` for season- and punctuation-insensitive matching."""
+        if self._by_name is None:
+            self._by_name = {}
+            for row, drama_name in enumerate(self.names()):
+                self._by_name.setdefault(drama_name, []).append(row)
+        return [CatalogueDrama(self, row) for row in self._by_name.get(name, ())]
+
+    def titles(self) -> TitleIndex:
+        return TitleIndex(zip(self.ids.tolist(), self.names()))
+
+    def dramas(self) -> Iterator[Dict]:
+        """Every full record, in catalogue order."""
+        return (drama.to_dict() for drama in self)
+
+    def close(self) -> None:
+        self.records = None
+        self._id_order = None
+        try:
+            self._map.close()
+        except BufferError:
+            # A caller still holds one of the numpy views; the mapping goes away with the last of them
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_catalogue(dramas: Iterable[Dict], path: str = DEFAULT_CATALOGUE) -> int:
+    """Write drama records (`purchased.json` items) as a catalogue file, replacing `path` atomically. Later
+    duplicates of an id are dropped. Returns the number of records written.
+    """
+    rows, names, details = [], bytearray(), bytearray()
+    seen = set()
+    for drama in dramas:
+        drama_id = int(drama['id'])
+        if drama_id in seen:
+            continue
+        seen.add(drama_id)
+        name = str(drama.get('name', '')).encode("utf-8")
+        rest = json.dumps({key: value for key, value in drama.items() if key not in HOT_FIELDS},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        rows.append((drama_id,) + tuple(MISSING if drama.get(field) is None else int(drama[field])
+                                        for field in INT_FIELDS) +
+                    (len(names), len(names) + len(name), len(details), len(details) + len(rest)))
+        names += name
+        details += rest
+
+    records = np.array(rows, dtype=RECORD_DTYPE)
+    names_offset = HEADER.size + records.nbytes
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records), names_offset, names_offset + len(names)))
+        f.write(records.tobytes())
+        f.write(names)
+        f.write(details)
+    os.replace(temp_path, path)
+    return len(records)
+
+
+def convert(source: str = DEFAULT_PURCHASED, path: str = DEFAULT_CATALOGUE) -> int:
+    with open(source, encoding="utf-8") as f:
+        count = write_catalogue(json.load(f), path)
+    logging.info(f"Wrote {count} dramas from {source} to {path}")
+    return count
+
+
+def open_catalogue(path: str = DEFAULT_CATALOGUE, source: str = DEFAULT_PURCHASED) -> Catalogue:
+    """The catalogue at `path`, first (re)built from `source` if that dump is newer than it or it doesn't exist."""
+    if os.path.exists(source) and (not os.path.exists(path) or os.path.getmtime(source) > os.path.getmtime(path)):
+        convert(source, path)
+    return Catalogue(path)
+
+
+def _changed(stored: Dict, fetched: Dict) -> bool:
+    # Search results carry fields the dump may not have; only the ones it keeps are compared
+    return any(key in fetched and fetched[key] != value for key, value in stored.items())
+
+
+def refresh(path: str = DEFAULT_CATALOGUE, query: str = "", full: bool = False,
+            paid_only: bool = True) -> Tuple[int, int]:
+    """Merge drama search results for `query` into the catalogue and return (added, updated).
+
+    Results come newest first, so the walk stops at the first page that brings nothing new or changed unless
+    `full` is set. Every page is revalidated with the server, since a cached search page (fresh for a day) would
+    hide dramas listed since. New dramas go to the front, as in `purchased.json`; changed ones are updated in
+    place. The file is only rewritten when something changed.
+    """
+    with Catalogue(path) as catalogue:
+        dramas = list(catalogue.dramas())
+    rows = {drama['id']: row for row, drama in enumerate(dramas)}
+    added, added_ids, updated = [], set(), 0
+    page = 1
+    while True:
+        results, more = client.fetch_search_page(query, page, revalidate=True)
+        fresh = False
+        for drama in results:
+            if (paid_only and not drama.get('pay_type')) or drama['id'] in added_ids:
+                continue
+            row = rows.get(drama['id'])
+            if row is None:
+                added.append(drama)
+                added_ids.add(drama['id'])
+                fresh = True
+            elif _changed(dramas[row], drama):
+                dramas[row] = {**dramas[row], **drama}
+                updated += 1
+                fresh = True
+        if not more or not (fresh or full):
+            break
+        page += 1
+
+    if added or updated:
+        write_catalogue(added + dramas, path)
+    logging.info(f"Catalogue refresh read {page} search pages: {len(added)} new and {updated} updated dramas")
+    return len(added), updated
@@ -0,0 +1,602 @@
+import datetime
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from missevan.cache import DEFAULT_CACHE_DB, ResponseCache
+from missevan.activity import ActivityLog
+from missevan.comments import extract_user_ids, loads, scan_comment_activity, scan_comment_page
+from missevan.danmaku import (CHUNK_SIZE as DANMAKU_CHUNK_SIZE, DateMask, collect_danmaku_activity,
+                              collect_danmaku_uids, collect_danmaku_uids_since)
+from missevan.metrics import COUNT_BOUNDS, REGISTRY as metrics, endpoint
+from missevan.ratelimit import AdaptiveRateLimiter
+
+BASE_URL = os.environ.get("MISSEVAN_BASE_URL", "https://www.missevan.com")
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+DEFAULT_POOL_SIZE = 10
+COMMENT_PAGE_SIZE = 100
+COMMENT_WORKERS = 8
+
+# (sound_id, page) -> (UIDs extracted from the page, decoded page; falsy when there is no page)
+PageFetcher = Callable[[object, int], Tuple[Set[int], dict]]
+
+_session = None
+_session_lock = threading.Lock()
+_limiter = AdaptiveRateLimiter()
+_comment_executor = None
+_cache = None
+_cache_enabled = os.environ.get("MISSEVAN_CACHE", "1") != "0"
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """Build a keep-alive session whose connection pool fits `pool_size` concurrent workers."""
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """Replace the shared session, e.g. to match a larger ThreadPoolExecutor."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(pool_size)
+    return _session
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def configure_rate_limit(**kwargs) -> AdaptiveRateLimiter:
+    """Replace the shared rate limiter; accepts the AdaptiveRateLimiter arguments (rate, burst, max_rate, ...)."""
+    global _limiter
+    _limiter = AdaptiveRateLimiter(**kwargs)
+    return _limiter
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    return _limiter
+
+
+def configure_cache(path: Optional[str] = DEFAULT_CACHE_DB, **kwargs) -> Optional[ResponseCache]:
+    """Replace the shared response cache (ResponseCache arguments: max_bytes, ttls); `path=None` disables caching."""
+    global _cache, _cache_enabled
+    with _session_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = ResponseCache(path, **kwargs) if path else None
+        _cache_enabled = _cache is not None
+    return _cache
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    global _cache
+    if _cache is None and _cache_enabled:
+        with _session_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def log_cache_summary() -> None:
+    cache = get_response_cache()
+    if cache is not None:
+        logging.info(cache.summary())
+
+
+def drama_url(drama_id) -> str:
+    return f"{BASE_URL}/dramaapi/getdrama?drama_id={drama_id}"
+
+
+def sound_url(sound_id) -> str:
+    return f"{BASE_URL}/sound/getsound?soundid={sound_id}"
+
+
+def danmaku_url(sound_id) -> str:
+    return f"{BASE_URL}/sound/getdm?soundid={sound_id}"
+
+
+def comment_url(sound_id, page: int) -> str:
+    return f"{BASE_URL}/site/getcomment?type=1&e_id={sound_id}&order=3&p={page}&pagesize={COMMENT_PAGE_SIZE}"
+
+
+def reward_url(drama_id) -> str:
+    return f"{BASE_URL}/reward/user-reward-rank?drama_id={drama_id}&period=3"
+
+
+def _cached_response(url: str, entry: Dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry['body']
+    response.headers = CaseInsensitiveDict({'Content-Type': entry['content_type'] or ''})
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def http_get(url: str, revalidate: bool = False, **kwargs) -> requests.Response:
+    """GET through the response cache for the endpoints it covers (see `missevan.cache.DEFAULT_TTLS`).
+
+    Fresh entries are served without a request; stale ones, and every entry when `revalidate` is set, are
+    revalidated with If-None-Match/If-Modified-Since.
+    """
+    cache = get_response_cache()
+    if cache is None or kwargs.get('stream'):
+        return _rate_limited_get(url, **kwargs)
+    key = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+    if not cache.ttl_for(key):
+        return _rate_limited_get(url, **kwargs)
+
+    entry = cache.lookup(key)
+    if entry and entry['fresh'] and not revalidate:
+        metrics.inc("http_cache_hits_total", endpoint=endpoint(key))
+        return _cached_response(key, entry)
+    if entry:
+        kwargs['headers'] = {**kwargs.get('headers', {}), **cache.validators(entry)}
+    response = _rate_limited_get(url, **kwargs)
+    if response.status_code == 304 and entry:
+        cache.revalidated(key)
+        return _cached_response(key, entry)
+    if response.status_code == 200:
+        cache.store(key, response.content, response.headers.get('Content-Type'), response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'))
+    return response
+
+
+def _rate_limited_get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared session and rate limiter, retrying 429/5xx responses with backoff.
+
+    Records latency, status and (unless streaming) body size per endpoint in the metrics registry.
+    """
+    name = endpoint(url)
+    attempt = 0
+    while True:
+        start = time.monotonic()
+        _limiter.acquire()
+        sent = time.monotonic()
+        response = get_session().get(url, **kwargs)
+        elapsed = time.monotonic() - sent
+        _limiter.record(response.status_code, elapsed)
+        metrics.observe("rate_limit_wait_seconds", sent - start, endpoint=name)
+        metrics.observe("http_request_seconds", elapsed, endpoint=name)
+        metrics.inc("http_responses_total", endpoint=name, status=str(response.status_code))
+        if not kwargs.get('stream'):
+            metrics.inc("http_response_bytes_total", len(response.content), endpoint=name)
+        if not _limiter.should_retry(response.status_code, attempt):
+            return response
+
+        metrics.inc("http_retries_total", endpoint=name)
+        retry_after = response.headers.get('Retry-After')
+        # Hand the connection back before sleeping; a streamed getdm body would otherwise hold it through the retry
+        response.close()
+        delay = _limiter.backoff(attempt, retry_after)
+        logging.warning(f"HTTP {response.status_code} for {url}, retrying in {delay:.1f} seconds")
+        attempt += 1
+
+
+def parse_drama_sound_lists(data):
+    info = data.get("info", {})
+    drama = info.get('drama', {})
+    episodes = info.get("episodes", {}).get("episode", [])
+
+    sound_lists = [{
+        "sound_id": episode["sound_id"],
+        "sound_title": episode["soundstr"],
+        'need_pay': episode.get("need_pay", 0)
+    } for episode in episodes]
+
+    return sound_lists, drama.get('name'), drama.get('price'), drama.get('view_count'), drama.get('catalog_name')
+
+
+def fetch_drama_sound_lists(drama_id):
+    """`get_drama_sound_lists`, raising on a failed request instead of returning an empty drama."""
+    response = http_get(drama_url(drama_id))
+    response.raise_for_status()
+    with metrics.timer("parse_seconds", stage="drama"):
+        return parse_drama_sound_lists(response.json())
+
+
+def get_drama_sound_lists(drama_id):
+    try:
+        return fetch_drama_sound_lists(drama_id)
+    except requests.RequestException as e:
+        logging.error(f"Error fetching sound lists for drama ID {drama_id}: {e}")
+        return [], '', '', '', ''
+
+
+def get_paid_sound_lists(drama_id) -> List[Dict]:
+    sound_lists = get_drama_sound_lists(drama_id)[0]
+    return [sound for sound in sound_lists if sound['need_pay'] > 0]
+
+
+def parse_sound_detail(sound_id, data):
+    sound = data.get("info", {}).get("sound", {})
+
+    return {
+        "sound_id": sound_id,
+        "view_count": sound.get("view_count"),
+        "view_count_formatted": sound.get("view_count_formatted"),
+        "comment_count": sound.get("comment_count"),
+        "favorite_count": sound.get("favorite_count"),
+        "username": sound.get("username"),
+        "create_time": datetime.datetime.fromtimestamp(sound.get('create_time', 0)) if sound.get('create_time', 0) > 0 else None,
+    }
+
+
+def fetch_sound_detail(sound_id):
+    """`get_sound_detail`, raising on a failed request instead of returning {}."""
+    response = http_get(sound_url(sound_id))
+    response.raise_for_status()
+    with metrics.timer("parse_seconds", stage="sound"):
+        return parse_sound_detail(sound_id, response.json())
+
+
+def get_sound_detail(sound_id):
+    try:
+        return fetch_sound_detail(sound_id)
+    except requests.RequestException as e:
+        logging.error(f"Error fetching sound detail for sound ID {sound_id}: {e}")
+        return {}
+
+
+def parse_danmakus(xml_data: bytes, skip: Optional[DateMask] = None) -> Set[int]:
+    """Collect danmaku sender UIDs, ignoring mode 4 (bottom) danmaku and any whose unix date `skip` rejects."""
+    return collect_danmaku_uids([xml_data], skip)
+
+
+class MeteredStream:
+    """`iter_content` chunks of a streamed response, timing the reads so the consumer's remaining time is parse time.
+
+    Body download time and size go to the registry when the stream is exhausted.
+    """
+
+    def __init__(self, response: requests.Response, url: str, chunk_size: int = DANMAKU_CHUNK_SIZE):
+        self.response = response
+        self.endpoint = endpoint(url)
+        self.chunk_size = chunk_size
+        self.download_seconds = 0.0
+
+    def __iter__(self):
+        chunks = self.response.iter_content(self.chunk_size)
+        size = 0
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            self.download_seconds += time.perf_counter() - start
+            if chunk is None:
+                break
+            size += len(chunk)
+            yield chunk
+        metrics.observe("http_body_seconds", self.download_seconds, endpoint=self.endpoint)
+        metrics.inc("http_response_bytes_total", size, endpoint=self.endpoint)
+
+
+def _parse_stream(response: requests.Response, url: str, parse: Callable):
+    stream = MeteredStream(response, url)
+    start = time.perf_counter()
+    result = parse(stream)
+    metrics.observe("parse_seconds", time.perf_counter() - start - stream.download_seconds, stage="danmaku")
+    return result
+
+
+def fetch_danmakus(sound_id, skip: Optional[DateMask] = None) -> Set[int]:
+    """`fetch_all_danmakus`, raising on a failed request instead of returning an empty set."""
+    url = danmaku_url(sound_id)
+    with http_get(url, stream=True) as response:
+        response.raise_for_status()
+        return _parse_stream(response, url, lambda chunks: collect_danmaku_uids(chunks, skip))
+
+
+def fetch_all_danmakus(sound_id, skip: Optional[DateMask] = None) -> Set[int]:
+    try:
+        return fetch_danmakus(sound_id, skip)
+    except requests.RequestException as e:
+        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
+        return set()
+
+
+def fetch_danmaku_activity(sound_id, skip: Optional[DateMask] = None) -> ActivityLog:
+    """(uid, date) of every danmaku `fetch_all_danmakus` would count."""
+    url = danmaku_url(sound_id)
+    try:
+        with http_get(url, stream=True) as response:
+            response.raise_for_status()
+            return _parse_stream(response, url, lambda chunks: collect_danmaku_activity(chunks, skip))
+    except requests.RequestException as e:
+        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
+        return ActivityLog()
+
+
+def fetch_danmakus_since(sound_id, since: int = 0,
+                         skip: Optional[DateMask] = None) -> Tuple[Set[int], int]:
+    """UIDs of danmaku dated at or after the unix date `since`, plus the newest date seen (`since` if none)."""
+    url = danmaku_url(sound_id)
+    try:
+        with http_get(url, stream=True) as response:
+            response.raise_for_status()
+            return _parse_stream(response, url, lambda chunks: collect_danmaku_uids_since(chunks, since, skip))
+    except requests.RequestException as e:
+        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
+        return set(), since
+
+
+def fetch_comment_page(sound_id, page: int):
+    response = http_get(comment_url(sound_id, page))
+    response.raise_for_status()
+    with metrics.timer("parse_seconds", stage="comment_json"):
+        return loads(response.content)
+
+
+def fetch_comment_page_uids(sound_id, page: int, skip: Optional[DateMask] = None) -> Tuple[Set[int], dict]:
+    """`extract_user_ids` of one page fused with decoding it; see `missevan.comments.scan_comment_page`."""
+    response = http_get(comment_url(sound_id, page))
+    response.raise_for_status()
+    with metrics.timer("parse_seconds", stage="comment_scan"):
+        return scan_comment_page(response.content, skip)
+
+
+def comment_page_count(data) -> Optional[int]:
+    """Total number of comment pages according to the first page's pagination, or None if it doesn't say."""
+    pagination = data["info"]["comment"].get("pagination") or {}
+    if pagination.get("maxpage"):
+        return int(pagination["maxpage"])
+    if pagination.get("count"):
+        pagesize = int(pagination.get("pagesize") or COMMENT_PAGE_SIZE)
+        return -(-int(pagination["count"]) // pagesize)
+    return None
+
+
+def get_comment_executor() -> ThreadPoolExecutor:
+    """Pool shared by every sound's comment fan-out, so concurrent sounds can't multiply the page workers."""
+    global _comment_executor
+    if _comment_executor is None:
+        with _session_lock:
+            if _comment_executor is None:
+                _comment_executor = ThreadPoolExecutor(max_workers=COMMENT_WORKERS, thread_name_prefix="comments")
+    return _comment_executor
+
+
+def walk_comment_pages(sound_id, page: int, fetch_page: PageFetcher = fetch_comment_page_uids, empty=set):
+    """Follow `hasMore` one page at a time starting at `page`, folding each page's result into `empty()`."""
+    comments_uids = empty()
+
+    while True:
+        page_uids, data = fetch_page(sound_id, page)
+        if not data:
+            break
+
+        comments_uids.update(page_uids)
+
+        if not data["info"]["comment"]["hasMore"]:
+            break
+        page += 1
+
+    return comments_uids
+
+
+def metered_extract(extract: Callable[[dict], Set[int]], pages: List[int]) -> Callable[[dict], Set[int]]:
+    """Wrap a page extractor to time it and count the pages it sees (appended to `pages`)."""
+    def extract_page(data):
+        pages.append(1)
+        with metrics.timer("parse_seconds", stage="comment_extract"):
+            return extract(data)
+    return extract_page
+
+
+def comment_page_fetcher(extract: Callable[..., Set[int]], pages: List[int],
+                         skip: Optional[DateMask] = None) -> PageFetcher:
+    """Fetch one page and extract its UIDs, counting non-empty pages into `pages`. The default extractor takes the
+    fused `fetch_comment_page_uids` path; any other extractor gets the fully decoded page and is timed.
+    A `skip` mask is passed on to `extract` as its `skip` keyword.
+    """
+    if skip is not None and extract is not extract_user_ids:
+        extract = functools.partial(extract, skip=skip)
+
+    def fetch_page(sound_id, page):
+        if extract is extract_user_ids:
+            page_uids, data = fetch_comment_page_uids(sound_id, page, skip)
+        else:
+            data = fetch_comment_page(sound_id, page)
+            with metrics.timer("parse_seconds", stage="comment_extract"):
+                page_uids = extract(data) if data else set()
+        if data:
+            pages.append(1)
+        return page_uids, data
+    return fetch_page
+
+
+def fetch_all_uids_by_comments(sound_id, extract: Callable[..., Set[int]] = extract_user_ids,
+                               skip: Optional[DateMask] = None) -> Set[int]:
+    """Fetch page 1, then fan the remaining pages out over the comment pool when the page count is known.
+    Comments whose `ctime` the `skip` mask covers are left out.
+    """
+    pages = []
+    comments_uids = _fetch_all_comment_pages(sound_id, comment_page_fetcher(extract, pages, skip))
+    metrics.observe("comment_pages_per_sound", len(pages), bounds=COUNT_BOUNDS)
+    return comments_uids
+
+
+def _fetch_all_comment_pages(sound_id, fetch_page: PageFetcher, empty=set):
+    comments_uids, data = fetch_page(sound_id, 1)
+    if not data:
+        return empty()
+
+    if not data["info"]["comment"]["hasMore"]:
+        return comments_uids
+
+    page_count = comment_page_count(data)
+    if page_count is None or page_count < 2:
+        comments_uids.update(walk_comment_pages(sound_id, 2, fetch_page, empty))
+        return comments_uids
+
+    last_page = None
+    pages = get_comment_executor().map(lambda page: fetch_page(sound_id, page), range(2, page_count + 1))
+    for page_uids, page_data in pages:
+        comments_uids.update(page_uids)
+        last_page = page_data
+
+    # Comments posted while we were fetching can push the total past the first page's estimate.
+    if last_page and last_page["info"]["comment"]["hasMore"]:
+        comments_uids.update(walk_comment_pages(sound_id, page_count + 1, fetch_page, empty))
+
+    return comments_uids
+
+
+def fetch_comment_page_activity(sound_id, page: int, skip: Optional[DateMask] = None) -> Tuple[ActivityLog, dict]:
+    response = http_get(comment_url(sound_id, page))
+    response.raise_for_status()
+    with metrics.timer("parse_seconds", stage="comment_scan"):
+        return scan_comment_activity(response.content, skip)
+
+
+def fetch_comment_activity(sound_id, skip: Optional[DateMask] = None) -> ActivityLog:
+    """(uid, ctime) of every comment and reply `fetch_all_uids_by_comments` would count, fetched the same way."""
+    pages = []
+
+    def fetch_page(sound_id, page):
+        log, data = fetch_comment_page_activity(sound_id, page, skip)
+        if data:
+            pages.append(1)
+        return log, data
+
+    log = _fetch_all_comment_pages(sound_id, fetch_page, ActivityLog)
+    metrics.observe("comment_pages_per_sound", len(pages), bounds=COUNT_BOUNDS)
+    return log
+
+
+def comment_ctimes(data) -> List[int]:
+    """`ctime` of every top-level comment on a page, in page order."""
+    return [int(comment["ctime"]) for comment in data["info"]["comment"]["Datas"]]
+
+
+def latest_comment_ctime(data) -> int:
+    return max((int(item["ctime"]) for comment in data["info"]["comment"]["Datas"]
+                for item in [comment, *comment["subcomments"]]), default=0)
+
+
+def fetch_comment_uids_since(sound_id, since: int = 0, extract: Callable[..., Set[int]] = extract_user_ids,
+                             skip: Optional[DateMask] = None) -> Tuple[Set[int], int]:
+    """Comment UIDs posted since `since` plus the newest `ctime` seen.
+
+    With `since` at 0 this is a full `fetch_all_uids_by_comments`. Otherwise pages are walked from the newest
+    (order=3) and the walk stops at the first page that reaches comments older than `since`. If a page turns out
+    not to be newest-first, the walk keeps going to the end instead of trusting the order.
+
+    Pages are ordered by top-level comment only, so a new reply to a comment older than `since` sits on a page the
+    walk never reaches and is missed; this is why the scripts only crawl incrementally when asked to.
+    """
+    if skip is not None:
+        extract = functools.partial(extract, skip=skip)
+    if not since:
+        latest = []
+
+        def extract_tracking(data):
+            latest.append(latest_comment_ctime(data))
+            return extract(data)
+
+        comments_uids = fetch_all_uids_by_comments(sound_id, extract_tracking)
+        return comments_uids, max(latest, default=0)
+
+    comments_uids = set()
+    latest = since
+    page = 1
+    pages = []
+    extract = metered_extract(extract, pages)
+    while True:
+        data = fetch_comment_page(sound_id, page)
+        if not data:
+            break
+
+        comments_uids.update(extract(data))
+        latest = max(latest, latest_comment_ctime(data))
+
+        ctimes = comment_ctimes(data)
+        newest_first = all(a >= b for a, b in zip(ctimes, ctimes[1:]))
+        if not data["info"]["comment"]["hasMore"] or (newest_first and ctimes and ctimes[-1] < since):
+            break
+        page += 1
+
+    metrics.observe("comment_pages_per_sound", len(pages), bounds=COUNT_BOUNDS)
+    return comments_uids, latest
+
+
+def fetch_reward_page(drama_id) -> List[Dict]:
+    """`fetch_top_50_rewards`, raising on a failed request or a body that isn't JSON instead of returning []."""
+    response = http_get(reward_url(drama_id))
+    response.raise_for_status()
+    return response.json().get("info", {}).get("data") or []
+
+
+def fetch_top_50_rewards(drama_id) -> List[Dict]:
+    try:
+        return fetch_reward_page(drama_id)
+    except (requests.RequestException, ValueError) as e:
+        logging.error(f"Error fetching top 50 reward for drama ID {drama_id}: {e}")
+        return []
+
+
+def sum_reward_coin(rewards: List[Dict]) -> int:
+    return sum(int(reward['coin']) for reward in rewards if reward.get('coin') is not None)
+
+
+def get_top_50_coin(drama_id) -> int:
+    return sum_reward_coin(fetch_top_50_rewards(drama_id))
+
+
+def fetch_top_50_reward(drama_id) -> Set[int]:
+    return {int(reward["id"]) for reward in fetch_top_50_rewards(drama_id)}
+
+
+def fetch_search_page(search_name, page: int, revalidate: bool = False) -> Tuple[List[Dict], bool]:
+    """One page of drama search results: the drama records and whether a later page exists. `revalidate` asks the
+    server even when the cached page is still fresh.
+    """
+    response = http_get(f"{BASE_URL}/dramaapi/search", revalidate=revalidate,
+                        params={"s": search_name, "page": page})
+    response.raise_for_status()
+    info = response.json()["info"]
+    pagination = info["pagination"]
+    return info["Datas"], pagination["p"] < pagination["maxpage"]
+
+
+def fetch_drama_sound_by_search(search_name):
+    try:
+        page = 1
+        drama_ids = set()
+
+        while True:
+            dramas, more = fetch_search_page(search_name, page)
+            for drama in dramas:
+                if drama["pay_type"] > 0:
+                    drama_ids.add((drama["id"], drama["name"]))
+
+            if not more:
+                break
+            page += 1
+
+        return drama_ids
+    except Exception as e:
+        logging.error(f"Error searching for drama by name {search_name}: {e}")
+        return set()
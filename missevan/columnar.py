@@ -0,0 +1,174 @@
+import datetime
+import glob
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.feather as pa_feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_OUTPUT_DIR = "missevan_output"
+COLUMNAR_FORMATS = ("parquet", "arrow")
+BATCH_ROWS = 5000
+UID_COLUMNS = ("danmaku_uids", "comment_uids", "paid_uids")
+
+# Positions in the drama CSV row (DRAMA_HEADER) the growth scripts build.
+DRAMA_FIELDS = ("drama_id", "name", "first_sound_create_time", "price", "view_count", "paid_view_count",
+                "free_view_count", "paid_danmaku_users", "paid_comment_users", "free_danmaku_users",
+                "free_comment_users", "paid_users", "free_users", "top50_reward_coin", "paid_user_growth")
+INT_FIELDS = {"price", "view_count", "paid_view_count", "free_view_count", "paid_danmaku_users", "paid_comment_users",
+              "free_danmaku_users", "free_comment_users", "paid_users", "free_users", "top50_reward_coin",
+              "paid_user_growth"}
+
+
+def default_format() -> str:
+    """'parquet' when pyarrow is installed, otherwise the dated CSVs."""
+    return "parquet" if pa is not None else "csv"
+
+
+def _schemas():
+    uid_list = pa.list_(pa.uint64())
+    sounds = pa.schema([
+        ("drama_id", pa.int64()), ("sound_id", pa.int64()), ("sound_title", pa.string()),
+        ("create_time", pa.timestamp("s")), ("paid", pa.bool_()), ("danmaku_users", pa.int64()),
+        ("comment_users", pa.int64()), ("total_users", pa.int64()), ("view_count", pa.int64()),
+        ("new_paid_users", pa.int64()), ("danmaku_uids", uid_list), ("comment_uids", uid_list),
+    ])
+    dramas = pa.schema([("drama_id", pa.int64()), ("name", pa.string()),
+                        ("first_sound_create_time", pa.timestamp("s"))] +
+                       [(field, pa.int64()) for field in DRAMA_FIELDS[3:]] +
+                       [("paid_uids", uid_list)])
+    return {"sounds": sounds, "dramas": dramas}
+
+
+def _int(value) -> Optional[int]:
+    return None if value is None or value == '' else int(value)
+
+
+def _timestamp(value) -> Optional[datetime.datetime]:
+    """Datetimes pass through; journaled rows carry them as `str(datetime)`, and '' for None."""
+    if value is None or value == '':
+        return None
+    return value if isinstance(value, datetime.datetime) else datetime.datetime.fromisoformat(value)
+
+
+class ColumnarWriter:
+    """Typed `sounds` and `dramas` tables written in batches as Parquet or Arrow IPC files.
+
+    Each flush adds one file per table under `<directory>/<table>/date=<run date>/`, a hive-style layout that
+    `read_table` (or any Arrow/pandas/Spark reader) loads across days in one call. UID sets are stored as sorted
+    `list<uint64>` columns; Parquet delta-encodes and zstd-compresses them to a few bytes per UID.
+    """
+
+    def __init__(self, directory: str = DEFAULT_OUTPUT_DIR, fmt: str = "parquet",
+                 run_date: Optional[datetime.date] = None, batch_rows: int = BATCH_ROWS):
+        if pa is None:
+            raise RuntimeError("Columnar output needs pyarrow (pip install pyarrow)")
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar format {fmt!r}; expected one of {COLUMNAR_FORMATS}")
+        self.directory = directory
+        self.fmt = fmt
+        self.run_date = run_date or datetime.date.today()
+        self.batch_rows = batch_rows
+        self.schemas = _schemas()
+        self.rows: Dict[str, List[Dict]] = {table: [] for table in self.schemas}
+        self.files: List[str] = []
+
+    def add_drama(self, drama_id, sound_data: Sequence[Dict], drama_row: Sequence, paid_uids,
+                  new_paid_per_sound=None) -> None:
+        """Queue one drama: its sound details (with UID sets), its drama CSV row and its paid UID set.
+
+        `new_paid_per_sound`, when given, is indexed by each sound's `ordinal` (see `FirstSeenIndex`).
+        """
+        for sound_detail in sound_data:
+            self.rows["sounds"].append({
+                "drama_id": int(drama_id),
+                "sound_id": int(sound_detail['sound_id']),
+                "sound_title": sound_detail['sound_title'],
+                "create_time": _timestamp(sound_detail['create_time']),
+                "paid": int(sound_detail['need_pay']) > 0,
+                "danmaku_users": len(sound_detail['danmaku_uids']),
+                "comment_users": len(sound_detail['comment_uids']),
+                "total_users": len(sound_detail['total_sound_uids']),
+                "view_count": _int(sound_detail['view_count']),
+                "new_paid_users": (int(new_paid_per_sound[sound_detail['ordinal']])
+                                   if new_paid_per_sound is not None else None),
+                "danmaku_uids": _uid_array(sound_detail['danmaku_uids']),
+                "comment_uids": _uid_array(sound_detail['comment_uids']),
+            })
+        drama = dict(zip(DRAMA_FIELDS, drama_row))
+        drama.update({field: _int(drama.get(field)) for field in INT_FIELDS})
+        drama.update({
+            "drama_id": int(drama_id),
+            "first_sound_create_time": _timestamp(drama['first_sound_create_time']),
+            "paid_uids": _uid_array(paid_uids),
+        })
+        self.rows["dramas"].append(drama)
+        if len(self.rows["sounds"]) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        for table_name, rows in self.rows.items():
+            if rows:
+                self._write(table_name, pa.Table.from_pylist(rows, schema=self.schemas[table_name]))
+                rows.clear()
+
+    def _write(self, table_name: str, table) -> None:
+        # The run date is a hive partition (the directory name), not a column repeated in every file
+        directory = os.path.join(self.directory, table_name, f"date={self.run_date}")
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%H%M%S%f")
+        path = os.path.join(directory, f"part-{stamp}-{os.getpid()}.{self.fmt}")
+        temp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+        if self.fmt == "parquet":
+            uid_columns = [name for name in UID_COLUMNS if name in table.column_names]
+            pq.write_table(table, temp_path, compression="zstd",
+                           use_dictionary=[name for name in table.column_names if name not in uid_columns],
+                           column_encoding={f"{name}.list.element": "DELTA_BINARY_PACKED" for name in uid_columns})
+        else:
+            pa_feather.write_feather(table, temp_path, compression="zstd")
+        os.replace(temp_path, path)
+        self.files.append(path)
+        logging.info(f"Wrote {table.num_rows} {table_name} rows to {path}")
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _uid_array(uids):
+    # UidSet keeps a sorted uint64 array already; plain sets are sorted here so the deltas stay small
+    array = getattr(uids, "array", None)
+    return array if array is not None else sorted(int(uid) for uid in uids)
+
+
+def read_table(table_name: str, directory: str = DEFAULT_OUTPUT_DIR, columns: Optional[List[str]] = None,
+               fmt: str = "parquet"):
+    """Every day's rows of the `sounds` or `dramas` table as one Arrow table, with `date` from the directory names.
+    Leave the UID columns out of `columns` to skip reading them.
+    """
+    base = os.path.join(directory, table_name)
+    # Parquet and Arrow runs may share a directory; each reader picks up only its own files
+    paths = sorted(glob.glob(os.path.join(base, "date=*", f"part-*.{fmt}")))
+    partitioning = pa_dataset.partitioning(pa.schema([("date", pa.date32())]), flavor="hive")
+    dataset = pa_dataset.dataset(paths, format="ipc" if fmt == "arrow" else fmt, partitioning=partitioning,
+                                 partition_base_dir=base)
+    return dataset.to_table(columns=columns)
+
+
+def export_csv(table_name: str, path: str, directory: str = DEFAULT_OUTPUT_DIR, fmt: str = "parquet") -> None:
+    """Write a table to one flat CSV: a header row, then one row per sound or drama, without the UID columns."""
+    table = read_table(table_name, directory, fmt=fmt)
+    table = table.drop_columns([name for name in UID_COLUMNS if name in table.column_names])
+    pa_csv.write_csv(table, path)
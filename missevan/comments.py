@@ -0,0 +1,143 @@
+import json
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from missevan.activity import ActivityLog
+from missevan.danmaku import DateMask
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+SCAN_BACKEND = "simdjson" if simdjson is not None else BACKEND
+
+_local = threading.local()
+
+
+def loads(body: bytes):
+    """Decode a JSON response body with orjson when it is installed, the stdlib otherwise."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _comment_columns(comments) -> Tuple[List[int], List[int], List[int], List[int], List[int]]:
+    """userid and ctime of each comment, of each reply, and the reply count per comment, from decoded or simdjson
+    `Datas` entries alike.
+    """
+    ids, ctimes, reply_ids, reply_ctimes, reply_counts = [], [], [], [], []
+    for item in comments:
+        ids.append(int(item["userid"]))
+        ctimes.append(int(item["ctime"]))
+        subs = item["subcomments"]
+        reply_counts.append(len(subs))
+        for sub in subs:
+            reply_ids.append(int(sub["userid"]))
+            reply_ctimes.append(int(sub["ctime"]))
+    return ids, ctimes, reply_ids, reply_ctimes, reply_counts
+
+
+def _kept(ctimes: List[int], reply_ctimes: List[int], reply_counts: List[int],
+          skip: DateMask) -> Tuple[np.ndarray, np.ndarray]:
+    """Masks of the comments and replies `skip` leaves in; a reply stays only if its parent comment does too."""
+    kept = ~skip(np.array(ctimes, dtype=np.int64))
+    reply_kept = np.repeat(kept, reply_counts) & ~skip(np.array(reply_ctimes, dtype=np.int64))
+    return kept, reply_kept
+
+
+def _unmasked_user_ids(user_ids: List[int], ctimes: List[int], reply_ids: List[int], reply_ctimes: List[int],
+                       reply_counts: List[int], skip: DateMask) -> Set[int]:
+    """UIDs of comments whose ctime `skip` doesn't mask; replies count only if their parent comment is kept too."""
+    kept, reply_kept = _kept(ctimes, reply_ctimes, reply_counts, skip)
+    result = set(np.array(user_ids, dtype=np.int64)[kept].tolist())
+    result.update(np.array(reply_ids, dtype=np.int64)[reply_kept].tolist())
+    return result
+
+
+def extract_user_ids(data, skip: Optional[DateMask] = None) -> Set[int]:
+    """UIDs of every comment and reply on a decoded page, minus those whose `ctime` the `skip` mask excludes."""
+    comments = data["info"]["comment"]["Datas"]
+    if skip is not None:
+        return _unmasked_user_ids(*_comment_columns(comments), skip)
+    user_ids = set(map(int, [comment["userid"] for comment in comments]))
+    user_ids.update(map(int, [sub["userid"] for comment in comments for sub in comment["subcomments"]]))
+    return user_ids
+
+
+def _parse(body: bytes):
+    # A simdjson parser can't be reused while proxies into its last document are alive (e.g. held by a
+    # traceback), so start a fresh one rather than fail every later page on this thread.
+    parser = getattr(_local, "parser", None)
+    if parser is not None:
+        try:
+            return parser.parse(body)
+        except RuntimeError:
+            pass
+    parser = _local.parser = simdjson.Parser()
+    return parser.parse(body)
+
+
+def scan_comment_page(body: bytes, skip: Optional[DateMask] = None) -> Tuple[Set[int], Dict]:
+    """`extract_user_ids` of a raw `site/getcomment` page, plus the decoded page.
+
+    With simdjson installed only `userid`, `hasMore` and `pagination` (plus `ctime` when filtering) are materialized
+    and the returned page has no `Datas`; comment text is never turned into Python strings. Otherwise the full page comes from `loads`.
+    """
+    if simdjson is None:
+        data = loads(body)
+        return (extract_user_ids(data, skip) if data else set()), data
+
+    document = _parse(body)
+    if not document:
+        return set(), {}
+    comment = document["info"]["comment"]
+    if skip is None:
+        user_ids = set()
+        for item in comment["Datas"]:
+            user_ids.add(int(item["userid"]))
+            for sub in item["subcomments"]:
+                user_ids.add(int(sub["userid"]))
+    else:
+        user_ids = _unmasked_user_ids(*_comment_columns(comment["Datas"]), skip)
+    return user_ids, _page_header(comment)
+
+
+def _page_header(comment) -> Dict:
+    """The part of a simdjson page the page walk reads: `hasMore` and `pagination`."""
+    pagination = comment.get("pagination")
+    if pagination is not None:
+        pagination = pagination.as_dict()
+    return {"info": {"comment": {"hasMore": comment["hasMore"], "pagination": pagination}}}
+
+
+def comment_activity(comments, skip: Optional[DateMask] = None) -> ActivityLog:
+    """(uid, ctime) of every comment and reply in `Datas` that `extract_user_ids` would count."""
+    ids, ctimes, reply_ids, reply_ctimes, reply_counts = _comment_columns(comments)
+    uids = np.array(ids + reply_ids, dtype=np.int64)
+    times = np.array(ctimes + reply_ctimes, dtype=np.int64)
+    if skip is not None:
+        kept = np.concatenate(_kept(ctimes, reply_ctimes, reply_counts, skip))
+        uids, times = uids[kept], times[kept]
+    return ActivityLog(uids, times)
+
+
+def scan_comment_activity(body: bytes, skip: Optional[DateMask] = None) -> Tuple[ActivityLog, Dict]:
+    """`scan_comment_page` keeping each comment's ctime alongside its UID."""
+    if simdjson is None:
+        data = loads(body)
+        return (comment_activity(data["info"]["comment"]["Datas"], skip) if data else ActivityLog()), data
+
+    document = _parse(body)
+    if not document:
+        return ActivityLog(), {}
+    comment = document["info"]["comment"]
+    return comment_activity(comment["Datas"], skip), _page_header(comment)
@@ -0,0 +1,44 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from missevan import client
+from missevan.hll import DEFAULT_ERROR, HyperLogLog, SketchStore
+
+MAX_WORKERS = 5
+
+
+def sketch_sound(sound: Dict, error: float = DEFAULT_ERROR, store: Optional[SketchStore] = None) -> HyperLogLog:
+    """Sketch of a sound's danmaku and comment UIDs. The exact sets live only until they are hashed in.
+
+    Like the exact count's `process_sound`, a sound that fails is logged and left out (an empty sketch, not saved)
+    rather than aborting the drama.
+    """
+    sound_id = sound.get('sound_id')
+    sketch = HyperLogLog(error)
+    try:
+        sketch.update(client.fetch_all_danmakus(sound_id))
+        sketch.update(client.fetch_all_uids_by_comments(sound_id))
+    except Exception as e:
+        logging.error(f"Error processing sound {sound.get('sound_title')}: {e}")
+        return HyperLogLog(error)
+    if store is not None:
+        store.save("sound", sound_id, sketch)
+    logging.info(f"Sketched IDs -- {sound.get('sound_title')}, ~{len(sketch)} IDs.")
+    return sketch
+
+
+def sketch_paid_drama(drama_id, error: float = DEFAULT_ERROR, store: Optional[SketchStore] = None,
+                      max_workers: int = MAX_WORKERS) -> HyperLogLog:
+    """Sketch of everyone in a drama's top-50 reward rank or on its paid episodes, the audience the search
+    scripts count exactly.
+    """
+    sketch = HyperLogLog(error)
+    sketch.update(client.fetch_top_50_reward(drama_id))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for sound_sketch in executor.map(lambda sound: sketch_sound(sound, error, store),
+                                         client.get_paid_sound_lists(drama_id)):
+            sketch.update(sound_sketch)
+    if store is not None:
+        store.save("drama", drama_id, sketch)
+    return sketch
@@ -0,0 +1,99 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_EXCLUSIONS = os.environ.get("MISSEVAN_EXCLUSIONS", "exclusions.json")
+
+
+def _epoch(value) -> int:
+    """Unix seconds for an ISO date string (naive strings are local time, like `datetime.fromtimestamp`) or number."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.datetime.fromisoformat(value).timestamp())
+
+
+class TimeWindows:
+    """Sorted, merged set of inclusive [start, end] unix-second intervals.
+
+    Calling it with an int64 array of dates returns the boolean mask of dates inside any window, so it can be passed
+    as the `skip` filter of the danmaku and comment fetchers.
+    """
+
+    def __init__(self, windows: Iterable[Tuple[int, int]] = ()):
+        merged: List[List[int]] = []
+        for start, end in sorted((int(start), int(end)) for start, end in windows if start <= end):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = np.array([start for start, _ in merged], dtype=np.int64)
+        self.ends = np.array([end for _, end in merged], dtype=np.int64)
+
+    def __call__(self, dates: np.ndarray) -> np.ndarray:
+        dates = np.asarray(dates, dtype=np.int64)
+        if not len(self.starts):
+            return np.zeros(dates.shape, dtype=bool)
+        index = np.searchsorted(self.starts, dates, side="right") - 1
+        return (index >= 0) & (dates <= self.ends[np.maximum(index, 0)])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def fingerprint(self) -> str:
+        """Hash of the merged windows. Snapshots are keyed by it, so editing a window in the config starts the
+        affected sounds over from a full crawl instead of merging into UIDs gathered under the old windows.
+        """
+        digest = hashlib.sha1(self.starts.tobytes() + b"|" + self.ends.tobytes())
+        return f"windows:{digest.hexdigest()[:16]}"
+
+    def __repr__(self) -> str:
+        return f"TimeWindows({list(zip(self.starts.tolist(), self.ends.tolist()))})"
+
+
+class Exclusions:
+    """Exclusion windows keyed by sound ID and drama ID, e.g. free-listening promotions whose audience shouldn't count.
+
+    The config file is a JSON list of windows; each names `sound_ids` and/or `drama_ids` and an inclusive
+    `start`/`end` (ISO date strings, local time unless they carry an offset, or unix seconds). An optional `scripts`
+    list limits a window to the named scripts (see `load_exclusions`); without it the window applies everywhere::
+
+        [{"label": "天官赐福 限免", "sound_ids": [8321733], "start": "2023-08-24 18:00:00", "end": "2023-08-29 18:00:00",
+          "scripts": ["hardcoded"]}]
+    """
+
+    def __init__(self, windows: Iterable[Dict] = ()):
+        self.by_sound: Dict[int, List[Tuple[int, int]]] = {}
+        self.by_drama: Dict[int, List[Tuple[int, int]]] = {}
+        for window in windows:
+            interval = (_epoch(window["start"]), _epoch(window["end"]))
+            for sound_id in window.get("sound_ids", ()):
+                self.by_sound.setdefault(int(sound_id), []).append(interval)
+            for drama_id in window.get("drama_ids", ()):
+                self.by_drama.setdefault(int(drama_id), []).append(interval)
+
+    def windows_for(self, sound_id, drama_id=None) -> Optional[TimeWindows]:
+        """The sound's windows plus its drama's, or None when nothing is excluded (so callers skip filtering)."""
+        intervals = list(self.by_sound.get(int(sound_id), ()))
+        if drama_id is not None:
+            intervals.extend(self.by_drama.get(int(drama_id), ()))
+        return TimeWindows(intervals) if intervals else None
+
+
+def load_exclusions(path: str = DEFAULT_EXCLUSIONS, script: Optional[str] = None) -> Exclusions:
+    """The windows in `path` that apply to `script` (a script's module name, e.g. "hardcoded"), or all of them."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            windows = json.load(f)
+    except FileNotFoundError:
+        logging.info(f"No exclusion config at {path}; nothing is excluded")
+        return Exclusions()
+    if script is not None:
+        windows = [window for window in windows if script in window.get("scripts", (script,))]
+    exclusions = Exclusions(windows)
+    logging.info(f"Loaded {len(windows)} exclusion windows from {path}" + (f" for {script}" if script else ""))
+    return exclusions
@@ -0,0 +1,75 @@
+from typing import Hashable, List
+
+import numpy as np
+
+from missevan.uidset import UID_DTYPE, _to_array
+
+
+class FirstSeenIndex:
+    """Where each UID first shows up in an ordered run of sounds grouped by drama.
+
+    Call `start_drama` for each drama and `add` each of its sounds' UIDs in crawl order (pass an empty set for
+    sounds that shouldn't count, e.g. free episodes, to keep ordinals aligned), then `build()` once. The build is
+    one stable sort of all (uid, sound) pairs; every query afterwards is a `bincount` over its result, so no
+    per-sound or per-drama set is ever materialized.
+    """
+
+    def __init__(self):
+        self.drama_ids: List[Hashable] = []
+        self.sound_dramas: List[int] = []
+        self._arrays: List[np.ndarray] = []
+        self._built = False
+
+    def start_drama(self, drama_id) -> int:
+        """Begin the next drama; returns its ordinal."""
+        self.drama_ids.append(drama_id)
+        return len(self.drama_ids) - 1
+
+    def add(self, uids) -> int:
+        """Record the next sound of the current drama; returns the sound's ordinal."""
+        self.sound_dramas.append(len(self.drama_ids) - 1)
+        self._arrays.append(_to_array(uids))
+        self._built = False
+        return len(self._arrays) - 1
+
+    def build(self) -> "FirstSeenIndex":
+        lengths = np.fromiter(map(len, self._arrays), dtype=np.int64, count=len(self._arrays))
+        uids = np.concatenate(self._arrays) if self._arrays else np.empty(0, dtype=UID_DTYPE)
+        sounds = np.repeat(np.arange(len(self._arrays), dtype=np.int32), lengths)
+        # Pairs were added in sound order, so a stable sort by uid leaves each uid's sounds in crawl order.
+        order = np.argsort(uids, kind="stable")
+        uids, sounds = uids[order], sounds[order]
+        dramas = np.asarray(self.sound_dramas, dtype=np.int32)[sounds]
+
+        new_uid = np.ones(len(uids), dtype=bool)
+        new_uid[1:] = uids[1:] != uids[:-1]
+        new_pair = new_uid.copy()
+        new_pair[1:] |= dramas[1:] != dramas[:-1]
+
+        # One row per (uid, drama): the uid's first sound in that drama.
+        self._pair_uids = uids[new_pair]
+        self._pair_dramas = dramas[new_pair]
+        self._pair_sounds = sounds[new_pair]
+        self._first_dramas = dramas[new_uid]
+        self._built = True
+        return self
+
+    def _index(self) -> "FirstSeenIndex":
+        return self if self._built else self.build()
+
+    def __len__(self) -> int:
+        """Distinct UIDs over the whole run."""
+        return len(self._index()._first_dramas)
+
+    def new_per_sound(self) -> np.ndarray:
+        """For each sound, UIDs that no earlier sound of the same drama had."""
+        index = self._index()
+        return np.bincount(index._pair_sounds, minlength=len(self._arrays))
+
+    def growth_vs_previous(self) -> np.ndarray:
+        """For each drama, UIDs the drama right before it didn't have (the first drama counts all of its UIDs)."""
+        index = self._index()
+        uids, dramas = index._pair_uids, index._pair_dramas
+        returning = np.zeros(len(uids), dtype=bool)
+        returning[1:] = (uids[1:] == uids[:-1]) & (dramas[1:] == dramas[:-1] + 1)
+        return np.bincount(dramas[~returning], minlength=len(self.drama_ids))
@@ -0,0 +1,198 @@
+import argparse
+import math
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+from missevan.uidset import UID_DTYPE, UidSet
+
+DEFAULT_SKETCH_DB = "missevan_sketches.sqlite3"
+DEFAULT_ERROR = 0.01
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+
+def precision_for(error: float) -> int:
+    """Smallest register-count exponent whose standard error 1.04 / sqrt(2**p) is at most `error`."""
+    if not 0 < error < 1:
+        raise ValueError(f"relative error must be between 0 and 1, not {error}")
+    return min(MAX_PRECISION, max(MIN_PRECISION, math.ceil(2 * math.log2(1.04 / error))))
+
+
+def relative_error(value: str) -> float:
+    """argparse `type` for an `--error` option: a float strictly between 0 and 1."""
+    try:
+        error = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a number")
+    if not 0 < error < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1 (e.g. 0.01 for ±1%)")
+    return error
+
+
+def _hash(uids: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: UIDs are sequential-ish, so their bits have to be spread before bucketing."""
+    h = uids.astype(np.uint64, copy=True)
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Vectorized int.bit_length for uint64 (float log2 rounds up just below powers of two)."""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = (values >> np.uint64(shift)) != 0
+        length += shift * high
+        values[high] >>= np.uint64(shift)
+    return length + (values != 0)
+
+
+def _as_array(uids) -> np.ndarray:
+    if isinstance(uids, UidSet):
+        return uids.array
+    if isinstance(uids, np.ndarray):
+        return uids.astype(UID_DTYPE, copy=False)
+    count = len(uids) if hasattr(uids, "__len__") else -1
+    return np.fromiter(uids, dtype=UID_DTYPE, count=count)
+
+
+class HyperLogLog:
+    """Mergeable distinct-UID estimate in 2**p one-byte registers, whatever the number of UIDs added.
+
+    `error` is the target relative standard error; 0.01 gives p=14 (16 KiB, ~0.8%). Sketches with the same
+    precision merge exactly: the union of two dramas' sketches is the sketch of their combined audience.
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, error: float = DEFAULT_ERROR, precision: Optional[int] = None):
+        self.precision = precision if precision is not None else precision_for(error)
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    @property
+    def error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, *others) -> None:
+        """Add UIDs (sets, UidSets, arrays) or fold in other sketches."""
+        for other in others:
+            if isinstance(other, HyperLogLog):
+                self._check(other)
+                np.maximum(self.registers, other.registers, out=self.registers)
+                continue
+            hashes = _hash(_as_array(other))
+            if not len(hashes):
+                continue
+            suffix_bits = 64 - self.precision
+            buckets = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+            suffixes = hashes & np.uint64((1 << suffix_bits) - 1)
+            ranks = (suffix_bits + 1 - _bit_length(suffixes)).astype(np.uint8)
+            np.maximum.at(self.registers, buckets, ranks)
+
+    def union(self, *others: "HyperLogLog") -> "HyperLogLog":
+        result = self.copy()
+        result.update(*others)
+        return result
+
+    def copy(self) -> "HyperLogLog":
+        sketch = HyperLogLog(precision=self.precision)
+        sketch.registers[:] = self.registers
+        return sketch
+
+    def _check(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError(f"Can't merge sketches of precision {self.precision} and {other.precision}")
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is far more accurate while many registers are still empty
+            return m * math.log(m / zeros)
+        return float(raw)
+
+    def __len__(self) -> int:
+        return int(round(self.estimate()))
+
+    def to_bytes(self) -> bytes:
+        """Precision byte plus the zlib-compressed registers."""
+        return bytes([self.precision]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        sketch = cls(precision=data[0])
+        sketch.registers[:] = np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8)
+        return sketch
+
+    def __repr__(self) -> str:
+        return f"HyperLogLog(~{len(self)}, precision={self.precision})"
+
+
+class SketchStore:
+    """SQLite store of HyperLogLog sketches keyed by kind ('sound', 'drama', ...) and ID, so later runs can merge
+    audiences crawled earlier without re-crawling them.
+
+    Safe to share between the worker threads of one process.
+    """
+
+    def __init__(self, path: str = DEFAULT_SKETCH_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Sketches are rewritten per sound; WAL + synchronous=NORMAL keeps that from syncing the disk every time
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS sketches (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    sketch BLOB NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+
+    def load(self, kind: str, key) -> Optional[HyperLogLog]:
+        with self.lock:
+            row = self.connection.execute("SELECT sketch FROM sketches WHERE kind = ? AND key = ?",
+                                          (kind, str(key))).fetchone()
+        return HyperLogLog.from_bytes(row[0]) if row is not None else None
+
+    def save(self, kind: str, key, sketch: HyperLogLog) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO sketches VALUES (?, ?, ?, ?)",
+                                    (kind, str(key), sketch.to_bytes(), int(time.time())))
+
+    def union(self, kind: str, keys: Iterable) -> Optional[HyperLogLog]:
+        """Merged sketch of the stored `keys`, or None if none of them is stored."""
+        result = None
+        for key in keys:
+            sketch = self.load(kind, key)
+            if sketch is None:
+                continue
+            if result is None:
+                result = sketch
+            else:
+                result.update(sketch)
+        return result
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,191 @@
+import csv
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from missevan.activity import ActivityLog
+from missevan.uidset import UidSet
+
+DEFAULT_JOURNAL_DB = "missevan_journal.sqlite3"
+
+UID_FIELDS = ("danmaku_uids", "comment_uids")
+ACTIVITY_FIELDS = ("danmaku_activity", "comment_activity")
+DATETIME_FIELDS = ("create_time",)
+
+
+def job_name(script: str, drama_ids: Iterable[str]) -> str:
+    """Journal key for one batch: the script plus its drama ids, so a rerun with the same input resumes it."""
+    return f"{os.path.basename(script)}:{','.join(drama_ids)}"
+
+
+class RowBuffer(list):
+    """List that accepts `writerow`, so crawl functions written against csv.writer can collect rows instead."""
+
+    def writerow(self, row: Sequence) -> None:
+        self.append(list(row))
+
+
+class CrawlJournal:
+    """SQLite journal of the sounds and dramas a batch job has finished, so a crashed run can resume.
+
+    Sounds are recorded as soon as they are crawled (details plus danmaku/comment UID sets, and their activity logs
+    when the crawl keeps them); a drama is recorded with its CSV rows and paid UID set once all its sounds are
+    done. `finish` drops the job's entries.
+    Safe to share between the worker threads of one process.
+    """
+
+    def __init__(self, job: str, path: str = DEFAULT_JOURNAL_DB):
+        self.job = job
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # One commit per finished sound: WAL + synchronous=NORMAL survives a crashed process without an fsync each
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS journal_sounds (
+                    job TEXT NOT NULL,
+                    sound_id INTEGER NOT NULL,
+                    detail TEXT NOT NULL,
+                    danmaku_uids BLOB NOT NULL,
+                    comment_uids BLOB NOT NULL,
+                    PRIMARY KEY (job, sound_id)
+                )
+            """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS journal_dramas (
+                    job TEXT NOT NULL,
+                    drama_id TEXT NOT NULL,
+                    sound_ids TEXT NOT NULL,
+                    sound_rows TEXT NOT NULL,
+                    drama_rows TEXT NOT NULL,
+                    total_paid_uids BLOB NOT NULL,
+                    PRIMARY KEY (job, drama_id)
+                )
+            """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS journal_activity (
+                    job TEXT NOT NULL,
+                    sound_id INTEGER NOT NULL,
+                    danmaku_activity BLOB NOT NULL,
+                    comment_activity BLOB NOT NULL,
+                    PRIMARY KEY (job, sound_id)
+                )
+            """)
+
+    def load_sound(self, sound_id) -> Optional[Dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT detail, danmaku_uids, comment_uids FROM journal_sounds WHERE job = ? AND sound_id = ?",
+                (self.job, int(sound_id))).fetchone()
+        if row is None:
+            return None
+        sound_detail = json.loads(row[0])
+        for field in DATETIME_FIELDS:
+            if sound_detail.get(field):
+                sound_detail[field] = datetime.datetime.fromisoformat(sound_detail[field])
+        sound_detail['danmaku_uids'] = UidSet.from_bytes(row[1])
+        sound_detail['comment_uids'] = UidSet.from_bytes(row[2])
+        sound_detail['total_sound_uids'] = sound_detail['danmaku_uids'].union(sound_detail['comment_uids'])
+        with self.lock:
+            activity = self.connection.execute(
+                "SELECT danmaku_activity, comment_activity FROM journal_activity WHERE job = ? AND sound_id = ?",
+                (self.job, int(sound_id))).fetchone()
+        if activity is not None:
+            sound_detail.update(zip(ACTIVITY_FIELDS, map(ActivityLog.from_bytes, activity)))
+        return sound_detail
+
+    def save_sound(self, sound_detail: Dict) -> None:
+        detail = {key: value for key, value in sound_detail.items()
+                  if key not in UID_FIELDS + ACTIVITY_FIELDS + ('total_sound_uids',)}
+        for field in DATETIME_FIELDS:
+            if detail.get(field):
+                detail[field] = detail[field].isoformat()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO journal_sounds VALUES (?, ?, ?, ?, ?)",
+                (self.job, int(sound_detail['sound_id']), json.dumps(detail, ensure_ascii=False),
+                 UidSet(sound_detail['danmaku_uids']).to_bytes(), UidSet(sound_detail['comment_uids']).to_bytes()))
+            if 'danmaku_activity' in sound_detail:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO journal_activity VALUES (?, ?, ?, ?)",
+                    (self.job, int(sound_detail['sound_id']),
+                     *(sound_detail[field].to_bytes() for field in ACTIVITY_FIELDS)))
+
+    def load_drama(self, drama_id) -> Optional[Dict]:
+        """The finished drama's sound_data, CSV rows and paid UID set, or None if it still needs crawling."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT sound_ids, sound_rows, drama_rows, total_paid_uids FROM journal_dramas "
+                "WHERE job = ? AND drama_id = ?", (self.job, str(drama_id))).fetchone()
+        if row is None:
+            return None
+        return {
+            'sound_data': [self.load_sound(sound_id) for sound_id in json.loads(row[0])],
+            'sound_rows': json.loads(row[1]),
+            'drama_rows': json.loads(row[2]),
+            'total_paid_uids': UidSet.from_bytes(row[3]),
+        }
+
+    def save_drama(self, drama_id, sound_data: List[Dict], sound_rows: List[List], drama_rows: List[List],
+                   total_paid_uids: UidSet) -> None:
+        # Rows are stored as csv.writer would render them: datetimes via str(), None as ''
+        def dump(rows):
+            return json.dumps([['' if value is None else value for value in row] for row in rows],
+                              ensure_ascii=False, default=str)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO journal_dramas VALUES (?, ?, ?, ?, ?, ?)",
+                (self.job, str(drama_id), json.dumps([sound['sound_id'] for sound in sound_data]), dump(sound_rows),
+                 dump(drama_rows), UidSet(total_paid_uids).to_bytes()))
+
+    def finish(self) -> None:
+        """Forget the job once its output is written; the next run with the same input starts over."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM journal_sounds WHERE job = ?", (self.job,))
+            self.connection.execute("DELETE FROM journal_dramas WHERE job = ?", (self.job,))
+            self.connection.execute("DELETE FROM journal_activity WHERE job = ?", (self.job,))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def append_csv_atomically(path: str, header: Sequence, rows: Iterable[Sequence]) -> None:
+    """Append `rows` (and `header` if the file is new or empty) by writing a complete copy and renaming it over
+    `path`, so an interrupted run never leaves a half-written CSV.
+    """
+    existing = b""
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            existing = f.read()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".csv.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(existing)
+        if existing:
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+        with open(temp_path, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if not existing:
+                writer.writerow(header)
+            writer.writerows(rows)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
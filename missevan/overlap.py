@@ -0,0 +1,108 @@
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+from missevan.uidset import UID_DTYPE, UidSet, _to_array
+
+MASK_BITS = 64
+BLOCK_ROWS = 1 << 16
+
+
+def build_membership_index(audiences: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """One pass over all UIDs: return (sorted unique uids, per-uid drama bitmask of shape (len(uids), words)).
+
+    Bit `i % 64` of word `i // 64` is set when the UID is in audience `i`. Each audience must be unique.
+    """
+    words = max(1, -(-len(audiences) // MASK_BITS))
+    all_uids = np.concatenate(audiences) if audiences else np.empty(0, dtype=UID_DTYPE)
+    owners = np.repeat(np.arange(len(audiences)), [len(audience) for audience in audiences])
+    order = np.argsort(all_uids, kind="stable")
+    all_uids = all_uids[order]
+    owners = owners[order]
+    del order
+
+    masks = np.zeros((0, words), dtype=np.uint64)
+    if not len(all_uids):
+        return all_uids, masks
+    starts = np.flatnonzero(np.concatenate(([True], all_uids[1:] != all_uids[:-1])))
+    uids = all_uids[starts]
+    masks = np.zeros((len(uids), words), dtype=np.uint64)
+    bits = np.left_shift(np.uint64(1), (owners % MASK_BITS).astype(np.uint64))
+    for word in range(words):
+        # Audiences are unique, so a UID never sees the same bit twice and the sum is the bitwise OR.
+        word_bits = np.where(owners // MASK_BITS == word, bits, np.uint64(0)) if words > 1 else bits
+        masks[:, word] = np.add.reduceat(word_bits, starts)
+    return uids, masks
+
+
+class AudienceOverlap:
+    """Overlap statistics between drama audiences, computed from one UID -> drama-bitmask index.
+
+    `audiences` maps a label (drama id) to its UIDs (UidSet, set or array). The N x N intersection matrix,
+    per-drama exclusive audience and union size all come from the distinct bitmask patterns, so the cost is one sort
+    of all UIDs plus a small matrix product instead of N^2 set operations.
+    """
+
+    def __init__(self, audiences: Dict[Hashable, Iterable[int]]):
+        self.labels = list(audiences)
+        self.uids, self.masks = build_membership_index([_to_array(uids) for uids in audiences.values()])
+        if self.masks.shape[1] == 1:
+            patterns, self.pattern_counts = np.unique(self.masks[:, 0], return_counts=True)
+            self.patterns = patterns[:, None]
+        else:
+            self.patterns, self.pattern_counts = np.unique(self.masks, axis=0, return_counts=True)
+
+    def _membership(self, patterns: np.ndarray) -> np.ndarray:
+        """Boolean (len(patterns), N) matrix: which dramas each bitmask pattern covers."""
+        index = np.arange(len(self.labels))
+        shifts = (index % MASK_BITS).astype(np.uint64)
+        return ((patterns[:, index // MASK_BITS] >> shifts) & np.uint64(1)).astype(bool)
+
+    @property
+    def union_size(self) -> int:
+        return len(self.uids)
+
+    def intersection_matrix(self) -> np.ndarray:
+        """N x N matrix of shared UID counts; the diagonal is each drama's audience size."""
+        n = len(self.labels)
+        matrix = np.zeros((n, n), dtype=np.float64)
+        for start in range(0, len(self.patterns), BLOCK_ROWS):
+            members = self._membership(self.patterns[start:start + BLOCK_ROWS]).astype(np.float64)
+            matrix += (members * self.pattern_counts[start:start + BLOCK_ROWS, None]).T @ members
+        return matrix.astype(np.int64)
+
+    def exclusive_counts(self) -> np.ndarray:
+        """Number of UIDs found in each drama and no other."""
+        members = self._membership(self.patterns)
+        single = members.sum(axis=1) == 1
+        return (members[single] * self.pattern_counts[single, None]).sum(axis=0).astype(np.int64)
+
+    def exclusive_uids(self, label) -> UidSet:
+        """UIDs found only in drama `label`."""
+        i = self.labels.index(label)
+        target = np.zeros(self.masks.shape[1], dtype=np.uint64)
+        target[i // MASK_BITS] = np.uint64(1) << np.uint64(i % MASK_BITS)
+        return UidSet.from_sorted_array(self.uids[(self.masks == target).all(axis=1)])
+
+    def matrix_frame(self):
+        """Intersection matrix as a DataFrame indexed and labelled by drama id."""
+        import pandas as pd
+        return pd.DataFrame(self.intersection_matrix(), index=self.labels, columns=self.labels)
+
+    def summary_frame(self):
+        """One row per drama: total, exclusive and shared audience, plus the share of the union."""
+        import pandas as pd
+        totals = np.diag(self.intersection_matrix())
+        exclusive = self.exclusive_counts()
+        return pd.DataFrame({
+            "drama_id": self.labels,
+            "total_ids": totals,
+            "exclusive_ids": exclusive,
+            "shared_ids": totals - exclusive,
+            "share_of_union": totals / max(self.union_size, 1),
+        })
+
+    def to_csv(self, matrix_path: str, summary_path: str = None) -> None:
+        self.matrix_frame().to_csv(matrix_path, index_label="drama_id")
+        if summary_path:
+            self.summary_frame().to_csv(summary_path, index=False)
@@ -0,0 +1,87 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+import requests
+
+from missevan import client
+from missevan.comments import scan_comment_page
+from missevan.danmaku import collect_danmaku_uids
+from missevan.metrics import COUNT_BOUNDS, REGISTRY as metrics
+from missevan.uidset import UidSet, _to_array
+
+
+def parse_danmaku_body(body: bytes) -> np.ndarray:
+    """Worker side: raw getdm XML to a sorted uint64 UID array."""
+    return _to_array(collect_danmaku_uids([body]))
+
+
+def parse_comment_body(body: bytes) -> Tuple[np.ndarray, bool, Optional[int]]:
+    """Worker side: raw getcomment JSON to (sorted UID array, hasMore, page count from pagination)."""
+    uids, data = scan_comment_page(body)
+    return _to_array(uids), bool(data["info"]["comment"]["hasMore"]), client.comment_page_count(data)
+
+
+class ParsePipeline:
+    """I/O threads download raw danmaku/comment bodies and hand them to a process pool that parses them into
+    compact UID arrays, so parsing scales with cores instead of contending on the GIL.
+
+    Workers are spawned (not forked) so the pool is safe to start from a process that already runs I/O threads.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = processes or os.cpu_count() or 1
+        self.executor = None
+
+    def start(self) -> "ParsePipeline":
+        self.executor = ProcessPoolExecutor(max_workers=self.processes,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return self
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _parse(self, function, body: bytes):
+        with metrics.timer("parse_seconds", stage="process_pool"):
+            return self.executor.submit(function, body).result()
+
+    def fetch_danmaku_uids(self, sound_id) -> UidSet:
+        try:
+            response = client.http_get(client.danmaku_url(sound_id))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
+            return UidSet()
+        return UidSet.from_sorted_array(self._parse(parse_danmaku_body, response.content))
+
+    def _comment_page(self, sound_id, page: int) -> Tuple[np.ndarray, bool, Optional[int]]:
+        response = client.http_get(client.comment_url(sound_id, page))
+        response.raise_for_status()
+        return self._parse(parse_comment_body, response.content)
+
+    def fetch_comment_uids(self, sound_id) -> UidSet:
+        """Same page plan as `client.fetch_all_uids_by_comments`: page 1, fan-out to the page count, then walk."""
+        uids, has_more, page_count = self._comment_page(sound_id, 1)
+        arrays = [uids]
+        page = 1
+        if has_more and page_count and page_count >= 2:
+            pages = client.get_comment_executor().map(lambda p: self._comment_page(sound_id, p),
+                                                      range(2, page_count + 1))
+            for uids, has_more, _ in pages:
+                arrays.append(uids)
+            page = page_count
+        while has_more:
+            page += 1
+            uids, has_more, _ = self._comment_page(sound_id, page)
+            arrays.append(uids)
+        metrics.observe("comment_pages_per_sound", len(arrays), bounds=COUNT_BOUNDS)
+        return UidSet.from_sorted_array(np.unique(np.concatenate(arrays)))
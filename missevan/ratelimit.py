@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+from typing import Optional
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 20
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_TARGET_LATENCY = 1.0
+MAX_RETRIES = 4
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `reserve()` takes a token and returns how long the caller must wait for it,
+    so the same bucket serves blocking threads (`acquire`) and coroutines (`await asyncio.sleep(reserve())`).
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket whose rate follows the server: additive increase while responses are fast and healthy,
+    multiplicative decrease (at most once per `target_latency`) on 429/5xx or when latency exceeds
+    `target_latency`. Throttling responses also pause every caller until the backoff (or the server's
+    Retry-After) has elapsed.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: float = DEFAULT_MAX_RATE, target_latency: float = DEFAULT_TARGET_LATENCY,
+                 max_retries: int = MAX_RETRIES):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.paused_until = 0.0
+        self.decreased_at = float("-inf")
+
+    def reserve(self) -> float:
+        wait = super().reserve()
+        return max(wait, self.paused_until - time.monotonic())
+
+    def should_retry(self, status: int, attempt: int) -> bool:
+        return status in RETRY_STATUS and attempt < self.max_retries
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Exponential backoff with jitter, overridden by a numeric Retry-After header."""
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(60.0, (2 ** attempt) * random.uniform(0.5, 1.5))
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def record(self, status: int, latency: float) -> None:
+        if status in RETRY_STATUS or latency > self.target_latency:
+            # Concurrent requests hit by the same overload report it together; halve once per event, not per response
+            with self.lock:
+                now = time.monotonic()
+                if now - self.decreased_at < self.target_latency:
+                    return
+                self.decreased_at = now
+                self._refill(now)
+                self.rate = max(self.min_rate, self.rate / 2)
+        elif status < 400:
+            self.set_rate(min(self.max_rate, self.rate + 1.0 / max(self.rate, 1.0)))
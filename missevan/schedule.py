@@ -0,0 +1,89 @@
+import heapq
+import logging
+import math
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from missevan import client
+from missevan.journal import CrawlJournal
+from missevan.metrics import REGISTRY as metrics
+
+
+def estimate_requests(sound_detail: Dict) -> int:
+    """Requests a sound still costs once its detail is known: one getdm plus one per comment page.
+
+    getsound says nothing about the size of the danmaku file, so getdm counts as a single request.
+    """
+    comment_count = int(sound_detail.get('comment_count') or 0)
+    return 1 + max(1, math.ceil(comment_count / client.COMMENT_PAGE_SIZE))
+
+
+def plan_makespan(costs: Iterable[int], workers: int) -> int:
+    """Requests on the busiest worker when `costs` are handed out largest-first to `workers` workers."""
+    loads = [0] * max(1, workers)
+    for cost in sorted(costs, reverse=True):
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
+
+
+def requests_sent() -> int:
+    return int(metrics.total("http_responses_total"))
+
+
+class CrawlPlan:
+    """Every sound of a set of dramas with its detail and estimated cost, ordered largest-first.
+
+    `dramas` maps each drama ID to its `get_drama_sound_lists` result. Each task is a dict with `index` (position in
+    the original episode order), `drama_id`, `sound`, `sound_detail` and `cost`; sounds already in the journal carry
+    their journaled result and cost nothing.
+    """
+
+    def __init__(self, dramas: Dict[str, Tuple], tasks: List[Dict]):
+        self.dramas = dramas
+        self.tasks = sorted(tasks, key=lambda task: task['cost'], reverse=True)
+
+    @property
+    def planned_requests(self) -> int:
+        return sum(task['cost'] for task in self.tasks)
+
+    def execute(self, work: Callable[[Dict], Dict], max_workers: int) -> Dict[str, List[Tuple[Dict, Future]]]:
+        """Run `work(task)` for every task on one shared pool, largest first, and return each drama's
+        (sound, future) pairs in the drama's episode order. Logs planned versus actual requests.
+        """
+        costs = [task['cost'] for task in self.tasks]
+        logging.info(f"Crawl plan: {len(self.tasks)} sounds, {self.planned_requests} requests, largest "
+                     f"{max(costs, default=0)}; estimated busiest worker {plan_makespan(costs, max_workers)}")
+        before = requests_sent()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The pool's queue is FIFO, so submitting in descending cost order dispatches largest-first
+            futures = {executor.submit(work, task): task for task in self.tasks}
+            for _ in as_completed(futures):
+                pass
+        logging.info(f"Crawl done: {requests_sent() - before} requests sent for {self.planned_requests} planned")
+
+        outcomes = {drama_id: [] for drama_id in self.dramas}
+        for future, task in sorted(futures.items(), key=lambda item: item[1]['index']):
+            outcomes[task['drama_id']].append((task['sound'], future))
+        return outcomes
+
+
+def plan_crawl(drama_ids: Iterable[str], journal: Optional[CrawlJournal] = None,
+               max_workers: int = client.DEFAULT_POOL_SIZE) -> CrawlPlan:
+    """Metadata pass: fetch the sound list of every drama, then every sound's detail concurrently, and cost them."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        drama_ids = list(drama_ids)
+        dramas = dict(zip(drama_ids, executor.map(client.get_drama_sound_lists, drama_ids)))
+        sounds = [(drama_id, sound) for drama_id in drama_ids for sound in dramas[drama_id][0]]
+
+        def describe(item):
+            drama_id, sound = item
+            journaled = journal.load_sound(sound['sound_id']) if journal is not None else None
+            if journaled is not None:
+                return journaled, 0
+            sound_detail = client.get_sound_detail(sound['sound_id'])
+            return sound_detail, estimate_requests(sound_detail)
+
+        tasks = [{'index': index, 'drama_id': drama_id, 'sound': sound, 'sound_detail': sound_detail, 'cost': cost}
+                 for index, ((drama_id, sound), (sound_detail, cost)) in enumerate(zip(sounds,
+                                                                                      executor.map(describe, sounds)))]
+    return CrawlPlan(dramas, tasks)
@@ -0,0 +1,140 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from missevan import client
+from missevan.danmaku import DateMask
+from missevan.uidset import UidSet
+
+DEFAULT_SNAPSHOT_DB = "missevan_snapshots.sqlite3"
+
+
+def skip_key(*skips: Optional[DateMask]) -> Optional[str]:
+    """Snapshot key for a crawl filtered by `skips`: "" when nothing is filtered, the filters' fingerprints joined
+    otherwise, and None when a filter has no `fingerprint()` and so can't be told apart from a different one.
+    """
+    parts = []
+    for skip in skips:
+        if skip is None:
+            parts.append("")
+            continue
+        fingerprint = getattr(skip, "fingerprint", None)
+        if fingerprint is None:
+            return None
+        parts.append(fingerprint())
+    return "" if not any(parts) else "|".join(parts)
+
+
+class SnapshotStore:
+    """SQLite store of each sound's danmaku/comment UID sets and the newest danmaku date / comment ctime seen.
+
+    Snapshots are keyed by sound and by the `skip_key` of the filters they were crawled with, so a filtered run
+    never merges into an unfiltered snapshot or the other way round. Safe to share between the worker threads of
+    one process.
+    """
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL with synchronous=NORMAL: per-sound saves no longer wait on fsync (~55 ms each on slow disks)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(sound_snapshots)")]
+            if columns and "filter_key" not in columns:
+                # Snapshots from before filter keys can't be told filtered from unfiltered; recrawl them once
+                logging.warning(f"Dropping {path} snapshots saved without a filter key; sounds will be recrawled")
+                self.connection.execute("DROP TABLE sound_snapshots")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS sound_snapshots (
+                    sound_id INTEGER NOT NULL,
+                    filter_key TEXT NOT NULL,
+                    danmaku_uids BLOB NOT NULL,
+                    comment_uids BLOB NOT NULL,
+                    max_danmaku_date INTEGER NOT NULL,
+                    max_comment_ctime INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    PRIMARY KEY (sound_id, filter_key)
+                )
+            """)
+
+    def load(self, sound_id, filter_key: str = "") -> Optional[Dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT danmaku_uids, comment_uids, max_danmaku_date, max_comment_ctime, updated_at "
+                "FROM sound_snapshots WHERE sound_id = ? AND filter_key = ?", (int(sound_id), filter_key)).fetchone()
+        if row is None:
+            return None
+        return {
+            'sound_id': int(sound_id),
+            'danmaku_uids': UidSet.from_bytes(row[0]),
+            'comment_uids': UidSet.from_bytes(row[1]),
+            'max_danmaku_date': row[2],
+            'max_comment_ctime': row[3],
+            'updated_at': row[4],
+        }
+
+    def save(self, sound_id, danmaku_uids: UidSet, comment_uids: UidSet, max_danmaku_date: int,
+             max_comment_ctime: int, filter_key: str = "") -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sound_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (int(sound_id), filter_key, danmaku_uids.to_bytes(), comment_uids.to_bytes(), max_danmaku_date,
+                 max_comment_ctime, int(time.time())))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_incremental(path: str = DEFAULT_SNAPSHOT_DB) -> SnapshotStore:
+    """The store for an incremental run. Logs that the run's totals are a lower bound: comment pages are walked
+    only down to the snapshot's newest top-level comment, so new replies under older comments are never fetched.
+    """
+    logging.warning("Incremental crawl: new replies to comments older than each sound's snapshot are not fetched, "
+                    "so UID totals are a lower bound on a full crawl")
+    return SnapshotStore(path)
+
+
+def refresh_sound_uids(store: SnapshotStore, sound_id, danmaku_skip: Optional[DateMask] = None,
+                       comment_extract: Callable[..., Set[int]] = client.extract_user_ids,
+                       comment_skip: Optional[DateMask] = None) -> Tuple[UidSet, UidSet]:
+    """Fetch only what is new since the sound's last snapshot, merge it in, save and return (danmaku, comment) UIDs.
+
+    Danmaku have no "since" parameter, so getdm is still downloaded in full; only newer entries are parsed.
+    Comment pages stop at the first page older than the snapshot. The snapshot used is the one crawled with the
+    same filters; filters without a fingerprint get a full, unsaved crawl.
+    """
+    filter_key = skip_key(danmaku_skip, comment_skip)
+    if filter_key is None:
+        danmaku_uids, _ = client.fetch_danmakus_since(sound_id, 0, danmaku_skip)
+        comment_uids, _ = client.fetch_comment_uids_since(sound_id, 0, comment_extract, comment_skip)
+        return UidSet(danmaku_uids), UidSet(comment_uids)
+
+    snapshot = store.load(sound_id, filter_key)
+    since_danmaku = snapshot['max_danmaku_date'] if snapshot else 0
+    since_comment = snapshot['max_comment_ctime'] if snapshot else 0
+
+    new_danmaku_uids, max_danmaku_date = client.fetch_danmakus_since(sound_id, since_danmaku, danmaku_skip)
+    new_comment_uids, max_comment_ctime = client.fetch_comment_uids_since(sound_id, since_comment, comment_extract,
+                                                                          comment_skip)
+
+    if snapshot:
+        danmaku_uids = snapshot['danmaku_uids'].union(new_danmaku_uids)
+        comment_uids = snapshot['comment_uids'].union(new_comment_uids)
+        logging.info(f"Sound {sound_id}: +{len(danmaku_uids) - len(snapshot['danmaku_uids'])} danmaku UIDs, "
+                     f"+{len(comment_uids) - len(snapshot['comment_uids'])} comment UIDs since last snapshot")
+    else:
+        danmaku_uids = UidSet(new_danmaku_uids)
+        comment_uids = UidSet(new_comment_uids)
+
+    store.save(sound_id, danmaku_uids, comment_uids, max_danmaku_date, max_comment_ctime, filter_key)
+    return danmaku_uids, comment_uids
@@ -0,0 +1,120 @@
+import csv
+import json
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+DEFAULT_PURCHASED = "purchased.json"
+MIN_FUZZY_SCORE = 0.5
+
+_NUMERAL = r"[一二三四五六七八九十百\d]+"
+# Catalogue names are "<title> 第二季（上）", "<title> 全一季", "<title> 番外篇（旧）", "<title> 下"...: everything
+# from the first of these markers on names a release of the work, not the work
+_SEASON = re.compile(rf"第{_NUMERAL}[季部期]|全{_NUMERAL}[季部期]|(?:独家)?番外|粤语版|(?:完结|最终|[上下])季|\s[上中下]\s*$")
+# [电竞], (旧), 【广播剧】: genre tags and edition notes, on jjwxc titles and catalogue names alike
+_TAG = re.compile(r"\[[^\]]*\]|\([^)]*\)|【[^】]*】|〔[^〕]*〕")
+_PUNCTUATION = re.compile(r"[\W_]+")
+
+
+def normalize_title(title) -> str:
+    """Key a title or catalogue name by its work: full-width folded to half-width, case folded, bracketed tags and
+    season/extra suffixes dropped, punctuation and spaces removed. "FOG[电竞] 第一季" and "FOG[电竞]" both give "fog".
+    """
+    text = unicodedata.normalize("NFKC", str(title)).casefold()
+    untagged = _TAG.sub(" ", text)
+    if _PUNCTUATION.sub("", untagged):
+        text = untagged
+    season = _SEASON.search(text)
+    if season and _PUNCTUATION.sub("", text[:season.start()]):
+        text = text[:season.start()]
+    key = _PUNCTUATION.sub("", text)
+    # A name that is nothing but punctuation keeps its folded form rather than collapsing to ""
+    return key or text.strip()
+
+
+def _grams(key: str) -> Set[str]:
+    if len(key) < 2:
+        return {key}
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+class TitleIndex:
+    """Catalogue dramas keyed by `normalize_title`, built once per run.
+
+    `lookup` is one normalization plus a dict probe. `candidates` ranks near misses (reworded or
+    abbreviated titles) by the Dice coefficient of character bigrams, scoring only the keys that share at least
+    one bigram with the query through an inverted bigram index.
+    """
+
+    def __init__(self, dramas: Iterable[Tuple[int, str]] = ()):
+        self.names: Dict[int, str] = {}
+        self._ids: Dict[str, List[int]] = defaultdict(list)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        for drama_id, name in dramas:
+            self.add(drama_id, name)
+
+    @classmethod
+    def from_json(cls, path: str = DEFAULT_PURCHASED) -> "TitleIndex":
+        """The `purchased.json` dump: a list of drama records with `id` and `name`."""
+        with open(path, encoding="utf-8") as f:
+            return cls((int(drama['id']), drama['name']) for drama in json.load(f))
+
+    @classmethod
+    def from_csv(cls, path: str) -> "TitleIndex":
+        """A catalogue CSV with `id` and `name` columns, e.g. `purchased.json` saved through pandas."""
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls((int(row['id']), row['name']) for row in csv.DictReader(f) if row.get('name'))
+
+    @classmethod
+    def from_file(cls, path: str) -> "TitleIndex":
+        """Pick the reader by extension: .csv, .catalogue (see `missevan.catalogue`), otherwise JSON."""
+        if path.endswith(".catalogue"):
+            from missevan.catalogue import Catalogue
+            with Catalogue(path) as catalogue:
+                return catalogue.titles()
+        return cls.from_csv(path) if path.endswith(".csv") else cls.from_json(path)
+
+    def add(self, drama_id: int, name: str) -> None:
+        if drama_id in self.names:
+            return
+        self.names[drama_id] = name
+        key = normalize_title(name)
+        if not self._ids[key]:
+            for gram in _grams(key):
+                self._grams[gram].add(key)
+        self._ids[key].append(drama_id)
+
+    def lookup(self, title) -> List[int]:
+        """IDs of every catalogue drama (all seasons and extras) of the work `title` names, in catalogue order."""
+        return list(self._ids.get(normalize_title(title), ()))
+
+    def __contains__(self, title) -> bool:
+        return normalize_title(title) in self._ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def candidates(self, title, limit: int = 5, min_score: float = MIN_FUZZY_SCORE) -> List[Tuple[float, int, str]]:
+        """(score, drama_id, name) of the closest catalogue dramas to `title`, best first; an exact match scores 1."""
+        query = normalize_title(title)
+        query_grams = _grams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._grams.get(gram, ()))
+        scored = []
+        for key, overlap in shared.items():
+            score = 2 * overlap / (len(query_grams) + len(_grams(key)))
+            if score >= min_score:
+                scored.append((score, key))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        matches = []
+        for score, key in scored:
+            matches.extend((score, drama_id, self.names[drama_id]) for drama_id in self._ids[key])
+            if len(matches) >= limit:
+                break
+        return matches[:limit]
+
+    def drama_column(self, title) -> str:
+        """`lookup` as the comma-separated ID list the jjwxc `Drama` column carries, "" when nothing matches."""
+        return ",".join(map(str, self.lookup(title)))
@@ -0,0 +1,116 @@
+import zlib
+from typing import Iterable, Iterator
+
+import numpy as np
+
+UID_DTYPE = np.uint64
+
+
+def _to_array(uids) -> np.ndarray:
+    """Sorted, de-duplicated uint64 array for any UidSet, array or iterable of ints."""
+    if isinstance(uids, UidSet):
+        return uids.array
+    if isinstance(uids, np.ndarray):
+        return np.unique(uids.astype(UID_DTYPE, copy=False))
+    count = len(uids) if hasattr(uids, "__len__") else -1
+    return np.unique(np.fromiter(uids, dtype=UID_DTYPE, count=count))
+
+
+class UidSet:
+    """Set of user IDs stored as one sorted uint64 array: 8 bytes per UID instead of ~60 for a `set[int]`.
+
+    Supports the set operations the crawl scripts use (`update`, `union`, `difference`, `intersection`,
+    `len`, `in`). `update` buffers incoming arrays and merges them lazily so per-sound accumulation stays linear.
+    """
+
+    __slots__ = ("_array", "_pending", "_pending_size")
+
+    def __init__(self, uids: Iterable[int] = ()):
+        self._array = _to_array(uids)
+        self._pending = []
+        self._pending_size = 0
+
+    @classmethod
+    def from_sorted_array(cls, array: np.ndarray) -> "UidSet":
+        """Wrap an array that is already sorted and unique without copying it."""
+        uid_set = cls.__new__(cls)
+        uid_set._array = array.astype(UID_DTYPE, copy=False)
+        uid_set._pending = []
+        uid_set._pending_size = 0
+        return uid_set
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "UidSet":
+        """Inverse of `to_bytes`."""
+        array = np.frombuffer(zlib.decompress(data), dtype="<u8")
+        return cls.from_sorted_array(np.cumsum(array, dtype=UID_DTYPE))
+
+    def to_bytes(self) -> bytes:
+        """Delta-encoded, zlib-compressed little-endian bytes; sorted UIDs compress to a few bytes each."""
+        deltas = np.diff(self.array, prepend=UID_DTYPE(0)).astype("<u8", copy=False)
+        return zlib.compress(deltas.tobytes())
+
+    @property
+    def array(self) -> np.ndarray:
+        self._compact()
+        return self._array
+
+    @property
+    def nbytes(self) -> int:
+        return self.array.nbytes
+
+    def _compact(self) -> None:
+        if self._pending:
+            self._array = np.unique(np.concatenate([self._array, *self._pending]))
+            self._pending = []
+            self._pending_size = 0
+
+    def add(self, uid: int) -> None:
+        self.update((uid,))
+
+    def update(self, *others) -> None:
+        for other in others:
+            array = _to_array(other)
+            self._pending.append(array)
+            self._pending_size += len(array)
+        if self._pending_size > max(len(self._array), 1 << 16):
+            self._compact()
+
+    def union(self, *others) -> "UidSet":
+        arrays = [self.array] + [_to_array(other) for other in others]
+        return UidSet.from_sorted_array(np.unique(np.concatenate(arrays)))
+
+    def difference(self, *others) -> "UidSet":
+        result = self.array
+        for other in others:
+            result = np.setdiff1d(result, _to_array(other), assume_unique=True)
+        return UidSet.from_sorted_array(result)
+
+    def intersection(self, *others) -> "UidSet":
+        result = self.array
+        for other in others:
+            result = np.intersect1d(result, _to_array(other), assume_unique=True)
+        return UidSet.from_sorted_array(result)
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.array.tolist())
+
+    def __contains__(self, uid) -> bool:
+        array = self.array
+        index = np.searchsorted(array, uid)
+        return bool(index < len(array) and array[index] == uid)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (UidSet, set, frozenset)):
+            return np.array_equal(self.array, _to_array(other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"UidSet({len(self)} uids)"
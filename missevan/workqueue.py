@@ -0,0 +1,329 @@
+import datetime
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from missevan import client
+from missevan.catalogue import Catalogue
+from missevan.journal import DATETIME_FIELDS
+from missevan.ratelimit import DEFAULT_BURST, DEFAULT_MAX_RATE, DEFAULT_MIN_RATE, DEFAULT_RATE
+from missevan.uidset import UidSet
+
+DEFAULT_QUEUE_DB = "missevan_queue.sqlite3"
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5
+POLL_SECONDS = 1.0
+WORKER_THREADS = 4
+WORKERS = 2
+
+# Lower runs first: expanding dramas and sounds early keeps every worker fed with pages.
+PRIORITY = {"drama": 0, "sound": 1, "reward": 1, "comment": 2, "danmaku": 2}
+
+Unit = Dict
+FollowUp = Tuple[str, int, str, int]
+
+
+class WorkQueue:
+    """SQLite queue of (drama, sound, endpoint, page) crawl units and their results.
+
+    A unit is leased to one worker at a time under a random token. Completing it stores the result and inserts the
+    units it leads to in one transaction, and only while the token still holds, so a unit whose lease expired and
+    was handed to another worker is accounted for exactly once no matter which of them finishes first. Any number of
+    processes on one host can share the file; WAL mode's shared-memory index does not work over a network filesystem.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        # Workers in other processes write here too: WAL lets them lease while the coordinator reads results,
+        # and synchronous=NORMAL keeps each lease/complete from paying for an fsync
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS queue_dramas (
+                    ordinal INTEGER PRIMARY KEY,
+                    drama_id TEXT NOT NULL UNIQUE
+                )
+            """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS queue_units (
+                    id INTEGER PRIMARY KEY,
+                    drama_id TEXT NOT NULL,
+                    sound_id INTEGER NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    priority INTEGER NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_token TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result BLOB,
+                    error TEXT,
+                    UNIQUE (drama_id, sound_id, endpoint, page)
+                )
+            """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS queue_units_ready ON queue_units (state, priority, id)")
+
+    def seed(self, drama_ids: Iterable[str]) -> int:
+        """Queue a drama unit for each new drama ID, remembering the order for the merge. Returns how many were new."""
+        added = 0
+        with self.lock, self.connection:
+            for drama_id in drama_ids:
+                cursor = self.connection.execute("INSERT OR IGNORE INTO queue_dramas (drama_id) VALUES (?)",
+                                                 (str(drama_id),))
+                added += cursor.rowcount
+                self._insert(self.connection, [(str(drama_id), 0, "drama", 0)])
+        return added
+
+    @staticmethod
+    def _insert(connection, units: Iterable[FollowUp]) -> None:
+        connection.executemany(
+            "INSERT OR IGNORE INTO queue_units (drama_id, sound_id, endpoint, page, priority) VALUES (?, ?, ?, ?, ?)",
+            [(drama_id, int(sound_id), endpoint, int(page), PRIORITY[endpoint])
+             for drama_id, sound_id, endpoint, page in units])
+
+    def lease(self, worker: str, lease_seconds: float = LEASE_SECONDS,
+              max_attempts: int = MAX_ATTEMPTS) -> Optional[Unit]:
+        """Claim the next pending unit (or one whose lease ran out), or None if there is nothing to hand out.
+
+        A unit whose lease ran out after its last allowed attempt (its worker crashed or hung every time) is marked
+        failed instead of being handed out again, so it can't keep the queue from draining.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE queue_units SET state = 'failed', lease_token = NULL, error = 'lease expired' "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, max_attempts))
+            row = self.connection.execute("""
+                UPDATE queue_units
+                SET state = 'leased', worker = ?, lease_token = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM queue_units
+                    WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) AND attempts < ?
+                    ORDER BY priority, id LIMIT 1
+                )
+                RETURNING id, drama_id, sound_id, endpoint, page, lease_token, attempts
+            """, (worker, uuid.uuid4().hex, now + lease_seconds, now, max_attempts)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "drama_id", "sound_id", "endpoint", "page", "lease_token", "attempts"), row))
+
+    def complete(self, unit: Unit, result: bytes, follow_ups: List[FollowUp]) -> bool:
+        """Store the unit's result and queue its follow-ups; False (and nothing written) if the lease was lost."""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE queue_units SET state = 'done', result = ?, lease_token = NULL, error = NULL "
+                "WHERE id = ? AND state = 'leased' AND lease_token = ?",
+                (result, unit["id"], unit["lease_token"]))
+            if cursor.rowcount != 1:
+                return False
+            self._insert(self.connection, follow_ups)
+        return True
+
+    def fail(self, unit: Unit, error: str, max_attempts: int = MAX_ATTEMPTS) -> None:
+        """Give the unit back for another try, or mark it failed once it has used up `max_attempts`."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE queue_units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_token = NULL, error = ? WHERE id = ? AND state = 'leased' AND lease_token = ?",
+                (max_attempts, error, unit["id"], unit["lease_token"]))
+
+    def counts(self) -> Dict[str, int]:
+        """Units per state."""
+        with self.lock:
+            rows = self.connection.execute("SELECT state, COUNT(*) FROM queue_units GROUP BY state").fetchall()
+        return dict(rows)
+
+    def drained(self) -> bool:
+        """True once no unit is pending or leased, i.e. nothing more can appear."""
+        counts = self.counts()
+        return not counts.get("pending") and not counts.get("leased")
+
+    def drama_ids(self) -> List[str]:
+        with self.lock:
+            rows = self.connection.execute("SELECT drama_id FROM queue_dramas ORDER BY ordinal").fetchall()
+        return [row[0] for row in rows]
+
+    def results(self, drama_id) -> Dict[Tuple[int, str, int], Optional[bytes]]:
+        """(sound_id, endpoint, page) -> result of every unit of the drama; failed units map to None."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT sound_id, endpoint, page, result FROM queue_units WHERE drama_id = ?",
+                (str(drama_id),)).fetchall()
+        return {(sound_id, endpoint, page): result for sound_id, endpoint, page, result in rows}
+
+    def failures(self) -> List[Tuple]:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT drama_id, sound_id, endpoint, page, attempts, error FROM queue_units "
+                "WHERE state = 'failed' ORDER BY id").fetchall()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _dump(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def crawl_unit(unit: Unit) -> Tuple[bytes, List[FollowUp]]:
+    """Fetch and parse one unit. Returns its result blob and the units it leads to.
+
+    Drama, sound and reward results are JSON; danmaku and comment pages are `UidSet.to_bytes`. A failed request
+    raises rather than yielding an empty result, so the unit is retried through `WorkQueue.fail`. A comment page with
+    more after it queues the next page, and page 1 queues every page its pagination announces, so the pages can be
+    spread over workers; the queue's uniqueness check drops the overlap.
+    """
+    drama_id, sound_id, endpoint, page = unit["drama_id"], unit["sound_id"], unit["endpoint"], unit["page"]
+    if endpoint == "drama":
+        sound_lists, name, price, view_count, catalog_name = client.fetch_drama_sound_lists(drama_id)
+        follow_ups = [(drama_id, 0, "reward", 0)]
+        for sound in sound_lists:
+            follow_ups += [(drama_id, sound['sound_id'], "sound", 0), (drama_id, sound['sound_id'], "danmaku", 0),
+                           (drama_id, sound['sound_id'], "comment", 1)]
+        return _dump([sound_lists, name, price, view_count, catalog_name]), follow_ups
+
+    if endpoint == "sound":
+        sound_detail = client.fetch_sound_detail(sound_id)
+        for field in DATETIME_FIELDS:
+            if sound_detail.get(field):
+                sound_detail[field] = sound_detail[field].isoformat()
+        return _dump(sound_detail), []
+
+    if endpoint == "reward":
+        return _dump(client.sum_reward_coin(client.fetch_reward_page(drama_id))), []
+
+    if endpoint == "danmaku":
+        return UidSet(client.fetch_danmakus(sound_id)).to_bytes(), []
+
+    if endpoint == "comment":
+        page_uids, data = client.fetch_comment_page_uids(sound_id, page)
+        follow_ups = []
+        if data and data["info"]["comment"]["hasMore"]:
+            last_page = page + 1
+            if page == 1:
+                last_page = max(last_page, client.comment_page_count(data) or 0)
+            follow_ups = [(drama_id, sound_id, "comment", next_page) for next_page in range(page + 1, last_page + 1)]
+        return UidSet(page_uids).to_bytes(), follow_ups
+
+    raise ValueError(f"Unknown endpoint {endpoint!r}")
+
+
+def share_rate_limit(workers: int) -> None:
+    """Give this process 1/`workers` of the client's default request budget, so `workers` processes together crawl
+    no faster than one would.
+    """
+    if workers > 1:
+        client.configure_rate_limit(rate=DEFAULT_RATE / workers, burst=max(1, DEFAULT_BURST // workers),
+                                    min_rate=DEFAULT_MIN_RATE / workers, max_rate=DEFAULT_MAX_RATE / workers)
+
+
+def run_worker(path: str = DEFAULT_QUEUE_DB, threads: int = WORKER_THREADS, poll_seconds: float = POLL_SECONDS,
+               workers: int = 1) -> int:
+    """Lease and crawl units on `threads` threads until the queue is drained. Returns the units this worker finished.
+
+    `workers` is how many worker processes crawl at the same time; each takes an equal share of the rate limit.
+    """
+    share_rate_limit(workers)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    finished = []
+
+    def work(queue: WorkQueue):
+        while True:
+            unit = queue.lease(worker)
+            if unit is None:
+                if queue.drained():
+                    return
+                time.sleep(poll_seconds)
+                continue
+            try:
+                result, follow_ups = crawl_unit(unit)
+            except Exception as e:
+                logging.warning(f"Unit {unit['endpoint']} {unit['drama_id']}/{unit['sound_id']}/{unit['page']} failed "
+                                f"(attempt {unit['attempts']}): {e}")
+                queue.fail(unit, repr(e))
+                continue
+            if queue.complete(unit, result, follow_ups):
+                finished.append(1)
+            else:
+                logging.warning(f"Lease on unit {unit['id']} expired before it finished; result discarded")
+
+    logging.info(f"Worker {worker} started with {threads} threads on {path}")
+    with WorkQueue(path) as queue, ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(work, queue) for _ in range(threads)]:
+            future.result()
+    logging.info(f"Worker {worker} done: {len(finished)} units")
+    return len(finished)
+
+
+def _uids(blob: Optional[bytes]) -> UidSet:
+    return UidSet.from_bytes(blob) if blob is not None else UidSet()
+
+
+def drama_results(queue: WorkQueue, drama_id) -> Optional[Tuple]:
+    """Rebuild what the sequential crawl sees for one drama: its `get_drama_sound_lists` tuple, top-50 coin, and the
+    (sound, sound_detail) pair of each episode with the same fields `process_sound` fills. None if the drama unit
+    itself failed.
+    """
+    results = queue.results(drama_id)
+    drama = results.get((0, "drama", 0))
+    if drama is None:
+        return None
+    sound_lists, name, price, view_count, catalog_name = json.loads(drama)
+    reward = results.get((0, "reward", 0))
+    fetch_top_50_coin = json.loads(reward) if reward is not None else 0
+
+    comment_pages: Dict[int, List[UidSet]] = {}
+    for (sound_id, endpoint, page), result in results.items():
+        if endpoint == "comment":
+            comment_pages.setdefault(sound_id, []).append(_uids(result))
+
+    sound_details = []
+    for sound in sound_lists:
+        sound_id = sound['sound_id']
+        detail = results.get((sound_id, "sound", 0))
+        sound_detail = json.loads(detail) if detail is not None else {}
+        for field in DATETIME_FIELDS:
+            if sound_detail.get(field):
+                sound_detail[field] = datetime.datetime.fromisoformat(sound_detail[field])
+        # A failed getsound leaves the episode without details; count it with no views rather than drop it
+        sound_detail.setdefault('create_time', None)
+        sound_detail.setdefault('view_count', None)
+        danmaku_uids = _uids(results.get((sound_id, "danmaku", 0)))
+        comment_uids = UidSet().union(*comment_pages.get(sound_id, []))
+        sound_detail.update({
+            'sound_id': sound_id,
+            'sound_title': sound.get('sound_title'),
+            'need_pay': sound.get('need_pay'),
+            'danmaku_uids': danmaku_uids,
+            'comment_uids': comment_uids,
+            'total_sound_uids': danmaku_uids.union(comment_uids),
+        })
+        sound_details.append((sound, sound_detail))
+    return (sound_lists, name, price, view_count, catalog_name), fetch_top_50_coin, sound_details
+
+
+def load_purchased(path: str = "purchased.json") -> List[str]:
+    """Drama IDs of the paid catalogue dump (or its `.catalogue` conversion), in file order."""
+    if path.endswith(".catalogue"):
+        with Catalogue(path) as catalogue:
+            return [str(drama_id) for drama_id in catalogue.ids.tolist()]
+    with open(path, encoding="utf-8") as f:
+        return [str(drama['id']) for drama in json.load(f)]
@@ -0,0 +1,58 @@
+"""Keep the paid-drama catalogue as a compact memory-mapped file instead of re-reading `purchased.json`.
+
+    python missevan_catalogue.py build [--source purchased.json]    # convert the JSON dump once
+    python missevan_catalogue.py refresh [--query ""] [--full]      # merge new/changed dramas from the search API
+    python missevan_catalogue.py show 75085 | "月下安途"              # look a drama up by id or title
+    python missevan_catalogue.py export purchased.json              # write the catalogue back out as a JSON dump
+"""
+import argparse
+import json
+import logging
+
+from missevan.catalogue import DEFAULT_CATALOGUE, Catalogue, convert, refresh
+from missevan.titles import DEFAULT_PURCHASED
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def show(catalogue: Catalogue, key: str) -> None:
+    dramas = [catalogue.get(key)] if key.isdigit() else catalogue.by_name(key)
+    dramas = [drama for drama in dramas if drama is not None]
+    if not dramas:
+        titles = catalogue.titles()
+        dramas = [catalogue.get(drama_id) for drama_id in titles.lookup(key)]
+        for score, drama_id, name in ([] if dramas else titles.candidates(key)):
+            print(f"? {drama_id} {name} ({score:.2f})")
+    for drama in dramas:
+        print(json.dumps(drama.to_dict(), ensure_ascii=False, indent=4))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "refresh", "show", "export"))
+    parser.add_argument("key", nargs="?", help="drama id or title for show, output path for export")
+    parser.add_argument("--catalogue", default=DEFAULT_CATALOGUE, help="catalogue file")
+    parser.add_argument("--source", default=DEFAULT_PURCHASED, help="JSON dump to build from")
+    parser.add_argument("--query", default="", help="search query to refresh from")
+    parser.add_argument("--full", action="store_true", help="walk every search page instead of stopping early")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        convert(args.source, args.catalogue)
+    elif args.command == "refresh":
+        refresh(args.catalogue, args.query, args.full)
+    elif args.key is None:
+        parser.error(f"{args.command} needs a key")
+    else:
+        with Catalogue(args.catalogue) as catalogue:
+            if args.command == "show":
+                show(catalogue, args.key)
+            else:
+                with open(args.key, "w", encoding="utf-8") as f:
+                    json.dump(list(catalogue.dramas()), f, ensure_ascii=False, indent=4)
+                logging.info(f"Wrote {len(catalogue)} dramas to {args.key}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Crawl `missevan_user_growth` output with any number of workers sharing one SQLite work queue.
+
+    python missevan_distributed.py seed [--purchased purchased.json | --dramas 62452,68690]
+    python missevan_distributed.py worker [--threads 4] [--workers 2]   # --workers of them, on the host holding the file
+    python missevan_distributed.py merge                        # once the queue is drained: writes the usual CSVs
+    python missevan_distributed.py run [--workers 2] [...seed options]  # all three on this machine
+    python missevan_distributed.py status
+"""
+import argparse
+import datetime
+import logging
+import multiprocessing
+import time
+
+from missevan.journal import RowBuffer, append_csv_atomically
+from missevan.uidset import UidSet
+from missevan.workqueue import DEFAULT_QUEUE_DB, WORKER_THREADS, WORKERS, WorkQueue, drama_results, \
+    load_purchased, run_worker
+from missevan_user_growth import DRAMA_HEADER, SOUND_HEADER, summarize_drama
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def seed(queue: WorkQueue, args) -> None:
+    drama_ids = load_purchased(args.purchased) if args.purchased else \
+        [drama_id.strip() for drama_id in args.dramas.split(',') if drama_id.strip()]
+    added = queue.seed(drama_ids)
+    logging.info(f"Queued {added} new dramas ({len(drama_ids) - added} already queued) in {queue.path}")
+
+
+def log_status(queue: WorkQueue) -> None:
+    counts = queue.counts()
+    logging.info(f"Units: {sum(counts.values())} total, " +
+                 ", ".join(f"{counts.get(state, 0)} {state}" for state in ("pending", "leased", "done", "failed")))
+
+
+def merge(queue: WorkQueue):
+    """Summarize every queued drama in seed order and append the rows to today's CSVs."""
+    if not queue.drained():
+        raise RuntimeError(f"{queue.path} still has pending or leased units; wait for the workers to finish")
+    for drama_id, sound_id, endpoint, page, attempts, error in queue.failures():
+        logging.warning(f"Unit {endpoint} {drama_id}/{sound_id}/{page} failed after {attempts} attempts ({error}); "
+                        f"its UIDs are missing from the merge")
+
+    all_paid_total_uids = UidSet()
+    previous_paid_uids = UidSet()
+    sound_rows, drama_rows = RowBuffer(), RowBuffer()
+    for drama_id in queue.drama_ids():
+        crawled = drama_results(queue, drama_id)
+        if crawled is None:
+            logging.error(f"Drama ID {drama_id} could not be listed; left out of the merge")
+            continue
+        (sound_lists, name, price, view_count, catalog_name), fetch_top_50_coin, sound_details = crawled
+        logging.info(f"Merging drama: (ID: {drama_id})")
+        _, total_paid_udis = summarize_drama(drama_id, name, price, view_count, fetch_top_50_coin, sound_details,
+                                             sound_rows, drama_rows, previous_paid_uids)
+        all_paid_total_uids.update(total_paid_udis)
+        previous_paid_uids = total_paid_udis
+
+    append_csv_atomically(f"{datetime.date.today()}_sound_data.csv", SOUND_HEADER, sound_rows)
+    append_csv_atomically(f"{datetime.date.today()}_drama_data.csv", DRAMA_HEADER, drama_rows)
+
+    print('-------------------------------------------------')
+    print(f"All Paid Total UIDs: {len(all_paid_total_uids)}")
+    print('-------------------------------------------------')
+    return all_paid_total_uids
+
+
+def run(queue: WorkQueue, args) -> None:
+    """Seed, drain the queue with local worker processes, then merge."""
+    seed(queue, args)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(queue.path, args.threads),
+                               kwargs={"workers": args.workers}) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        time.sleep(5)
+        log_status(queue)
+    for worker in workers:
+        worker.join()
+    log_status(queue)
+    merge(queue)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("seed", "worker", "merge", "run", "status"))
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_DB, help="shared queue database")
+    parser.add_argument("--purchased", help="seed every drama of this purchased.json dump or .catalogue file")
+    parser.add_argument("--dramas", default="", help="comma-separated drama ids to seed")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="worker processes for run, or how many worker commands share the API rate limit")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="fetch threads per worker")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.queue, args.threads, workers=args.workers)
+        return
+    with WorkQueue(args.queue) as queue:
+        if args.command == "seed":
+            seed(queue, args)
+        elif args.command == "merge":
+            merge(queue)
+        elif args.command == "run":
+            run(queue, args)
+        log_status(queue)
+
+
+if __name__ == '__main__':
+    main()
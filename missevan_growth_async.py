@@ -0,0 +1,61 @@
+import csv
+import datetime
+import logging
+
+from missevan.aio import DEFAULT_CONCURRENCY, DEFAULT_PER_HOST, crawl_dramas
+from missevan.client import log_cache_summary
+from missevan.metrics import write_metrics
+from missevan.uidset import UidSet
+from missevan_user_growth import DRAMA_HEADER, SOUND_HEADER, summarize_drama
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def get_user_input():
+    return input("Enter the drama ids (separate with commas, e.g, 62452,68690,72732,74464,74005,68204,74309,52382): ")
+
+
+def write_drama(drama, sound_writer, drama_writer, previous_paid_uids):
+    """Write one crawled drama through the same `summarize_drama` the sync engines use."""
+    return summarize_drama(drama['drama_id'], drama['name'], drama['price'], drama['view_count'],
+                           drama['top_50_coin'], ((sound_detail, sound_detail) for sound_detail in drama['sound_data']),
+                           sound_writer, drama_writer, previous_paid_uids)
+
+
+def runner(max_concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST):
+    drama_ids = [drama_id.strip() for drama_id in get_user_input().split(',')]
+    drama_sound = {}
+    all_paid_total_uids = UidSet()
+    previous_paid_uids = UidSet()
+
+    dramas = crawl_dramas(drama_ids, max_concurrency=max_concurrency, per_host=per_host)
+
+    with open(f"{datetime.date.today()}_sound_data.csv", mode='a', newline='', encoding='utf-8') as sound_file, \
+            open(f"{datetime.date.today()}_drama_data.csv", mode='a', newline='', encoding='utf-8') as drama_file:
+        sound_writer = csv.writer(sound_file)
+        drama_writer = csv.writer(drama_file)
+
+        # Check if the file is empty before writing headers
+        if sound_file.tell() == 0:
+            sound_writer.writerow(SOUND_HEADER)
+
+        if drama_file.tell() == 0:
+            drama_writer.writerow(DRAMA_HEADER)
+
+        for drama in dramas:
+            write_drama(drama, sound_writer, drama_writer, previous_paid_uids)
+            drama_sound[drama['drama_id']] = drama['sound_data']
+            all_paid_total_uids.update(drama['total_paid_udis'])
+            previous_paid_uids = drama['total_paid_udis']
+
+    print('-------------------------------------------------')
+    print(f"All Paid Total UIDs: {len(all_paid_total_uids)}")
+    print('-------------------------------------------------')
+    log_cache_summary()
+    write_metrics()
+    return drama_sound, all_paid_total_uids
+
+
+if __name__ == '__main__':
+    runner()
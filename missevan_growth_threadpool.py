@@ -1,103 +1,42 @@
-import csv
 import datetime
 import logging
-import time
-import xml.etree.ElementTree as ETree
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from missevan.client import COMMENT_WORKERS, configure_session, fetch_all_danmakus, fetch_all_uids_by_comments, \
+    get_sound_detail, get_top_50_coin, log_cache_summary
+from missevan.journal import CrawlJournal, RowBuffer, append_csv_atomically, job_name
+from missevan.metrics import write_metrics
+from missevan.pipeline import ParsePipeline
+from missevan.schedule import plan_crawl
+from missevan.uidset import UidSet
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-BASE_URL = "https://www.missevan.com"
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept-Language': 'en-US,en;q=0.9'
-}
+SOUND_HEADER = ["声音标题", "创建时间", "是否需要付费", "弹幕用户ID", "评论用户ID", "总用户ID", "观看次数"]
+DRAMA_HEADER = ["剧集ID", "剧集名称", "首个声音创建时间", "价格", "总观看次数", "付费观看次数", "免费观看次数",
+                "付费弹幕用户ID", "付费评论用户ID", "免费弹幕用户ID", "免费评论用户ID",
+                "付费总用户ID", "免费总用户ID", "前五十打赏", "新增付费用户增长"]
+
+MAX_WORKERS = 4
 
-def get_drama_sound_lists(drama_id):
-    url = f"{BASE_URL}/dramaapi/getdrama?drama_id={drama_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json().get("info", {})
-        drama = data.get('drama', {})
-        episodes = data.get("episodes", {}).get("episode", [])
-
-        sound_lists = [{
-            "sound_id": episode["sound_id"],
-            "sound_title": episode["soundstr"],
-            'need_pay': episode.get("need_pay", 0)
-        } for episode in episodes]
-
-        return sound_lists, drama.get('name'), drama.get('price'), drama.get('view_count'), drama.get('catalog_name')
-    except requests.RequestException as e:
-        logging.error(f"Error fetching sound lists for drama ID {drama_id}: {e}")
-        return [], '', '', '', ''
-
-def get_sound_detail(sound_id):
-    url = f"{BASE_URL}/sound/getsound?soundid={sound_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        sound = response.json().get("info", {}).get("sound", {})
-
-        return {
-            "sound_id": sound_id,
-            "view_count": sound.get("view_count"),
-            "view_count_formatted": sound.get("view_count_formatted"),
-            "comment_count": sound.get("comment_count"),
-            "favorite_count": sound.get("favorite_count"),
-            "username": sound.get("username"),
-            "create_time": datetime.datetime.fromtimestamp(sound.get('create_time', 0)) if sound.get('create_time', 0) > 0 else None,
-        }
-    except requests.RequestException as e:
-        logging.error(f"Error fetching sound detail for sound ID {sound_id}: {e}")
-        return {}
-
-def fetch_all_danmakus(sound_id):
-    url = f"{BASE_URL}/sound/getdm?soundid={sound_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        pp_comments_xml = ETree.fromstring(response.text)
-        return {int(item.attrib["p"].split(",")[6]) for item in pp_comments_xml.findall("d") if
-                item.attrib["p"].split(",")[1] != "4"}
-    except (requests.RequestException, ETree.ParseError) as e:
-        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
-        return set()
-
-def extract_user_ids(data):
-    user_ids = {int(comment["userid"]) for comment in data["info"]["comment"]["Datas"]}
-    user_ids.update(
-        int(sub["userid"]) for comment in data["info"]["comment"]["Datas"] for sub in comment["subcomments"])
-    return user_ids
-
-def fetch_all_uids_by_comments(sound_id):
-    endpoint = f"{BASE_URL}/site/getcomment?type=1&e_id={sound_id}&order=3&p={{}}&pagesize=100"
-    comments_uids = set()
-    page = 1
-
-    while True:
-        response = requests.get(endpoint.format(page), headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        comments_uids.update(extract_user_ids(data))
-
-        if not data["info"]["comment"]["hasMore"]:
-            break
-        page += 1
-
-    return comments_uids
 
 def get_user_input():
     return input("Enter the drama ids (separate with commas, e.g, 62452,68690,72732,74464,74005,68204,74309,52382): ")
 
-def process_sound(sound):
+def process_sound(sound, journal=None, pipeline=None, sound_detail=None):
+    """`sound_detail` is the getsound result when the crawl plan already fetched it."""
     sound_id = sound.get('sound_id')
-    sound_detail = get_sound_detail(sound_id)
-    danmaku_uids = fetch_all_danmakus(sound_id)
-    comment_uids = fetch_all_uids_by_comments(sound_id)
+    journaled = journal.load_sound(sound_id) if journal is not None else None
+    if journaled is not None:
+        return journaled
+
+    sound_detail = dict(sound_detail) if sound_detail else get_sound_detail(sound_id)
+    if pipeline is not None:
+        danmaku_uids = pipeline.fetch_danmaku_uids(sound_id)
+        comment_uids = pipeline.fetch_comment_uids(sound_id)
+    else:
+        danmaku_uids = UidSet(fetch_all_danmakus(sound_id))
+        comment_uids = UidSet(fetch_all_uids_by_comments(sound_id))
 
     sound_detail.update({
         'sound_id': sound_id,
@@ -107,72 +46,73 @@ def process_sound(sound):
         'comment_uids': comment_uids,
         'total_sound_uids': danmaku_uids.union(comment_uids),
     })
+    if journal is not None:
+        journal.save_sound(sound_detail)
 
     return sound_detail
 
-def get_top_50_coin(drama_id):
-    try:
-        total_coin = 0
-        url = f"{BASE_URL}/reward/user-reward-rank?drama_id={drama_id}&period=3"
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            rewards = response.json().get("info").get("data")
-            if rewards:
-                for reward in rewards:
-                    total_coin += (int(reward.get('coin')) if reward.get('coin') is not None else 0)
+def crawl_sounds(drama_ids, journal=None, pipeline=None):
+    """Plan every sound of `drama_ids` and crawl them largest-first on one shared pool."""
+    plan = plan_crawl(drama_ids, journal, MAX_WORKERS + COMMENT_WORKERS)
+    outcomes = plan.execute(lambda task: process_sound(task['sound'], journal, pipeline, task['sound_detail']),
+                            MAX_WORKERS)
+    return plan, outcomes
 
-        return total_coin
-    except:
-        return 0
 
-def process_drama_id(drama_id, sound_writer, drama_writer, previous_paid_uids):
+def process_drama_id(drama_id, sound_writer, drama_writer, previous_paid_uids, journal=None, pipeline=None,
+                     plan=None, outcomes=None):
 
     logging.info(f"Processing drama: (ID: {drama_id})")
-    sound_lists, name, price, view_count, catalog_name = get_drama_sound_lists(drama_id)
+    if plan is None:
+        plan, outcomes = crawl_sounds([drama_id], journal, pipeline)
+    sound_lists, name, price, view_count, catalog_name = plan.dramas[drama_id]
 
     fetch_top_50_coin = get_top_50_coin(drama_id)
 
     sound_data = []
-    total_paid_udis = set()
-    total_free_udis = set()
+    total_paid_udis = UidSet()
+    total_free_udis = UidSet()
 
-    total_paid_danmaku_udis = set()
-    total_paid_comment_uids = set()
-    total_free_danmaku_udis = set()
-    total_free_comment_uids = set()
+    total_paid_danmaku_udis = UidSet()
+    total_paid_comment_uids = UidSet()
+    total_free_danmaku_udis = UidSet()
+    total_free_comment_uids = UidSet()
 
     paid_view_count = 0
     free_view_count = 0
     first_sound_create_time = None
+    failed = []
 
     if sound_lists:
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = {executor.submit(process_sound, sound): sound for sound in sound_lists}
-            for future in as_completed(futures):
-                sound = futures[future]
-                try:
-                    sound_detail = future.result()
-                    if sound_detail['create_time'] is not None and (first_sound_create_time is None or sound_detail['create_time'] < first_sound_create_time):
-                        first_sound_create_time = sound_detail['create_time']
-                    if sound_detail:
-                        if sound.get('need_pay') > 0:
-                            total_paid_udis.update(sound_detail['total_sound_uids'])
-                            paid_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
-
-                            total_paid_danmaku_udis.update(sound_detail['danmaku_uids'])
-                            total_paid_comment_uids.update(sound_detail['comment_uids'])
-                        else:
-                            total_free_udis.update(sound_detail['total_sound_uids'])
-                            total_free_danmaku_udis.update(sound_detail['danmaku_uids'])
-                            total_free_comment_uids.update(sound_detail['comment_uids'])
-                            free_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
-
-                        sound_data.append(sound_detail)
-                        print(sound_detail['sound_title'], sound_detail['create_time'], sound_detail['need_pay'],
-                            len(sound_detail['danmaku_uids']), len(sound_detail['comment_uids']),
-                            len(sound_detail['total_sound_uids']), sound_detail['view_count'])
-                except Exception as e:
-                    logging.error(f"Error processing sound {sound}: {e}")
+        for sound, future in outcomes[drama_id]:
+            try:
+                sound_detail = future.result()
+                if sound_detail['create_time'] is not None and (first_sound_create_time is None or sound_detail['create_time'] < first_sound_create_time):
+                    first_sound_create_time = sound_detail['create_time']
+                if sound_detail:
+                    if sound.get('need_pay') > 0:
+                        total_paid_udis.update(sound_detail['total_sound_uids'])
+                        paid_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
+
+                        total_paid_danmaku_udis.update(sound_detail['danmaku_uids'])
+                        total_paid_comment_uids.update(sound_detail['comment_uids'])
+                    else:
+                        total_free_udis.update(sound_detail['total_sound_uids'])
+                        total_free_danmaku_udis.update(sound_detail['danmaku_uids'])
+                        total_free_comment_uids.update(sound_detail['comment_uids'])
+                        free_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
+
+                    sound_data.append(sound_detail)
+                    print(sound_detail['sound_title'], sound_detail['create_time'], sound_detail['need_pay'],
+                        len(sound_detail['danmaku_uids']), len(sound_detail['comment_uids']),
+                        len(sound_detail['total_sound_uids']), sound_detail['view_count'])
+            except Exception as e:
+                logging.error(f"Error processing sound {sound}: {e}")
+                failed.append(sound.get('sound_id'))
+
+    # Every other sound has finished (and is journaled); fail the drama so it isn't journaled as complete
+    if failed:
+        raise RuntimeError(f"{len(failed)} sounds of drama ID {drama_id} failed: {failed}")
 
     # Calculate the growth in paid user IDs
     new_paid_uids = total_paid_udis.difference(previous_paid_uids)
@@ -201,42 +141,63 @@ def process_drama_id(drama_id, sound_writer, drama_writer, previous_paid_uids):
 
     return sound_data, total_paid_udis
 
-def runner():
-    drama_ids = get_user_input()
-    drama_sound = {}
-    all_paid_total_uids = set()
-    previous_paid_uids = set()
-
-    with open(f"{datetime.date.today()}_sound_data.csv", mode='a', newline='', encoding='utf-8') as sound_file, \
-            open(f"{datetime.date.today()}_drama_data.csv", mode='a', newline='', encoding='utf-8') as drama_file:
-        sound_writer = csv.writer(sound_file)
-        drama_writer = csv.writer(drama_file)
-
-        # Check if the file is empty before writing headers
-        sound_file_empty = sound_file.tell() == 0
-        drama_file_empty = drama_file.tell() == 0
-
-        if sound_file_empty:
-            sound_writer.writerow(["声音标题", "创建时间", "是否需要付费", "弹幕用户ID", "评论用户ID", "总用户ID", "观看次数"])
-
-        if drama_file_empty:
-            drama_writer.writerow(
-                ["剧集ID", "剧集名称", "首个声音创建时间", "价格", "总观看次数", "付费观看次数", "免费观看次数",
-                 "付费弹幕用户ID", "付费评论用户ID", "免费弹幕用户ID", "免费评论用户ID",
-                 "付费总用户ID", "免费总用户ID", "前五十打赏", "新增付费用户增长"])
-
-        for drama_id in drama_ids.split(','):
-            sound_data, total_paid_udis = process_drama_id(drama_id.strip(), sound_writer, drama_writer, previous_paid_uids)
+def runner(resume=True, parse_processes=0):
+    """With `parse_processes` > 0, danmaku/comment parsing runs in that many worker processes."""
+    drama_ids = [drama_id.strip() for drama_id in get_user_input().split(',')]
+    configure_session(pool_size=MAX_WORKERS + COMMENT_WORKERS)
+    journal = CrawlJournal(job_name(__file__, drama_ids)) if resume else None
+    pipeline = ParsePipeline(parse_processes).start() if parse_processes else None
+    # The parse pool is a set of spawned processes: shut it down whichever way the crawl ends
+    try:
+        finished_dramas = {drama_id: journal.load_drama(drama_id) if journal is not None else None
+                           for drama_id in drama_ids}
+        plan, outcomes = crawl_sounds([drama_id for drama_id in drama_ids if finished_dramas[drama_id] is None],
+                                      journal, pipeline)
+        drama_sound = {}
+        all_paid_total_uids = UidSet()
+        previous_paid_uids = UidSet()
+        sound_rows = []
+        drama_rows = []
+
+        for drama_id in drama_ids:
+            finished = finished_dramas[drama_id]
+            if finished is not None:
+                logging.info(f"Drama ID {drama_id} already crawled, resuming from journal")
+                sound_data, total_paid_udis = finished['sound_data'], finished['total_paid_uids']
+                drama_sound_rows, drama_drama_rows = finished['sound_rows'], finished['drama_rows']
+            else:
+                drama_sound_rows, drama_drama_rows = RowBuffer(), RowBuffer()
+                try:
+                    sound_data, total_paid_udis = process_drama_id(drama_id, drama_sound_rows, drama_drama_rows,
+                                                                   previous_paid_uids, journal, pipeline, plan,
+                                                                   outcomes)
+                except Exception:
+                    if journal is not None:
+                        logging.error(f"Crawl failed on drama ID {drama_id}; finished sounds are saved in "
+                                      f"{journal.path}, rerun with the same drama ids to resume")
+                    raise
+                if journal is not None:
+                    journal.save_drama(drama_id, sound_data, drama_sound_rows, drama_drama_rows, total_paid_udis)
+
+            sound_rows.extend(drama_sound_rows)
+            drama_rows.extend(drama_drama_rows)
             drama_sound[drama_id] = sound_data
             all_paid_total_uids.update(total_paid_udis)
             previous_paid_uids = total_paid_udis
 
-            print("--------------------- Taking a break -------------------------")
-            time.sleep(60)
+        append_csv_atomically(f"{datetime.date.today()}_sound_data.csv", SOUND_HEADER, sound_rows)
+        append_csv_atomically(f"{datetime.date.today()}_drama_data.csv", DRAMA_HEADER, drama_rows)
+        if journal is not None:
+            journal.finish()
+    finally:
+        if pipeline is not None:
+            pipeline.close()
 
     print('-------------------------------------------------')
     print(f"All Paid Total UIDs: {len(all_paid_total_uids)}")
     print('-------------------------------------------------')
+    log_cache_summary()
+    write_metrics()
     return drama_sound, all_paid_total_uids
 
 if __name__ == '__main__':
@@ -1,133 +1,25 @@
-import xml.etree.ElementTree as ETree
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
+import argparse
 import logging
 
+from missevan.client import COMMENT_WORKERS, configure_session, fetch_all_danmakus, fetch_all_uids_by_comments, \
+    fetch_drama_sound_by_search, fetch_top_50_reward, get_paid_sound_lists, get_sound_detail, \
+    log_cache_summary
+from missevan.estimate import sketch_paid_drama
+from missevan.hll import DEFAULT_ERROR, DEFAULT_SKETCH_DB, HyperLogLog, SketchStore, relative_error
+from missevan.metrics import write_metrics
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-
-def fetch_all_popup_comments(sound_id):
-    try:
-        pp_comments_url = f"https://www.missevan.com/sound/getdm?soundid={sound_id}"
-        pp_reponse_txt = requests.get(pp_comments_url).text
-        pp_comments_xml = ETree.fromstring(pp_reponse_txt)
-        uids = set()
-
-        for items in pp_comments_xml.findall("d"):
-            _stime, _mode, _size, _color, _date, _class, _uid, _dmid = items.attrib["p"].split(",")
-            if _mode != "4":
-                uids.add(int(_uid))
-
-        return uids
-    except Exception as e:
-        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
-        return set()
-
-
-def get_drama_sound_lists(drama_id):
-    try:
-        sound_lists = []
-        url = f"https://www.missevan.com/dramaapi/getdrama?drama_id={drama_id}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            episodes = response.json().get("info", {}).get("episodes", {}).get("episode", [])
-            for episode in episodes:
-                if episode.get("need_pay", 0) > 0:
-                    sound_lists.append({
-                        "sound_id": episode["sound_id"],
-                        "sound_title": episode["soundstr"],
-                    })
-        return sound_lists
-    except Exception as e:
-        logging.error(f"Error fetching sound lists for drama ID {drama_id}: {e}")
-        return []
-
-
-def extract_user_ids(data):
-    user_ids = set()
-    for comment_data in data["info"]["comment"]["Datas"]:
-        user_ids.add(int(comment_data["userid"]))
-        for subcomment in comment_data["subcomments"]:
-            user_ids.add(int(subcomment["userid"]))
-    return user_ids
-
-
-def fetch_all_uids_by_comments(sound_id):
-    endpoint = "https://www.missevan.com/site/getcomment?type=1&e_id={}&order=3&p={}&pagesize=100"
-    all_user_ids = set()
-    page = 1
-
-    while True:
-        response = requests.get(endpoint.format(sound_id, page))
-        data = response.json()
-        user_ids = extract_user_ids(data)
-        all_user_ids.update(user_ids)
-        if not data["info"]["comment"]["hasMore"]:
-            break
-        page += 1
-
-    return all_user_ids
-
-
-def get_sound_detail(sound_id):
-    try:
-        url = f"https://www.missevan.com/sound/getsound?soundid={sound_id}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            sound = response.json().get("info", {}).get("sound", {})
-            return {"view_count": sound.get("view_count")}
-        return {}
-    except Exception as e:
-        logging.error(f"Error fetching sound detail for sound ID {sound_id}: {e}")
-        return {}
-
-
-def fetch_top_50_reward(drama_id):
-    try:
-        reward_ids = set()
-        url = f"https://www.missevan.com/reward/user-reward-rank?drama_id={drama_id}&period=3"
-        response = requests.get(url)
-        if response.status_code == 200:
-            rewards = response.json().get("info", {}).get("data", [])
-            for reward in rewards:
-                reward_ids.add(int(reward["id"]))
-        return reward_ids
-    except Exception as e:
-        logging.error(f"Error fetching top 50 reward for drama ID {drama_id}: {e}")
-        return set()
-
-
-def fetch_drama_sound_by_search(search_name):
-    try:
-        url = "https://www.missevan.com/dramaapi/search"
-        params = {"s": search_name, "page": 1}
-        drama_ids = set()
-
-        while True:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            dramas = response.json()["info"]["Datas"]
-            for drama in dramas:
-                if drama["pay_type"] > 0:
-                    drama_ids.add((drama["id"], drama["name"]))
-
-            pagination = response.json()["info"]["pagination"]
-            if pagination["p"] >= pagination["maxpage"]:
-                break
-            params["page"] += 1
-
-        return drama_ids
-    except Exception as e:
-        logging.error(f"Error searching for drama by name {search_name}: {e}")
-        return set()
+MAX_WORKERS = 5
 
 
 def process_sound(sound, m_ids):
     try:
         sound_details = get_sound_detail(sound.get('sound_id'))
         u_m_ids = set()
-        popup_comment_uids = fetch_all_popup_comments(sound.get('sound_id'))
+        popup_comment_uids = fetch_all_danmakus(sound.get('sound_id'))
         for u_id in popup_comment_uids:
             m_ids.add(int(u_id))
             u_m_ids.add(int(u_id))
@@ -143,9 +35,31 @@ def process_sound(sound, m_ids):
         logging.error(f"Error processing sound {sound.get('sound_title')}: {e}")
 
 
-def runner():
+def estimate_runner(drama_ids, error=DEFAULT_ERROR, sketch_db=DEFAULT_SKETCH_DB):
+    """`runner` with one HyperLogLog sketch per drama instead of exact UID sets."""
+    total_sketch = HyperLogLog(error)
+    all_drama_names = set()
+
+    with SketchStore(sketch_db) as store:
+        for drama_id, drama_name in drama_ids:
+            all_drama_names.add(drama_name)
+            logging.info(f"Processing drama: {drama_name} (ID: {drama_id})")
+            total_sketch.update(sketch_paid_drama(drama_id, error, store, MAX_WORKERS))
+            logging.info(f"Estimated count of unique user IDs for drama {drama_name}: ~{len(total_sketch)}")
+
+    logging.info(f"Estimated count of unique user IDs across all dramas: ~{len(total_sketch)} "
+                 f"(±{total_sketch.error:.1%})")
+    log_cache_summary()
+    write_metrics()
+    return total_sketch, all_drama_names
+
+
+def runner(estimate=False, error=DEFAULT_ERROR, sketch_db=DEFAULT_SKETCH_DB):
     search_name = input("Enter the drama name: ")
+    configure_session(pool_size=MAX_WORKERS + COMMENT_WORKERS)
     drama_ids = fetch_drama_sound_by_search(search_name)
+    if estimate:
+        return estimate_runner(drama_ids, error, sketch_db)
 
     total_m_ids = set()  # Using a set to ensure unique IDs
     all_drama_names = set()  # Set to collect all unique drama names
@@ -161,8 +75,8 @@ def runner():
         reward_uids = fetch_top_50_reward(drama_id)
         drama_m_ids.update(int(reward_uid) for reward_uid in reward_uids)
 
-        sound_lists = get_drama_sound_lists(drama_id)
-        with ThreadPoolExecutor(max_workers=5) as executor:
+        sound_lists = get_paid_sound_lists(drama_id)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             futures = [executor.submit(process_sound, sound, drama_m_ids) for sound in sound_lists]
             for future in as_completed(futures):
                 future.result()
@@ -173,9 +87,16 @@ def runner():
         logging.info(f"Total count of unique user IDs for drama {drama_name}: {len(drama_user_counts)}")
 
     logging.info(f"Total count of unique user IDs across all dramas: {len(total_m_ids)}")
+    log_cache_summary()
+    write_metrics()
     return total_m_ids, all_drama_names
 
 
 if __name__ == '__main__':
-    total_m_ids, all_drama_names = runner()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estimate", action="store_true", help="count with HyperLogLog sketches instead of exact sets")
+    parser.add_argument("--error", type=relative_error, default=DEFAULT_ERROR, help="relative standard error of --estimate")
+    parser.add_argument("--sketch-db", default=DEFAULT_SKETCH_DB, help="where --estimate keeps its sketches")
+    args = parser.parse_args()
+    total_m_ids, all_drama_names = runner(args.estimate, args.error, args.sketch_db)
     print(f"Total unique user IDs of {', '.join(all_drama_names)}: {len(total_m_ids)}")
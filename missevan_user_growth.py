@@ -1,108 +1,48 @@
-import csv
+import argparse
 import datetime
 import logging
-import time
-import xml.etree.ElementTree as ETree
-import requests
+
+from missevan.activity import ActivityLog, activity_rows
+from missevan.client import fetch_all_danmakus, fetch_all_uids_by_comments, fetch_comment_activity, \
+    fetch_danmaku_activity, get_drama_sound_lists, get_sound_detail, get_top_50_coin, log_cache_summary
+from missevan.columnar import COLUMNAR_FORMATS, ColumnarWriter, default_format
+from missevan.journal import CrawlJournal, RowBuffer, append_csv_atomically, job_name
+from missevan.metrics import write_metrics
+from missevan.snapshot import open_incremental, refresh_sound_uids
+from missevan.uidset import UidSet
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-BASE_URL = "https://www.missevan.com"
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept-Language': 'en-US,en;q=0.9'
-}
-
-def get_drama_sound_lists(drama_id):
-    url = f"{BASE_URL}/dramaapi/getdrama?drama_id={drama_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json().get("info", {})
-        drama = data.get('drama', {})
-        episodes = data.get("episodes", {}).get("episode", [])
-
-        sound_lists = [{
-            "sound_id": episode["sound_id"],
-            "sound_title": episode["soundstr"],
-            'need_pay': episode.get("need_pay", 0)
-        } for episode in episodes]
-
-        return sound_lists, drama.get('name'), drama.get('price'), drama.get('view_count'), drama.get('catalog_name')
-    except requests.RequestException as e:
-        logging.error(f"Error fetching sound lists for drama ID {drama_id}: {e}")
-        return [], '', '', '', ''
-
-
-def get_sound_detail(sound_id):
-    url = f"{BASE_URL}/sound/getsound?soundid={sound_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        sound = response.json().get("info", {}).get("sound", {})
-
-        return {
-            "sound_id": sound_id,
-            "view_count": sound.get("view_count"),
-            "view_count_formatted": sound.get("view_count_formatted"),
-            "comment_count": sound.get("comment_count"),
-            "favorite_count": sound.get("favorite_count"),
-            "username": sound.get("username"),
-            "create_time": datetime.datetime.fromtimestamp(sound.get('create_time', 0)) if sound.get('create_time', 0) > 0 else None,
-        }
-    except requests.RequestException as e:
-        logging.error(f"Error fetching sound detail for sound ID {sound_id}: {e}")
-        return {}
-
-
-def fetch_all_danmakus(sound_id):
-    url = f"{BASE_URL}/sound/getdm?soundid={sound_id}"
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        pp_comments_xml = ETree.fromstring(response.text)
-        return {int(item.attrib["p"].split(",")[6]) for item in pp_comments_xml.findall("d") if
-                item.attrib["p"].split(",")[1] != "4"}
-    except (requests.RequestException, ETree.ParseError) as e:
-        logging.error(f"Error fetching popup comments for sound ID {sound_id}: {e}")
-        return set()
-
-
-def extract_user_ids(data):
-    user_ids = {int(comment["userid"]) for comment in data["info"]["comment"]["Datas"]}
-    user_ids.update(
-        int(sub["userid"]) for comment in data["info"]["comment"]["Datas"] for sub in comment["subcomments"])
-    return user_ids
-
-
-def fetch_all_uids_by_comments(sound_id):
-    endpoint = f"{BASE_URL}/site/getcomment?type=1&e_id={sound_id}&order=3&p={{}}&pagesize=100"
-    comments_uids = set()
-    page = 1
-
-    while True:
-        response = requests.get(endpoint.format(page), headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        comments_uids.update(extract_user_ids(data))
-
-        if not data["info"]["comment"]["hasMore"]:
-            break
-        page += 1
-
-    return comments_uids
+SOUND_HEADER = ["声音标题", "创建时间", "是否需要付费", "弹幕用户ID", "评论用户ID", "总用户ID", "观看次数"]
+DRAMA_HEADER = ["剧集ID", "剧集名称", "首个声音创建时间", "价格", "总观看次数", "付费观看次数", "免费观看次数",
+                "付费弹幕用户ID", "付费评论用户ID", "免费弹幕用户ID", "免费评论用户ID",
+                "付费总用户ID", "免费总用户ID", "前五十打赏", "新增付费用户增长"]
+ACTIVITY_HEADER = ["剧集ID", "周期", "开始日期", "活跃用户ID", "首次活跃用户ID"]
 
 
 def get_user_input():
     return input("Enter the drama ids (separate with commas, e.g, 62452,68690,72732,74464,74005,68204,74309,52382): ")
 
 
-def process_sound(sound):
+def process_sound(sound, store=None, journal=None, activity=False):
     sound_id = sound.get('sound_id')
+    sound_detail = journal.load_sound(sound_id) if journal is not None else None
+    if sound_detail is not None and (not activity or 'danmaku_activity' in sound_detail):
+        return sound_detail
+
     sound_detail = get_sound_detail(sound_id)
-    danmaku_uids = fetch_all_danmakus(sound_id)
-    comment_uids = fetch_all_uids_by_comments(sound_id)
+    if activity:
+        # Timestamps only come with a full crawl, so the snapshot store's incremental path doesn't apply
+        sound_detail['danmaku_activity'] = fetch_danmaku_activity(sound_id)
+        sound_detail['comment_activity'] = fetch_comment_activity(sound_id)
+        danmaku_uids = sound_detail['danmaku_activity'].uid_set()
+        comment_uids = sound_detail['comment_activity'].uid_set()
+    elif store is not None:
+        danmaku_uids, comment_uids = refresh_sound_uids(store, sound_id)
+    else:
+        danmaku_uids = UidSet(fetch_all_danmakus(sound_id))
+        comment_uids = UidSet(fetch_all_uids_by_comments(sound_id))
 
     sound_detail.update({
         'sound_id': sound_id,
@@ -112,68 +52,64 @@ def process_sound(sound):
         'comment_uids': comment_uids,
         'total_sound_uids': danmaku_uids.union(comment_uids),
     })
+    if journal is not None:
+        journal.save_sound(sound_detail)
 
     return sound_detail
 
 
-def get_top_50_coin(drama_id):
-    try:
-        total_coin = 0
-        url = f"{BASE_URL}/reward/user-reward-rank?drama_id={drama_id}&period=3"
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            rewards = response.json().get("info").get("data")
-            if rewards:
-                for reward in rewards:
-                    total_coin += (int(reward.get('coin')) if reward.get('coin') is not None else 0)
-
-        return total_coin
-    except:
-        return 0
-
-
-def process_drama_id(drama_id, sound_writer, drama_writer, previous_paid_uids):
+def process_drama_id(drama_id, sound_writer, drama_writer, previous_paid_uids, store=None, journal=None,
+                     activity=False):
 
     logging.info(f"Processing drama: (ID: {drama_id})")
     sound_lists, name, price, view_count, catalog_name = get_drama_sound_lists(drama_id)
 
     fetch_top_50_coin = get_top_50_coin(drama_id)
 
+    sound_details = ((sound, process_sound(sound, store, journal, activity)) for sound in sound_lists or [])
+    return summarize_drama(drama_id, name, price, view_count, fetch_top_50_coin, sound_details,
+                           sound_writer, drama_writer, previous_paid_uids)
+
+
+def summarize_drama(drama_id, name, price, view_count, fetch_top_50_coin, sound_details, sound_writer, drama_writer,
+                    previous_paid_uids):
+    """Write one drama's sound and drama rows from its (sound, sound_detail) pairs, in episode order.
+
+    Split from `process_drama_id` so the distributed merge can feed it results crawled elsewhere.
+    """
     sound_data = []
-    total_paid_udis = set()
-    total_free_udis = set()
+    total_paid_udis = UidSet()
+    total_free_udis = UidSet()
 
-    total_paid_danmaku_udis = set()
-    total_paid_comment_uids = set()
-    total_free_danmaku_udis = set()
-    total_free_comment_uids = set()
+    total_paid_danmaku_udis = UidSet()
+    total_paid_comment_uids = UidSet()
+    total_free_danmaku_udis = UidSet()
+    total_free_comment_uids = UidSet()
 
     paid_view_count = 0
     free_view_count = 0
     first_sound_create_time = None
 
-    if sound_lists:
-        for sound in sound_lists:
-            sound_detail = process_sound(sound)
-            if sound_detail['create_time'] is not None and (first_sound_create_time is None or sound_detail['create_time'] < first_sound_create_time):
-                first_sound_create_time = sound_detail['create_time']
-            if sound_detail:
-                if sound.get('need_pay') > 0:
-                    total_paid_udis.update(sound_detail['total_sound_uids'])
-                    paid_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
-
-                    total_paid_danmaku_udis.update(sound_detail['danmaku_uids'])
-                    total_paid_comment_uids.update(sound_detail['comment_uids'])
-                else:
-                    total_free_udis.update(sound_detail['total_sound_uids'])
-                    total_free_danmaku_udis.update(sound_detail['danmaku_uids'])
-                    total_free_comment_uids.update(sound_detail['comment_uids'])
-                    free_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
-
-                sound_data.append(sound_detail)
-                print(sound_detail['sound_title'], sound_detail['create_time'], sound_detail['need_pay'],
-                      len(sound_detail['danmaku_uids']), len(sound_detail['comment_uids']),
-                      len(sound_detail['total_sound_uids']), sound_detail['view_count'])
+    for sound, sound_detail in sound_details:
+        if sound_detail['create_time'] is not None and (first_sound_create_time is None or sound_detail['create_time'] < first_sound_create_time):
+            first_sound_create_time = sound_detail['create_time']
+        if sound_detail:
+            if sound.get('need_pay') > 0:
+                total_paid_udis.update(sound_detail['total_sound_uids'])
+                paid_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
+
+                total_paid_danmaku_udis.update(sound_detail['danmaku_uids'])
+                total_paid_comment_uids.update(sound_detail['comment_uids'])
+            else:
+                total_free_udis.update(sound_detail['total_sound_uids'])
+                total_free_danmaku_udis.update(sound_detail['danmaku_uids'])
+                total_free_comment_uids.update(sound_detail['comment_uids'])
+                free_view_count += (int(sound_detail['view_count']) if sound_detail['view_count'] is not None else 0)
+
+            sound_data.append(sound_detail)
+            print(sound_detail['sound_title'], sound_detail['create_time'], sound_detail['need_pay'],
+                  len(sound_detail['danmaku_uids']), len(sound_detail['comment_uids']),
+                  len(sound_detail['total_sound_uids']), sound_detail['view_count'])
 
     # Calculate the growth in paid user IDs
     new_paid_uids = total_paid_udis.difference(previous_paid_uids)
@@ -203,44 +139,82 @@ def process_drama_id(drama_id, sound_writer, drama_writer, previous_paid_uids):
     return sound_data, total_paid_udis
 
 
-def runner():
-    drama_ids = get_user_input()
+def drama_activity(sound_data) -> ActivityLog:
+    """Every danmaku and comment event of a drama's sounds, paid and free."""
+    log = ActivityLog()
+    for sound_detail in sound_data:
+        if 'danmaku_activity' not in sound_detail:
+            logging.warning(f"Sound ID {sound_detail['sound_id']} was journaled without activity; left out of it")
+            continue
+        log.update(sound_detail['danmaku_activity'], sound_detail['comment_activity'])
+    return log
+
+
+def runner(incremental=False, resume=True, activity=False, output=None):
+    """Crawl the dramas typed in and write the results: `output` is 'parquet' or 'arrow' for the typed tables of
+    `missevan.columnar`, or 'csv' for the dated CSVs. The default is Parquet when pyarrow is installed.
+    """
+    output = output or default_format()
+    drama_ids = [drama_id.strip() for drama_id in get_user_input().split(',')]
+    store = open_incremental() if incremental else None
+    journal = CrawlJournal(job_name(__file__, drama_ids)) if resume else None
     drama_sound = {}
-    all_paid_total_uids = set()
-    previous_paid_uids = set()
-
-    with open(f"{datetime.date.today()}_sound_data.csv", mode='a', newline='', encoding='utf-8') as sound_file, \
-            open(f"{datetime.date.today()}_drama_data.csv", mode='a', newline='', encoding='utf-8') as drama_file:
-        sound_writer = csv.writer(sound_file)
-        drama_writer = csv.writer(drama_file)
-
-        # Check if the file is empty before writing headers
-        sound_file_empty = sound_file.tell() == 0
-        drama_file_empty = drama_file.tell() == 0
-
-        if sound_file_empty:
-            sound_writer.writerow(["声音标题", "创建时间", "是否需要付费", "弹幕用户ID", "评论用户ID", "总用户ID", "观看次数"])
-
-        if drama_file_empty:
-            drama_writer.writerow(
-                ["剧集ID", "剧集名称", "首个声音创建时间", "价格", "总观看次数", "付费观看次数", "免费观看次数",
-                 "付费弹幕用户ID", "付费评论用户ID", "免费弹幕用户ID", "免费评论用户ID",
-                 "付费总用户ID", "免费总用户ID", "前五十打赏", "新增付费用户增长"])
-
-        for drama_id in drama_ids.split(','):
-            sound_data, total_paid_udis = process_drama_id(drama_id.strip(), sound_writer, drama_writer, previous_paid_uids)
-            drama_sound[drama_id] = sound_data
-            all_paid_total_uids.update(total_paid_udis)
-            previous_paid_uids = total_paid_udis
-
-            print("--------------------- Taking a break -------------------------")
-            time.sleep(60)
+    all_paid_total_uids = UidSet()
+    previous_paid_uids = UidSet()
+    sound_rows = []
+    drama_rows = []
+    activity_table = []
+    columnar = ColumnarWriter(fmt=output) if output in COLUMNAR_FORMATS else None
+
+    for drama_id in drama_ids:
+        finished = journal.load_drama(drama_id) if journal is not None else None
+        if finished is not None:
+            logging.info(f"Drama ID {drama_id} already crawled, resuming from journal")
+            sound_data, total_paid_udis = finished['sound_data'], finished['total_paid_uids']
+            drama_sound_rows, drama_drama_rows = finished['sound_rows'], finished['drama_rows']
+        else:
+            drama_sound_rows, drama_drama_rows = RowBuffer(), RowBuffer()
+            try:
+                sound_data, total_paid_udis = process_drama_id(drama_id, drama_sound_rows, drama_drama_rows,
+                                                               previous_paid_uids, store, journal, activity)
+            except Exception:
+                if journal is not None:
+                    logging.error(f"Crawl failed on drama ID {drama_id}; finished sounds are saved in "
+                                  f"{journal.path}, rerun with the same drama ids to resume")
+                raise
+            if journal is not None:
+                journal.save_drama(drama_id, sound_data, drama_sound_rows, drama_drama_rows, total_paid_udis)
+
+        sound_rows.extend(drama_sound_rows)
+        drama_rows.extend(drama_drama_rows)
+        if columnar is not None:
+            columnar.add_drama(drama_id, sound_data, drama_drama_rows[0], total_paid_udis)
+        if activity:
+            activity_table.extend(activity_rows(drama_id, drama_activity(sound_data)))
+        drama_sound[drama_id] = sound_data
+        all_paid_total_uids.update(total_paid_udis)
+        previous_paid_uids = total_paid_udis
+
+    if columnar is not None:
+        columnar.close()
+    else:
+        append_csv_atomically(f"{datetime.date.today()}_sound_data.csv", SOUND_HEADER, sound_rows)
+        append_csv_atomically(f"{datetime.date.today()}_drama_data.csv", DRAMA_HEADER, drama_rows)
+    if activity:
+        append_csv_atomically(f"{datetime.date.today()}_drama_activity.csv", ACTIVITY_HEADER, activity_table)
+    if journal is not None:
+        journal.finish()
 
     print('-------------------------------------------------')
     print(f"All Paid Total UIDs: {len(all_paid_total_uids)}")
     print('-------------------------------------------------')
+    log_cache_summary()
+    write_metrics()
     return drama_sound, all_paid_total_uids
 
-
 if __name__ == '__main__':
-    runner()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true",
+                        help="re-crawl from the snapshot store; totals are a lower bound, since new replies to "
+                             "comments older than the snapshot are missed")
+    runner(incremental=parser.parse_args().incremental)